@@ -0,0 +1,24 @@
+"""Add document update count
+
+Revision ID: a1c4e7b9d3f5
+Revises: f7a3c9e1d2b8
+Create Date: 2026-10-19 15:04:17.283911
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1c4e7b9d3f5'
+down_revision = 'f7a3c9e1d2b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('documents', sa.Column('update_count', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('documents', 'update_count')
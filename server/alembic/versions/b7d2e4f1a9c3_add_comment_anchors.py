@@ -0,0 +1,28 @@
+"""Add comment anchors
+
+Revision ID: b7d2e4f1a9c3
+Revises: create_essay_plans
+Create Date: 2026-10-19 09:12:44.318205
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d2e4f1a9c3'
+down_revision = 'create_essay_plans'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('comments', sa.Column('anchor_start', sa.Integer(), nullable=True))
+    op.add_column('comments', sa.Column('anchor_end', sa.Integer(), nullable=True))
+    op.add_column('comments', sa.Column('anchor_version', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('comments', 'anchor_version')
+    op.drop_column('comments', 'anchor_end')
+    op.drop_column('comments', 'anchor_start')
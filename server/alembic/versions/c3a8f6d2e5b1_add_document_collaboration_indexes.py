@@ -0,0 +1,36 @@
+"""Add document collaboration indexes
+
+Revision ID: c3a8f6d2e5b1
+Revises: b7d2e4f1a9c3
+Create Date: 2026-10-19 10:03:27.540931
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3a8f6d2e5b1'
+down_revision = 'b7d2e4f1a9c3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('document_collaborations') as batch_op:
+        batch_op.create_unique_constraint(
+            'uq_document_collaborations_document_user',
+            ['document_id', 'user_id']
+        )
+    op.create_index(
+        'ix_document_collaborations_user_document',
+        'document_collaborations',
+        ['user_id', 'document_id'],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_document_collaborations_user_document', table_name='document_collaborations')
+    with op.batch_alter_table('document_collaborations') as batch_op:
+        batch_op.drop_constraint('uq_document_collaborations_document_user', type_='unique')
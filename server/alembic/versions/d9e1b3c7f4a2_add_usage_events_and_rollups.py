@@ -0,0 +1,56 @@
+"""Add usage events and rollups
+
+Revision ID: d9e1b3c7f4a2
+Revises: c3a8f6d2e5b1
+Create Date: 2026-10-19 11:21:05.873412
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9e1b3c7f4a2'
+down_revision = 'c3a8f6d2e5b1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('usage_events',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('feature', sa.String(), nullable=False),
+    sa.Column('tokens_used', sa.Integer(), nullable=True),
+    sa.Column('success', sa.Boolean(), nullable=True),
+    sa.Column('error_message', sa.String(), nullable=True),
+    sa.Column('timestamp', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_usage_events_id'), 'usage_events', ['id'], unique=False)
+    op.create_index('ix_usage_events_user_timestamp', 'usage_events', ['user_id', 'timestamp'], unique=False)
+
+    for table in ('usage_rollups_hourly', 'usage_rollups_daily'):
+        op.create_table(table,
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('feature', sa.String(), nullable=False),
+        sa.Column('bucket_start', sa.DateTime(), nullable=False),
+        sa.Column('request_count', sa.Integer(), nullable=True),
+        sa.Column('error_count', sa.Integer(), nullable=True),
+        sa.Column('tokens_used', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'bucket_start', 'feature', name=f'uq_{table}_bucket')
+        )
+        op.create_index(op.f(f'ix_{table}_id'), table, ['id'], unique=False)
+
+
+def downgrade() -> None:
+    for table in ('usage_rollups_daily', 'usage_rollups_hourly'):
+        op.drop_index(op.f(f'ix_{table}_id'), table_name=table)
+        op.drop_table(table)
+    op.drop_index('ix_usage_events_user_timestamp', table_name='usage_events')
+    op.drop_index(op.f('ix_usage_events_id'), table_name='usage_events')
+    op.drop_table('usage_events')
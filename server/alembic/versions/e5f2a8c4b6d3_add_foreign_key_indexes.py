@@ -0,0 +1,39 @@
+"""Add foreign key indexes
+
+Revision ID: e5f2a8c4b6d3
+Revises: d9e1b3c7f4a2
+Create Date: 2026-10-19 11:48:32.106257
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5f2a8c4b6d3'
+down_revision = 'd9e1b3c7f4a2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(op.f('ix_documents_user_id'), 'documents', ['user_id'], unique=False)
+    op.create_index(op.f('ix_references_document_id'), 'references', ['document_id'], unique=False)
+    op.create_index(
+        'ix_document_versions_document_version',
+        'document_versions',
+        ['document_id', 'version_number'],
+        unique=False
+    )
+    op.create_index('ix_comments_document_parent', 'comments', ['document_id', 'parent_id'], unique=False)
+    op.create_index(op.f('ix_comments_parent_id'), 'comments', ['parent_id'], unique=False)
+    op.create_index(op.f('ix_essay_plans_user_id'), 'essay_plans', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_essay_plans_user_id'), table_name='essay_plans')
+    op.drop_index(op.f('ix_comments_parent_id'), table_name='comments')
+    op.drop_index('ix_comments_document_parent', table_name='comments')
+    op.drop_index('ix_document_versions_document_version', table_name='document_versions')
+    op.drop_index(op.f('ix_references_document_id'), table_name='references')
+    op.drop_index(op.f('ix_documents_user_id'), table_name='documents')
@@ -0,0 +1,49 @@
+"""Add analysis jobs
+
+Revision ID: f7a3c9e1d2b8
+Revises: e5f2a8c4b6d3
+Create Date: 2026-10-19 13:12:44.520316
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f7a3c9e1d2b8'
+down_revision = 'e5f2a8c4b6d3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('analysis_jobs',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(), nullable=False),
+    sa.Column('params', sa.JSON(), nullable=True),
+    sa.Column('input_hash', sa.String(length=64), nullable=False),
+    sa.Column('subscription_tier', sa.String(), nullable=True),
+    sa.Column('status', sa.Enum('QUEUED', 'RUNNING', 'SUCCEEDED', 'FAILED', 'CANCELLED', name='jobstatus'), nullable=False),
+    sa.Column('progress', sa.Float(), nullable=True),
+    sa.Column('result', sa.JSON(), nullable=True),
+    sa.Column('error', sa.String(), nullable=True),
+    sa.Column('attempts', sa.Integer(), nullable=True),
+    sa.Column('max_attempts', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('available_at', sa.DateTime(), nullable=True),
+    sa.Column('locked_until', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.Column('expires_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_analysis_jobs_status_available', 'analysis_jobs', ['status', 'available_at'], unique=False)
+    op.create_index('ix_analysis_jobs_user_hash', 'analysis_jobs', ['user_id', 'input_hash'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_analysis_jobs_user_hash', table_name='analysis_jobs')
+    op.drop_index('ix_analysis_jobs_status_available', table_name='analysis_jobs')
+    op.drop_table('analysis_jobs')
+    sa.Enum(name='jobstatus').drop(op.get_bind(), checkfirst=True)
@@ -4,7 +4,7 @@ from sqlalchemy.orm import Session
 
 from app.core.deps import get_db, get_current_user, check_rate_limit, get_rate_limit_info
 from app.models.user import User
-from app.services import ai_service
+from app.services import ai_service, document_analysis
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -61,6 +61,12 @@ class EvidenceRequest(BaseModel):
     claim: str
     field: str
 
+class DocumentAnalysisRequest(BaseModel):
+    document_id: int
+    analyses: List[str] = list(document_analysis.ANALYSES)
+    style_guide: str = "apa"
+    include_text: bool = False
+
 @router.get("/rate-limit-info")
 async def get_current_rate_limit(
     request: Request,
@@ -97,14 +103,22 @@ async def get_writing_suggestions(
 async def check_grammar(
     request: Request,
     text_request: TextRequest,
+    include_text: bool = False,
     _: None = Depends(check_rate_limit),
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """
-    Check grammar and style.
+    Check grammar and style. Unchanged paragraphs are served from the cache.
+
+    Changes are returned as word-level ``operations`` with offsets into the
+    submitted text; pass ``include_text`` to also get the input and the full
+    improved text.
     """
     try:
-        return await ai_service.check_grammar_and_style(text_request.text)
+        result = await document_analysis.check_grammar(text_request.text)
+        if include_text:
+            return result
+        return result.dict(exclude={"text", "improved_text"})
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -309,13 +323,13 @@ async def check_style(
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """
-    Check text against style guide requirements.
+    Check text against style guide requirements. Unchanged paragraphs are
+    served from the cache.
     """
     try:
-        return await ai_service.check_style_guide(
+        return await document_analysis.check_style(
             style_request.text,
-            style_request.style_guide,
-            style_request.elements
+            style_request.style_guide
         )
     except Exception as e:
         raise HTTPException(
@@ -397,3 +411,30 @@ async def suggest_evidence(
             status_code=500,
             detail=f"Error suggesting evidence: {str(e)}"
         )
+
+@router.post("/analyze-document")
+async def analyze_document(
+    request: Request,
+    analysis_request: DocumentAnalysisRequest,
+    _: None = Depends(check_rate_limit),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Run grammar, style, citation and argument checks over a saved document
+    in one request.
+    """
+    try:
+        return await document_analysis.analyze_document(
+            analysis_request.document_id,
+            current_user.id,
+            analysis_request.analyses,
+            analysis_request.style_guide,
+            analysis_request.include_text
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error analyzing document: {str(e)}"
+        )
@@ -1,7 +1,9 @@
 from fastapi import APIRouter
-from app.api.api_v1.endpoints import test, ai_outline, auth
+from app.api.api_v1.endpoints import test, ai_outline, auth, admin, jobs
 
 api_router = APIRouter()
 api_router.include_router(auth.router, tags=["auth"])
 api_router.include_router(test.router, prefix="/test", tags=["test"])
 api_router.include_router(ai_outline.router, tags=["ai"])
+api_router.include_router(admin.router, prefix="/admin", tags=["admin"])
+api_router.include_router(jobs.router, prefix="/jobs", tags=["jobs"])
@@ -0,0 +1,45 @@
+from typing import Any, Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import FileResponse
+
+from app.core.deps import require_admin
+from app.core.profiler import profile_store
+from app.core.query_profiler import query_profiler
+from app.core.query_stats import query_metrics
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+@router.get("/slow-queries")
+async def get_slow_queries(
+    limit: int = Query(20, ge=1, le=500),
+    order_by: Literal["total", "p95", "max", "count"] = "total"
+) -> Any:
+    """Top query fingerprints by total time, p95, max or execution count."""
+    return {
+        **query_profiler.get_stats(),
+        "queries": query_profiler.top(limit, order_by)
+    }
+
+@router.delete("/slow-queries")
+async def reset_slow_queries() -> Any:
+    """Clear the collected query timings."""
+    query_profiler.reset()
+    return {"status": "success"}
+
+@router.get("/query-stats")
+async def get_query_stats() -> Any:
+    """Per-route query counts and DB time."""
+    return query_metrics.get_stats()
+
+@router.get("/profiles")
+async def list_profiles(route: Optional[str] = None) -> Any:
+    """Saved request profiles, newest first."""
+    return profile_store.list(route)
+
+@router.get("/profiles/{profile_id}")
+async def download_profile(profile_id: str) -> Any:
+    """Download a profile as folded stacks, for flamegraph.pl or speedscope."""
+    path = profile_store.get_path(profile_id)
+    if path is None or not path.exists():
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=path.name)
@@ -0,0 +1,116 @@
+from typing import Any
+import asyncio
+import json
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from app.core.deps import get_db, get_current_user, oauth2_scheme
+from app.core.pubsub import pubsub
+from app.database import SessionLocal
+from app.models.job import AnalysisJob
+from app.models.user import User
+from app.schemas.job import Job, JobCreate
+from app.services.job_queue import FINISHED_STATUSES, JobQueue, job_channel, job_event, job_queue
+
+router = APIRouter()
+
+# Seconds between keep-alive comments on an idle event stream
+KEEPALIVE_INTERVAL = 15
+
+def _get_own_job(db: Session, job_id: str, current_user: User) -> AnalysisJob:
+    job = db.query(AnalysisJob).filter(AnalysisJob.id == job_id).first()
+    if not job or job.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.post("/", response_model=Job, status_code=202)
+async def submit_job(
+    job_in: JobCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+) -> Any:
+    """
+    Queue a long-running AI analysis. Submitting the same input again returns
+    the existing job while it is pending or its result is kept; new jobs
+    count against the rate limit of the equivalent AI endpoint.
+    """
+    return job_queue.submit(db, current_user, job_in.kind, job_in.params)
+
+@router.get("/{job_id}", response_model=Job)
+async def get_job(
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+) -> Any:
+    """Status, progress and, once finished, the result of a job."""
+    return _get_own_job(db, job_id, current_user)
+
+@router.get("/{job_id}/events")
+async def stream_job_events(
+    job_id: str,
+    token: str = Depends(oauth2_scheme)
+) -> Any:
+    """
+    Server-sent events with the job's progress, ending when it finishes.
+
+    The user and initial state are read with a session of its own, closed
+    before streaming, so a long stream does not hold a database connection.
+    """
+    events: asyncio.Queue = asyncio.Queue()
+
+    async def forward(batch):
+        for message in batch:
+            events.put_nowait(message)
+
+    db = SessionLocal()
+    try:
+        current_user = await get_current_user(db, token)
+        job = _get_own_job(db, job_id, current_user)
+        subscription = await pubsub.subscribe(job_channel(job_id), forward)
+        try:
+            # Read the state after subscribing, so that no change is missed
+            db.refresh(job)
+            initial = job_event(JobQueue.snapshot(job))
+        except Exception:
+            await pubsub.unsubscribe(subscription)
+            raise
+    finally:
+        db.close()
+
+    async def stream():
+        try:
+            event = initial
+            while True:
+                if event is None:
+                    yield ": keep-alive\n\n"
+                else:
+                    yield f"data: {json.dumps(event)}\n\n"
+                    if event["status"] in [status.value for status in FINISHED_STATUSES]:
+                        return
+                try:
+                    event = await asyncio.wait_for(events.get(), KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    event = None
+        finally:
+            await pubsub.unsubscribe(subscription)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
+
+@router.delete("/{job_id}", response_model=Job)
+async def cancel_job(
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+) -> Any:
+    """Cancel a queued or running job."""
+    job = _get_own_job(db, job_id, current_user)
+    if not await job_queue.cancel(job_id):
+        raise HTTPException(status_code=409, detail="Job has already finished")
+    db.refresh(job)
+    return job
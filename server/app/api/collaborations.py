@@ -1,8 +1,13 @@
-from typing import Any, List
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Any, Dict, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect
+from sqlalchemy import and_, func, select
 from sqlalchemy.orm import Session
 
+from app.core import security
 from app.core.deps import get_db, get_current_user
+from app.core.permission_cache import permission_cache
+from app.core.pubsub import pubsub
+from app.database import SessionLocal
 from app.models.user import User
 from app.models.document import Document
 from app.models.collaboration import DocumentCollaboration, Comment, CollaborationRole
@@ -13,53 +18,81 @@ from app.schemas.collaboration import (
     Comment as CommentSchema,
     CommentCreate,
     CommentUpdate,
+    SharedDocumentPage,
 )
+from app.services.anchor_index import anchor_indexes
+from app.services.collaboration_room import room_manager
 
 router = APIRouter()
 
+ROLE_HIERARCHY = {
+    CollaborationRole.OWNER: 4,
+    CollaborationRole.EDITOR: 3,
+    CollaborationRole.COMMENTER: 2,
+    CollaborationRole.VIEWER: 1
+}
+
+def get_document_role(
+    document_id: int,
+    user: User,
+    db: Session
+) -> Optional[CollaborationRole]:
+    """
+    Resolve the user's effective role on a document with a single query.
+
+    Only the document id, owner and collaboration role are selected, so the
+    document content is never loaded. Returns None if the user has no access.
+    Results are cached per process and invalidated on collaborator changes.
+    """
+    found, role = permission_cache.get(document_id, user.id)
+    if found:
+        return role
+
+    row = db.query(
+        Document.id,
+        Document.user_id,
+        DocumentCollaboration.role
+    ).outerjoin(
+        DocumentCollaboration,
+        and_(
+            DocumentCollaboration.document_id == Document.id,
+            DocumentCollaboration.user_id == user.id
+        )
+    ).filter(Document.id == document_id).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    # Document owner has all permissions
+    role = CollaborationRole.OWNER if row.user_id == user.id else row.role
+    permission_cache.set(document_id, user.id, role)
+    return role
+
 def check_document_access(
     document_id: int,
     user: User,
     db: Session,
     required_role: CollaborationRole = CollaborationRole.VIEWER
-) -> Document:
+) -> CollaborationRole:
     """
     Check if user has required access to document.
+
+    Returns the user's effective role. Handlers that need the document itself
+    should load it afterwards, so permission checks stay cheap.
     """
-    # Document owner has all permissions
-    document = db.query(Document).filter(Document.id == document_id).first()
-    if not document:
-        raise HTTPException(status_code=404, detail="Document not found")
-    
-    if document.user_id == user.id:
-        return document
-    
-    # Check collaboration role
-    collab = db.query(DocumentCollaboration).filter(
-        DocumentCollaboration.document_id == document_id,
-        DocumentCollaboration.user_id == user.id
-    ).first()
-    
-    if not collab:
+    role = get_document_role(document_id, user, db)
+    if role is None:
         raise HTTPException(
             status_code=403,
             detail="You don't have access to this document"
         )
-    
-    role_hierarchy = {
-        CollaborationRole.OWNER: 4,
-        CollaborationRole.EDITOR: 3,
-        CollaborationRole.COMMENTER: 2,
-        CollaborationRole.VIEWER: 1
-    }
-    
-    if role_hierarchy[collab.role] < role_hierarchy[required_role]:
+
+    if ROLE_HIERARCHY[role] < ROLE_HIERARCHY[required_role]:
         raise HTTPException(
             status_code=403,
             detail=f"This action requires {required_role} access"
         )
-    
-    return document
+
+    return role
 
 @router.post("/documents/{document_id}/collaborators", response_model=CollaborationSchema)
 def add_collaborator(
@@ -71,9 +104,7 @@ def add_collaborator(
     """
     Add a collaborator to document.
     """
-    document = check_document_access(
-        document_id, current_user, db, CollaborationRole.OWNER
-    )
+    check_document_access(document_id, current_user, db, CollaborationRole.OWNER)
     
     # Check if user exists
     user = db.query(User).filter(User.id == collaboration_in.user_id).first()
@@ -98,6 +129,7 @@ def add_collaborator(
     )
     db.add(collaboration)
     db.commit()
+    permission_cache.invalidate(document_id, collaboration.user_id)
     db.refresh(collaboration)
     return collaboration
 
@@ -138,6 +170,8 @@ def update_collaborator(
     collaboration.role = collaboration_in.role
     db.add(collaboration)
     db.commit()
+    permission_cache.invalidate(document_id, collaboration.user_id)
+    room_manager.set_role(document_id, user_id, collaboration_in.role)
     db.refresh(collaboration)
     return collaboration
 
@@ -162,9 +196,97 @@ def remove_collaborator(
     
     db.delete(collaboration)
     db.commit()
+    permission_cache.invalidate(document_id, user_id)
+    room_manager.set_role(document_id, user_id, None)
     return {"status": "success"}
 
+@router.get("/shared-with-me", response_model=SharedDocumentPage)
+def get_shared_documents(
+    after: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=200),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> Any:
+    """
+    Get documents shared with the current user.
+
+    Uses keyset pagination on the document id: pass the returned
+    ``next_cursor`` as ``after`` to fetch the next page.
+    """
+    query = db.query(
+        Document.id.label("document_id"),
+        Document.title,
+        Document.document_type,
+        DocumentCollaboration.role,
+        Document.user_id.label("owner_id"),
+        User.full_name.label("owner_name"),
+        func.coalesce(Document.updated_at, Document.created_at).label("last_activity")
+    ).join(
+        Document, Document.id == DocumentCollaboration.document_id
+    ).join(
+        User, User.id == Document.user_id
+    ).filter(
+        DocumentCollaboration.user_id == current_user.id
+    )
+    if after is not None:
+        query = query.filter(DocumentCollaboration.document_id > after)
+
+    rows = query.order_by(DocumentCollaboration.document_id).limit(limit + 1).all()
+    items = [dict(row._mapping) for row in rows[:limit]]
+    return {
+        "items": items,
+        "next_cursor": items[-1]["document_id"] if len(rows) > limit else None
+    }
+
+@router.websocket("/documents/{document_id}/ws")
+async def collaborate(
+    websocket: WebSocket,
+    document_id: int,
+    token: str = Query(...),
+) -> None:
+    """
+    Real-time collaborative editing session for a document.
+
+    Browsers cannot set an Authorization header on WebSockets, so the access
+    token is passed as a query parameter. Viewers and commenters receive
+    updates; editors and owners may also send operations.
+    """
+    db = SessionLocal()
+    try:
+        user_id = security.verify_token(token)
+        user = db.query(User).filter(User.id == user_id).first() if user_id else None
+        if not user:
+            await websocket.close(code=4401)
+            return
+        try:
+            role = check_document_access(document_id, user, db)
+        except HTTPException as e:
+            await websocket.close(code=4000 + e.status_code)
+            return
+    finally:
+        db.close()
+
+    await websocket.accept()
+    room, connection = await room_manager.join(document_id, websocket, user.id, role)
+    try:
+        while True:
+            message = await websocket.receive_json()
+            await room.handle_message(connection, message)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await room_manager.leave(room, connection)
+
 # Comment endpoints
+def publish_comment_event(document_id: int, action: str, comment_id: int, user_id: int) -> None:
+    """Notify collaboration rooms on every worker about a comment change."""
+    pubsub.publish_threadsafe(f"document:{document_id}", {
+        "type": "comment",
+        "action": action,
+        "comment_id": comment_id,
+        "user_id": user_id
+    })
+
 @router.post("/documents/{document_id}/comments", response_model=CommentSchema)
 def create_comment(
     document_id: int,
@@ -181,15 +303,30 @@ def create_comment(
         parent_comment = db.query(Comment).get(comment_in.parent_id)
         if not parent_comment or parent_comment.document_id != document_id:
             raise HTTPException(status_code=404, detail="Parent comment not found")
+
+    anchor_version = None
+    if comment_in.anchor_start is not None or comment_in.anchor_end is not None:
+        if (comment_in.anchor_start is None or comment_in.anchor_end is None
+                or not 0 <= comment_in.anchor_start <= comment_in.anchor_end):
+            raise HTTPException(status_code=422, detail="Invalid comment anchor range")
+        anchor_version = db.query(Document.current_version).filter(
+            Document.id == document_id
+        ).scalar()
     
     comment = Comment(
         **comment_in.dict(),
+        anchor_version=anchor_version,
         document_id=document_id,
         user_id=current_user.id
     )
     db.add(comment)
     db.commit()
     db.refresh(comment)
+    if anchor_version is not None:
+        index = anchor_indexes.get(document_id)
+        if index is not None:
+            index.add(comment.id, comment.anchor_start, comment.anchor_end)
+    publish_comment_event(document_id, "created", comment.id, current_user.id)
     return comment
 
 @router.get("/documents/{document_id}/comments", response_model=List[CommentSchema])
@@ -207,6 +344,89 @@ def get_comments(
         Comment.parent_id.is_(None)  # Only get top-level comments
     ).all()
 
+def load_comment_threads(
+    db: Session,
+    document_id: int,
+    skip: int = 0,
+    limit: int = 20,
+    thread_id: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    Load whole comment threads with a single recursive CTE query.
+
+    Threads are paginated by their top-level comment; every reply below the
+    selected threads is fetched in the same query and the trees are assembled
+    in memory in one pass.
+    """
+    roots = select(Comment.id).where(
+        Comment.document_id == document_id,
+        Comment.parent_id.is_(None)
+    )
+    if thread_id is not None:
+        roots = roots.where(Comment.id == thread_id)
+    roots = roots.order_by(Comment.created_at, Comment.id).offset(skip).limit(limit)
+
+    tree = select(Comment.id).where(
+        Comment.id.in_(roots.scalar_subquery())
+    ).cte("comment_tree", recursive=True)
+    tree = tree.union_all(
+        select(Comment.id).join(tree, Comment.parent_id == tree.c.id).where(
+            Comment.document_id == document_id
+        )
+    )
+
+    comments = db.query(Comment).join(tree, Comment.id == tree.c.id).order_by(
+        Comment.created_at, Comment.id
+    ).all()
+
+    # Stored anchors may predate later versions; the index remaps them
+    index = anchor_indexes.open(db, document_id)
+    live_anchors = index.anchors()
+
+    nodes: Dict[int, Dict[str, Any]] = {}
+    threads: List[Dict[str, Any]] = []
+    for comment in comments:
+        anchor_start, anchor_end = live_anchors.get(
+            comment.id, (comment.anchor_start, comment.anchor_end)
+        )
+        nodes[comment.id] = {
+            "id": comment.id,
+            "document_id": comment.document_id,
+            "user_id": comment.user_id,
+            "parent_id": comment.parent_id,
+            "content": comment.content,
+            "resolved": comment.resolved,
+            "anchor_start": anchor_start,
+            "anchor_end": anchor_end,
+            "anchor_version": index.version if comment.id in live_anchors else comment.anchor_version,
+            "created_at": comment.created_at,
+            "updated_at": comment.updated_at,
+            "replies": []
+        }
+    for comment in comments:
+        node = nodes[comment.id]
+        parent = nodes.get(comment.parent_id)
+        if parent is not None:
+            parent["replies"].append(node)
+        else:
+            threads.append(node)
+    return threads
+
+@router.get("/documents/{document_id}/comments/tree", response_model=List[CommentSchema])
+def get_comment_threads(
+    document_id: int,
+    skip: int = 0,
+    limit: int = 20,
+    thread_id: Optional[int] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> Any:
+    """
+    Get document comment threads with all nested replies.
+    """
+    check_document_access(document_id, current_user, db)
+    return load_comment_threads(db, document_id, skip, limit, thread_id)
+
 @router.put("/documents/{document_id}/comments/{comment_id}", response_model=CommentSchema)
 def update_comment(
     document_id: int,
@@ -236,6 +456,7 @@ def update_comment(
     db.add(comment)
     db.commit()
     db.refresh(comment)
+    publish_comment_event(document_id, "updated", comment.id, current_user.id)
     return comment
 
 @router.delete("/documents/{document_id}/comments/{comment_id}")
@@ -262,4 +483,8 @@ def delete_comment(
     
     db.delete(comment)
     db.commit()
+    index = anchor_indexes.get(document_id)
+    if index is not None:
+        index.remove(comment_id)
+    publish_comment_event(document_id, "deleted", comment_id, current_user.id)
     return {"status": "success"}
@@ -1,8 +1,15 @@
-from typing import Any, List
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from typing import Any, Dict, List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from sqlalchemy.orm import Session, defer
 
 from app.core.deps import get_db, get_current_user
+from app.core.http_cache import (
+    IMMUTABLE_CACHE_CONTROL,
+    REVALIDATE_CACHE_CONTROL,
+    etag_matches,
+    make_etag,
+)
+from app.core.permission_cache import permission_cache
 from app.models.user import User
 from app.models.document import Document, Reference
 from app.models.version import DocumentVersion
@@ -10,14 +17,60 @@ from app.schemas.document import (
     Document as DocumentSchema,
     DocumentCreate,
     DocumentUpdate,
+    DocumentPatch,
+    DocumentPatchResult,
     Reference as ReferenceSchema,
     ReferenceCreate,
     ReferenceUpdate,
 )
 from app.schemas.version import DocumentVersion as VersionSchema, DocumentVersionCreate
+from app.services.text_merge import MergeConflictError, merge_texts
+from app.services.anchor_index import anchor_indexes
+from app.services.collaboration_room import room_manager
+from app.services.pre_analysis import pre_analyzer
+from app.services.text_operations import (
+    WORD_PATTERN,
+    TextOperationError,
+    apply_operations,
+    diff_operations,
+)
 
 router = APIRouter()
 
+def get_owned_document(
+    document_id: int,
+    user: User,
+    db: Session,
+    with_content: bool = True
+) -> Document:
+    """
+    Load a document owned by the user.
+
+    Pass ``with_content=False`` when the handler does not read the content,
+    so the potentially large column is deferred until actually accessed.
+    """
+    query = db.query(Document).filter(
+        Document.id == document_id,
+        Document.user_id == user.id
+    )
+    if not with_content:
+        query = query.options(defer(Document.content))
+    document = query.first()
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return document
+
+def check_document_owner(document_id: int, user: User, db: Session) -> None:
+    """
+    Ensure the document exists and belongs to the user without loading it.
+    """
+    owned = db.query(Document.id).filter(
+        Document.id == document_id,
+        Document.user_id == user.id
+    ).first()
+    if not owned:
+        raise HTTPException(status_code=404, detail="Document not found")
+
 @router.get("/", response_model=List[DocumentSchema])
 def get_documents(
     skip: int = 0,
@@ -53,56 +106,233 @@ def create_document(
 @router.get("/{document_id}", response_model=DocumentSchema)
 def get_document(
     document_id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ) -> Any:
     """
     Get document by ID.
+
+    Responds with 304 Not Modified if the client's ETag is still current,
+    which is checked without loading the document content.
     """
-    document = db.query(Document).filter(
-        Document.id == document_id,
-        Document.user_id == current_user.id
-    ).first()
-    if not document:
-        raise HTTPException(status_code=404, detail="Document not found")
+    if if_none_match:
+        state = db.query(
+            Document.current_version,
+            Document.update_count
+        ).filter(
+            Document.id == document_id,
+            Document.user_id == current_user.id
+        ).first()
+        if not state:
+            raise HTTPException(status_code=404, detail="Document not found")
+        etag = make_etag(document_id, state.current_version, state.update_count)
+        if etag_matches(if_none_match, etag):
+            return Response(
+                status_code=304,
+                headers={"ETag": etag, "Cache-Control": REVALIDATE_CACHE_CONTROL}
+            )
+
+    document = get_owned_document(document_id, current_user, db)
+    response.headers["ETag"] = make_etag(
+        document.id, document.current_version, document.update_count
+    )
+    response.headers["Cache-Control"] = REVALIDATE_CACHE_CONTROL
     return document
 
+def save_document_content(
+    document: Document,
+    content: str,
+    user: User,
+    db: Session,
+    version_metadata: Dict[str, Any],
+    operations: Optional[List[Dict[str, Any]]] = None,
+    update_anchors: bool = True
+) -> bool:
+    """
+    Replace the content of a document, guarded by its loaded version.
+
+    Issues ``UPDATE ... WHERE current_version = <loaded version>`` so that a
+    concurrent save turns this into a no-op instead of being overwritten,
+    without holding row locks. Returns False if the document has moved on.
+    The superseded content is kept as a version, together with the operations
+    leading to the new content (diffed by word if not given), which also
+    remap the comment anchors of an open document. While the document has a
+    room open, its anchors follow the room's content instead, and the room
+    shifts them when it rebases onto this save. The caller commits.
+    """
+    base_version = document.current_version
+    updated = db.query(Document).filter(
+        Document.id == document.id,
+        Document.current_version == base_version
+    ).update({
+        Document.content: content,
+        Document.current_version: base_version + 1,
+        Document.update_count: Document.update_count + 1
+    }, synchronize_session=False)
+    if not updated:
+        return False
+
+    if operations is None:
+        operations = diff_operations(document.content or "", content, WORD_PATTERN)
+    version = DocumentVersion(
+        document_id=document.id,
+        title=document.title,
+        content=document.content,
+        version_number=base_version,
+        version_metadata={**version_metadata, "delta": operations},
+        user_id=user.id
+    )
+    db.add(version)
+
+    if (
+        update_anchors
+        and anchor_indexes.get(document.id) is not None
+        and room_manager.get_room(document.id) is None
+    ):
+        # A stale index is reloaded from the deltas, including this version's
+        db.flush()
+        anchor_indexes.apply_version(db, document.id, base_version, operations)
+        anchor_indexes.flush(db, document.id, base_version + 1)
+    return True
+
+def merge_document_content(
+    document: Document,
+    base_version: int,
+    content: str,
+    db: Session
+) -> str:
+    """
+    Three-way merge content edited from an older version into the current one.
+    """
+    ancestor = None
+    if base_version < document.current_version:
+        ancestor = db.query(DocumentVersion.content).filter(
+            DocumentVersion.document_id == document.id,
+            DocumentVersion.version_number == base_version
+        ).first()
+    if not ancestor:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Version {base_version} is not available for merging"
+        )
+
+    try:
+        return merge_texts(ancestor.content or "", content, document.content or "")
+    except MergeConflictError as e:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Document is at version {document.current_version}: {str(e)}"
+        )
+
 @router.put("/{document_id}", response_model=DocumentSchema)
 def update_document(
     document_id: int,
     document_in: DocumentUpdate,
+    auto_merge: bool = False,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ) -> Any:
     """
     Update document and create a new version.
+
+    Content changes must carry the ``current_version`` they were based on.
+    Stale saves are rejected with 409, or three-way merged with the changes
+    made since that version when ``auto_merge`` is set.
     """
-    document = db.query(Document).filter(
-        Document.id == document_id,
-        Document.user_id == current_user.id
-    ).first()
-    if not document:
-        raise HTTPException(status_code=404, detail="Document not found")
+    document = get_owned_document(document_id, current_user, db)
+    update_data = document_in.dict(exclude_unset=True)
+    content = update_data.pop("content", None)
+    base_version = update_data.pop("current_version", None)
+    content_changed = content is not None and content != document.content
     
     # Create a new version before updating
-    if document_in.content is not None and document_in.content != document.content:
-        version = DocumentVersion(
-            document_id=document.id,
-            content=document.content,
-            version_num=document.current_version,
-            commit_message=document_in.metadata.get("commit_message", "Update document"),
-            created_by=current_user.id
-        )
-        db.add(version)
-        document.current_version += 1
+    if content_changed:
+        if base_version is None:
+            raise HTTPException(
+                status_code=428,
+                detail="current_version is required when updating content"
+            )
+        if base_version != document.current_version:
+            if not auto_merge:
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"Document is at version {document.current_version}, "
+                           f"not {base_version}"
+                )
+            content = merge_document_content(document, base_version, content, db)
+
+        metadata = document_in.document_metadata or {}
+        version_metadata = {
+            "commit_message": metadata.get("commit_message", "Update document")
+        }
+        if not save_document_content(document, content, current_user, db, version_metadata):
+            db.rollback()
+            raise HTTPException(
+                status_code=409,
+                detail="Document was modified concurrently, please retry"
+            )
     
     # Update document
-    for field, value in document_in.dict(exclude_unset=True).items():
+    for field, value in update_data.items():
         setattr(document, field, value)
+    if update_data:
+        document.update_count = Document.update_count + 1
     
     db.add(document)
     db.commit()
     db.refresh(document)
+    if content_changed:
+        pre_analyzer.schedule(current_user, document.id, document.current_version)
+    return document
+
+@router.patch("/{document_id}", response_model=DocumentPatchResult)
+def patch_document(
+    document_id: int,
+    patch_in: DocumentPatch,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> Any:
+    """
+    Apply text operations to the document content and create a new version.
+
+    The operations must be based on the document's current version. They are
+    stored on the superseded version as the delta to the new one. The
+    response holds only the new version number; the client already has the
+    content it patched.
+    """
+    document = get_owned_document(document_id, current_user, db)
+    if document.current_version != patch_in.base_version:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Document is at version {document.current_version}, "
+                   f"not {patch_in.base_version}"
+        )
+
+    operations = [op.dict(exclude_none=True) for op in patch_in.operations]
+    try:
+        content = apply_operations(document.content or "", operations)
+    except TextOperationError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    if content == document.content:
+        return document
+
+    version_metadata = {
+        "commit_message": patch_in.commit_message or "Update document"
+    }
+    if not save_document_content(
+        document, content, current_user, db, version_metadata, operations
+    ):
+        db.rollback()
+        raise HTTPException(
+            status_code=409,
+            detail="Document was modified concurrently, please retry"
+        )
+    db.commit()
+    db.refresh(document, ["current_version", "updated_at"])
+    pre_analyzer.schedule(current_user, document.id, document.current_version)
     return document
 
 @router.delete("/{document_id}")
@@ -114,15 +344,11 @@ def delete_document(
     """
     Delete document.
     """
-    document = db.query(Document).filter(
-        Document.id == document_id,
-        Document.user_id == current_user.id
-    ).first()
-    if not document:
-        raise HTTPException(status_code=404, detail="Document not found")
+    document = get_owned_document(document_id, current_user, db, with_content=False)
     
     db.delete(document)
     db.commit()
+    permission_cache.invalidate(document_id)
     return {"status": "success"}
 
 # Reference endpoints
@@ -136,12 +362,7 @@ def create_reference(
     """
     Create new reference for document.
     """
-    document = db.query(Document).filter(
-        Document.id == document_id,
-        Document.user_id == current_user.id
-    ).first()
-    if not document:
-        raise HTTPException(status_code=404, detail="Document not found")
+    check_document_owner(document_id, current_user, db)
     
     reference = Reference(
         **reference_in.dict(),
@@ -162,14 +383,11 @@ def get_references(
     """
     Get all references for a document.
     """
-    document = db.query(Document).filter(
-        Document.id == document_id,
-        Document.user_id == current_user.id
-    ).first()
-    if not document:
-        raise HTTPException(status_code=404, detail="Document not found")
+    check_document_owner(document_id, current_user, db)
     
-    return document.references
+    return db.query(Reference).filter(
+        Reference.document_id == document_id
+    ).all()
 
 # Version management endpoints
 @router.get("/{document_id}/versions", response_model=List[VersionSchema])
@@ -183,41 +401,42 @@ def get_document_versions(
     """
     Get document version history.
     """
-    document = db.query(Document).filter(
-        Document.id == document_id,
-        Document.user_id == current_user.id
-    ).first()
-    if not document:
-        raise HTTPException(status_code=404, detail="Document not found")
+    check_document_owner(document_id, current_user, db)
     
     return db.query(DocumentVersion).filter(
         DocumentVersion.document_id == document_id
-    ).order_by(DocumentVersion.version_num.desc()).offset(skip).limit(limit).all()
+    ).order_by(DocumentVersion.version_number.desc()).offset(skip).limit(limit).all()
 
 @router.get("/{document_id}/versions/{version_num}", response_model=VersionSchema)
 def get_document_version(
     document_id: int,
     version_num: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ) -> Any:
     """
     Get specific document version.
+
+    Historic versions never change, so they are served as immutable and
+    revalidation requests are answered with 304 without loading the version.
     """
-    document = db.query(Document).filter(
-        Document.id == document_id,
-        Document.user_id == current_user.id
-    ).first()
-    if not document:
-        raise HTTPException(status_code=404, detail="Document not found")
+    check_document_owner(document_id, current_user, db)
+
+    etag = make_etag(document_id, "version", version_num)
+    cache_headers = {"ETag": etag, "Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=cache_headers)
     
     version = db.query(DocumentVersion).filter(
         DocumentVersion.document_id == document_id,
-        DocumentVersion.version_num == version_num
+        DocumentVersion.version_number == version_num
     ).first()
     if not version:
         raise HTTPException(status_code=404, detail="Version not found")
     
+    response.headers.update(cache_headers)
     return version
 
 @router.post("/{document_id}/versions/restore/{version_num}", response_model=DocumentSchema)
@@ -229,36 +448,31 @@ def restore_document_version(
 ) -> Any:
     """
     Restore document to a specific version.
+
+    The version's content is saved as a new version on top of the current
+    one, so the history, merge ancestors and comment anchors carry on.
     """
-    document = db.query(Document).filter(
-        Document.id == document_id,
-        Document.user_id == current_user.id
-    ).first()
-    if not document:
-        raise HTTPException(status_code=404, detail="Document not found")
+    document = get_owned_document(document_id, current_user, db)
     
-    version = db.query(DocumentVersion).filter(
+    version = db.query(DocumentVersion.content).filter(
         DocumentVersion.document_id == document_id,
-        DocumentVersion.version_num == version_num
+        DocumentVersion.version_number == version_num
     ).first()
     if not version:
         raise HTTPException(status_code=404, detail="Version not found")
-    
-    # Create a new version of the current state before restoring
-    current_version = DocumentVersion(
-        document_id=document.id,
-        content=document.content,
-        version_num=document.current_version,
-        commit_message=f"Auto-save before restoring to version {version_num}",
-        created_by=current_user.id
-    )
-    db.add(current_version)
-    
-    # Update document with version content
-    document.content = version.content
-    document.current_version += 1
-    
-    db.add(document)
+
+    content = version.content or ""
+    if content == document.content:
+        return document
+
+    version_metadata = {"commit_message": f"Restore version {version_num}"}
+    if not save_document_content(document, content, current_user, db, version_metadata):
+        db.rollback()
+        raise HTTPException(
+            status_code=409,
+            detail="Document was modified concurrently, please retry"
+        )
     db.commit()
     db.refresh(document)
+    pre_analyzer.schedule(current_user, document.id, document.current_version)
     return document
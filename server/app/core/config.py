@@ -26,6 +26,10 @@ class Settings(BaseSettings):
     API_V1_STR: str = "/api/v1"
     PROJECT_NAME: str = "Academic Writing Assistant"
     
+    @property
+    def DEBUG(self) -> bool:
+        return self._yaml_config['app'].get('debug', False)
+
     # Database
     @property
     def DATABASE_URL(self) -> str:
@@ -36,6 +40,10 @@ class Settings(BaseSettings):
     def SECRET_KEY(self) -> str:
         return self._yaml_config['security']['secret_key']
 
+    @property
+    def ADMIN_TOKEN(self) -> str:
+        return os.getenv("ADMIN_TOKEN") or self._yaml_config['security'].get('admin_token', "")
+
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8  # 8 days
 
@@ -72,6 +80,159 @@ class Settings(BaseSettings):
     def OPENAI_SYSTEM_PROMPT(self) -> str:
         return self._yaml_config['openai']['settings']['system_prompts']['writing']
 
+    # Pub/sub
+    @property
+    def PUBSUB_BACKEND(self) -> str:
+        return self._yaml_config['pubsub']['backend']
+
+    @property
+    def PUBSUB_REDIS_URL(self) -> str:
+        return self._yaml_config['pubsub']['redis_url']
+
+    @property
+    def PUBSUB_CHANNEL_PREFIX(self) -> str:
+        return self._yaml_config['pubsub']['channel_prefix']
+
+    @property
+    def PUBSUB_MAX_QUEUE(self) -> int:
+        return self._yaml_config['pubsub']['max_queue']
+
+    @property
+    def PUBSUB_BATCH_SIZE(self) -> int:
+        return self._yaml_config['pubsub']['batch_size']
+
+    # Monitoring
+    @property
+    def QUERY_N_PLUS_ONE_THRESHOLD(self) -> int:
+        return self._yaml_config['monitoring']['n_plus_one_threshold']
+
+    @property
+    def SLOW_QUERY_MS(self) -> float:
+        return self._yaml_config['monitoring']['slow_query_ms']
+
+    # Tracing
+    @property
+    def TRACING_ENABLED(self) -> bool:
+        return self._yaml_config['tracing']['enabled']
+
+    @property
+    def TRACING_EXPORTER(self) -> str:
+        return self._yaml_config['tracing']['exporter']
+
+    @property
+    def TRACING_FILE_PATH(self) -> str:
+        return self._yaml_config['tracing']['file_path']
+
+    @property
+    def TRACING_OTLP_ENDPOINT(self) -> str:
+        return self._yaml_config['tracing']['otlp_endpoint']
+
+    # Profiling
+    @property
+    def PROFILING_SAMPLE_RATE(self) -> float:
+        return self._yaml_config['profiling']['sample_rate']
+
+    @property
+    def PROFILING_INTERVAL_MS(self) -> float:
+        return self._yaml_config['profiling']['interval_ms']
+
+    @property
+    def PROFILING_MAX_SECONDS(self) -> float:
+        return self._yaml_config['profiling']['max_seconds']
+
+    @property
+    def PROFILING_DIRECTORY(self) -> str:
+        return self._yaml_config['profiling']['directory']
+
+    # Load shedding
+    @property
+    def LOAD_SHEDDING_ENABLED(self) -> bool:
+        return self._yaml_config['load_shedding']['enabled']
+
+    @property
+    def LOAD_SHEDDING_MAX_LOOP_LAG_MS(self) -> float:
+        return self._yaml_config['load_shedding']['max_loop_lag_ms']
+
+    @property
+    def LOAD_SHEDDING_MAX_IN_FLIGHT(self) -> int:
+        return self._yaml_config['load_shedding']['max_in_flight']
+
+    @property
+    def LOAD_SHEDDING_RETRY_AFTER(self) -> int:
+        return self._yaml_config['load_shedding']['retry_after']
+
+    @property
+    def LOAD_SHEDDING_LOW_PRIORITY_PATHS(self) -> List[str]:
+        return self._yaml_config['load_shedding']['low_priority_paths']
+
+    # AI scheduler
+    @property
+    def AI_SCHEDULER_MAX_IN_FLIGHT(self) -> int:
+        return self._yaml_config['ai_scheduler']['max_in_flight']
+
+    @property
+    def AI_SCHEDULER_QUEUE_TIMEOUT(self) -> float:
+        return self._yaml_config['ai_scheduler']['queue_timeout']
+
+    @property
+    def AI_SCHEDULER_WEIGHTS(self) -> Dict[str, float]:
+        return self._yaml_config['ai_scheduler']['weights']
+
+    # Document analysis
+    @property
+    def DOCUMENT_ANALYSIS_CHUNK_TOKENS(self) -> int:
+        return self._yaml_config['document_analysis']['chunk_tokens']
+
+    @property
+    def DOCUMENT_ANALYSIS_TOKEN_BUDGET(self) -> int:
+        return self._yaml_config['document_analysis']['token_budget']
+
+    @property
+    def DOCUMENT_ANALYSIS_MAX_CONCURRENCY(self) -> int:
+        return self._yaml_config['document_analysis']['max_concurrency']
+
+    # Speculative pre-analysis
+    @property
+    def PRE_ANALYSIS_ENABLED(self) -> bool:
+        return self._yaml_config['pre_analysis']['enabled']
+
+    @property
+    def PRE_ANALYSIS_TIERS(self) -> List[str]:
+        return self._yaml_config['pre_analysis']['tiers']
+
+    @property
+    def PRE_ANALYSIS_DEBOUNCE(self) -> float:
+        return self._yaml_config['pre_analysis']['debounce']
+
+    @property
+    def PRE_ANALYSIS_RATE_BUDGET(self) -> int:
+        return self._yaml_config['pre_analysis']['rate_budget']
+
+    # Background jobs
+    @property
+    def JOBS_WORKERS(self) -> int:
+        return self._yaml_config['jobs']['workers']
+
+    @property
+    def JOBS_MAX_ATTEMPTS(self) -> int:
+        return self._yaml_config['jobs']['max_attempts']
+
+    @property
+    def JOBS_RETRY_BACKOFF(self) -> float:
+        return self._yaml_config['jobs']['retry_backoff']
+
+    @property
+    def JOBS_LEASE_SECONDS(self) -> int:
+        return self._yaml_config['jobs']['lease_seconds']
+
+    @property
+    def JOBS_RESULT_TTL(self) -> int:
+        return self._yaml_config['jobs']['result_ttl']
+
+    @property
+    def JOBS_POLL_INTERVAL(self) -> float:
+        return self._yaml_config['jobs']['poll_interval']
+
     class Config:
         validate_assignment = True
         arbitrary_types_allowed = True
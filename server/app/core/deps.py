@@ -1,11 +1,15 @@
 from typing import Generator, Optional
-from fastapi import Depends, HTTPException, status, Request
+import time
+from fastapi import Depends, Header, HTTPException, status, Request
 from sqlalchemy.orm import Session
 from app.core import security
 from app.core.config import settings
 from app.database import SessionLocal
 from app.models.user import User
 from app.core.rate_limiter import rate_limiter
+from app.core.load_shedding import tier_cache
+from app.core.tracing import traced
+from app.services.ai_scheduler import current_tier, request_deadline
 
 oauth2_scheme = security.oauth2_scheme
 
@@ -16,6 +20,7 @@ def get_db() -> Generator:
     finally:
         db.close()
 
+@traced("get_current_user")
 async def get_current_user(
     db: Session = Depends(get_db),
     token: str = Depends(oauth2_scheme)
@@ -26,6 +31,7 @@ async def get_current_user(
         user = db.query(User).filter(User.id == user_id).first()
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
+        tier_cache.set(user.id, user.subscription_tier)
         return user
     except Exception as e:
         raise HTTPException(
@@ -34,12 +40,28 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+async def require_admin(
+    x_admin_token: Optional[str] = Header(None)
+) -> None:
+    """Allow only requests carrying the configured admin token."""
+    if not security.verify_admin_token(x_admin_token):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+
+@traced("check_rate_limit")
 async def check_rate_limit(
     request: Request,
     current_user: Optional[User] = Depends(get_current_user)
 ) -> None:
     """Check rate limits for AI endpoints."""
     await rate_limiter.check_rate_limit(request, current_user)
+    # Let the AI scheduler queue this request's calls by tier, until the
+    # client would give up
+    if current_user is not None and current_user.subscription_tier:
+        current_tier.set(current_user.subscription_tier)
+    request_deadline.set(time.monotonic() + settings.AI_SCHEDULER_QUEUE_TIMEOUT)
 
 async def get_rate_limit_info(
     request: Request,
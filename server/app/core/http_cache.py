@@ -0,0 +1,30 @@
+from typing import Any, Optional
+import hashlib
+
+# Cache-Control for representations that can change (always revalidate)
+REVALIDATE_CACHE_CONTROL = "private, no-cache"
+
+# Cache-Control for representations that never change once created
+IMMUTABLE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+def make_etag(*parts: Any) -> str:
+    """Build a strong ETag from the values identifying a representation."""
+    digest = hashlib.sha1(
+        ":".join(str(part) for part in parts).encode("utf-8")
+    ).hexdigest()
+    return f'"{digest}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header value against an ETag."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        # If-None-Match uses weak comparison
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
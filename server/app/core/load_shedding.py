@@ -0,0 +1,162 @@
+from typing import Dict, Optional, Tuple
+import asyncio
+import json
+import threading
+import time
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.security import verify_token
+from app.models.user import SubscriptionTier
+
+loop_lag = metrics.histogram(
+    "event_loop_lag_seconds", "Delay of the loop lag probe beyond its scheduled time",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+shed_requests = metrics.counter(
+    "load_shed_requests_total", "Low-priority requests rejected while overloaded", ["reason"]
+)
+
+class LoopLagMonitor:
+    """
+    Measures event loop lag as the drift of a periodic timer.
+
+    A blocked loop (sync DB calls, bcrypt, JSON parsing of large bodies)
+    wakes the probe late; the delay is the time every other coroutine also
+    had to wait.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+        # Probe settings
+        self.INTERVAL = 0.1  # seconds
+        self.DECAY = 0.8  # weight of the previous value in the smoothed lag
+
+        self.lag = 0.0  # seconds, smoothed
+        self.max_lag = 0.0
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            scheduled = loop.time() + self.INTERVAL
+            await asyncio.sleep(self.INTERVAL)
+            lag = max(0.0, loop.time() - scheduled)
+            loop_lag.observe(lag)
+            # Rise immediately, recover gradually
+            self.lag = max(lag, self.DECAY * self.lag + (1 - self.DECAY) * lag)
+            self.max_lag = max(self.max_lag, lag)
+
+class TierCache:
+    """Subscription tiers of recently authenticated users."""
+
+    def __init__(self):
+        # Format: {user_id: (expires_at, tier)}
+        self._entries: Dict[int, Tuple[float, SubscriptionTier]] = {}
+        self._lock = threading.Lock()
+
+        # Cache settings
+        self.TTL = 300  # seconds
+        self.MAX_ENTRIES = 50000
+
+    def get(self, user_id: int) -> Optional[SubscriptionTier]:
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def set(self, user_id: int, tier: SubscriptionTier) -> None:
+        with self._lock:
+            if len(self._entries) >= self.MAX_ENTRIES:
+                self._entries.clear()
+            self._entries[user_id] = (time.monotonic() + self.TTL, tier)
+
+# Global instances
+loop_monitor = LoopLagMonitor()
+tier_cache = TierCache()
+
+# Requests currently being handled by LoadSheddingMiddleware
+_in_flight = 0
+
+def _collect_metrics():
+    yield "event_loop_lag_smoothed_seconds", "gauge", "Smoothed event loop lag", [({}, loop_monitor.lag)]
+    yield "http_requests_in_flight", "gauge", "HTTP requests being handled", [({}, _in_flight)]
+
+metrics.register_collector(_collect_metrics)
+
+class LoadSheddingMiddleware:
+    """
+    ASGI middleware rejecting low-priority requests while overloaded.
+
+    The server is overloaded when the smoothed loop lag or the number of
+    requests in flight exceeds its threshold. Low-priority requests are AI
+    calls by anonymous or free-tier users; they get a 503 with Retry-After,
+    while other requests are always admitted. Tiers come from
+    ``tier_cache`` so that no database query is needed here; users not seen
+    recently are admitted.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    @staticmethod
+    def _overload_reason() -> Optional[str]:
+        if loop_monitor.lag * 1000 > settings.LOAD_SHEDDING_MAX_LOOP_LAG_MS:
+            return "loop_lag"
+        if _in_flight >= settings.LOAD_SHEDDING_MAX_IN_FLIGHT:
+            return "in_flight"
+        return None
+
+    @staticmethod
+    def _low_priority(scope) -> bool:
+        # CORS preflights are cheap, and shedding them fails the real request too
+        if scope["method"] == "OPTIONS":
+            return False
+        if not scope["path"].startswith(tuple(settings.LOAD_SHEDDING_LOW_PRIORITY_PATHS)):
+            return False
+        authorization = dict(scope.get("headers", [])).get(b"authorization", b"").decode("latin-1")
+        scheme, _, token = authorization.partition(" ")
+        user_id = verify_token(token) if scheme.lower() == "bearer" and token else None
+        if user_id is None:
+            return True
+        return tier_cache.get(user_id) == SubscriptionTier.FREE
+
+    async def __call__(self, scope, receive, send):
+        global _in_flight
+        if scope["type"] != "http" or not settings.LOAD_SHEDDING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        reason = self._overload_reason()
+        if reason and self._low_priority(scope):
+            shed_requests.labels(reason).inc()
+            retry_after = settings.LOAD_SHEDDING_RETRY_AFTER
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"retry-after", str(retry_after).encode())
+                ]
+            })
+            await send({
+                "type": "http.response.body",
+                "body": json.dumps({
+                    "detail": "Server is busy, please retry shortly"
+                }).encode()
+            })
+            return
+
+        _in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _in_flight -= 1
@@ -0,0 +1,84 @@
+from typing import Optional, Dict, Tuple
+from collections import OrderedDict
+import threading
+import time
+
+from app.core.metrics import metrics
+from app.models.collaboration import CollaborationRole
+
+class PermissionCache:
+    def __init__(self):
+        # Cached effective roles
+        # Format: {(document_id, user_id): (expires_at, role or None)}
+        self._entries: "OrderedDict[Tuple[int, int], Tuple[float, Optional[CollaborationRole]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Cache settings
+        self.TTL = 60  # seconds
+        self.MAX_ENTRIES = 10000
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, document_id: int, user_id: int) -> Tuple[bool, Optional[CollaborationRole]]:
+        """Look up a cached role. Returns (found, role); role None means no access."""
+        key = (document_id, user_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    def set(self, document_id: int, user_id: int, role: Optional[CollaborationRole]) -> None:
+        """Cache the effective role of a user on a document."""
+        key = (document_id, user_id)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.TTL, role)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.MAX_ENTRIES:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, document_id: int, user_id: Optional[int] = None) -> None:
+        """Drop cached roles for a document, or for one user on that document."""
+        with self._lock:
+            if user_id is not None:
+                self._entries.pop((document_id, user_id), None)
+            else:
+                for key in [k for k in self._entries if k[0] == document_id]:
+                    del self._entries[key]
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        """Drop all cached roles."""
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict:
+        """Get cache hit rate metrics."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+# Global permission cache instance
+permission_cache = PermissionCache()
+
+def _collect_metrics():
+    stats = permission_cache.get_stats()
+    yield "permission_cache_hits_total", "counter", "Permission cache hits", [({}, stats["hits"])]
+    yield "permission_cache_misses_total", "counter", "Permission cache misses", [({}, stats["misses"])]
+    yield "permission_cache_hit_ratio", "gauge", "Permission cache hit ratio", [({}, stats["hit_rate"])]
+
+metrics.register_collector(_collect_metrics)
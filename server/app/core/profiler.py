@@ -0,0 +1,175 @@
+from typing import Any, Collection, Dict, List, Optional
+from collections import Counter, OrderedDict
+from datetime import datetime
+from pathlib import Path
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+
+from app.core.config import settings
+from app.core.query_stats import route_name
+from app.core.security import verify_admin_token
+
+logger = logging.getLogger(__name__)
+
+# Threads running request code: the event loop and the sync handler threadpool
+WORKER_THREAD_PREFIXES = ("AnyIO worker thread", "ThreadPoolExecutor")
+
+# Modules whose frames at the top of a stack mean the thread is idle
+IDLE_MODULES = ("threading.py", "selectors.py", "queue.py", "base_events.py")
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+class StackSampler:
+    """
+    Samples the stacks of a set of threads from a background thread.
+
+    Stacks are aggregated in the folded format read by flamegraph.pl and
+    speedscope: one line per distinct stack, root first, with its count.
+    """
+
+    def __init__(self, thread_ids: Collection[int], interval: float):
+        self.thread_ids = set(thread_ids)
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _worker_threads(self) -> List[int]:
+        return [
+            thread.ident for thread in threading.enumerate()
+            if thread.name.startswith(WORKER_THREAD_PREFIXES)
+        ]
+
+    def _run(self) -> None:
+        deadline = time.monotonic() + settings.PROFILING_MAX_SECONDS
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            thread_ids = self.thread_ids.union(self._worker_threads())
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id not in thread_ids:
+                    continue
+                if os.path.basename(frame.f_code.co_filename) in IDLE_MODULES:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+class ProfileStore:
+    """Saved profiles on disk, newest last, capped at ``MAX_PROFILES``."""
+
+    def __init__(self):
+        # Format: {profile_id: {"id", "route", "created_at", "duration_ms", "samples", "path"}}
+        self._profiles: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Store settings
+        self.MAX_PROFILES = 100
+
+    def save(self, profile_id: str, route: str, sampler: StackSampler, duration: float) -> None:
+        directory = Path(settings.PROFILING_DIRECTORY)
+        directory.mkdir(parents=True, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_")
+        path = directory / f"{profile_id}_{slug}.folded"
+        path.write_text(sampler.folded())
+
+        with self._lock:
+            self._profiles[profile_id] = {
+                "id": profile_id,
+                "route": route,
+                "created_at": datetime.utcnow().isoformat(),
+                "duration_ms": duration * 1000,
+                "samples": sampler.samples,
+                "path": str(path)
+            }
+            while len(self._profiles) > self.MAX_PROFILES:
+                _, oldest = self._profiles.popitem(last=False)
+                Path(oldest["path"]).unlink(missing_ok=True)
+
+    def list(self, route: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            profiles = list(self._profiles.values())
+        return [
+            {k: v for k, v in p.items() if k != "path"}
+            for p in reversed(profiles)
+            if route is None or p["route"] == route
+        ]
+
+    def get_path(self, profile_id: str) -> Optional[Path]:
+        with self._lock:
+            profile = self._profiles.get(profile_id)
+        return Path(profile["path"]) if profile else None
+
+# Global profile store
+profile_store = ProfileStore()
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware profiling selected requests with a stack sampler.
+
+    A request is profiled when it carries ``X-Profile: 1`` with a valid
+    ``X-Admin-Token``, or at random with ``profiling.sample_rate``. Only one
+    request is profiled at a time, and sampling covers the event loop and
+    threadpool threads, so concurrent requests can show up in a profile.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._busy = threading.Lock()
+
+    def _requested(self, scope) -> bool:
+        headers = dict(scope.get("headers", []))
+        if headers.get(b"x-profile") == b"1":
+            return verify_admin_token(headers.get(b"x-admin-token", b"").decode("latin-1"))
+        sample_rate = settings.PROFILING_SAMPLE_RATE
+        return sample_rate > 0 and random.random() < sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._requested(scope):
+            await self.app(scope, receive, send)
+            return
+        if not self._busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex[:12]
+        sampler = StackSampler([threading.get_ident()], settings.PROFILING_INTERVAL_MS / 1000)
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", profile_id.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            sampler.stop()
+            self._busy.release()
+            try:
+                profile_store.save(profile_id, route_name(scope), sampler, time.perf_counter() - started)
+            except OSError as e:
+                logger.warning(f"Failed to save profile: {str(e)}")
@@ -0,0 +1,292 @@
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+from abc import ABC, abstractmethod
+from collections import deque
+import asyncio
+import json
+import logging
+import time
+import uuid
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+Message = Dict[str, Any]
+BatchCallback = Callable[[List[Message]], Awaitable[None]]
+
+class Subscription:
+    """
+    Bounded outbox delivering messages to one consumer in batches.
+
+    Publishing only appends to the queue; a dedicated task drains it, so a
+    slow consumer never stalls the publisher or other subscribers. When the
+    queue is full the oldest message is dropped and ``overflowed`` is set, so
+    the consumer can resynchronise.
+    """
+
+    def __init__(
+        self,
+        callback: BatchCallback,
+        channel: Optional[str] = None,
+        max_queue: Optional[int] = None,
+        batch_size: Optional[int] = None
+    ):
+        self.channel = channel
+        self.callback = callback
+        self.max_queue = max_queue or settings.PUBSUB_MAX_QUEUE
+        self.batch_size = batch_size or settings.PUBSUB_BATCH_SIZE
+        self.overflowed = False
+
+        self._queue: Deque[Message] = deque()
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.delivered = 0
+        self.dropped = 0
+
+    def start(self) -> "Subscription":
+        self._task = asyncio.create_task(self._drain())
+        return self
+
+    def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        self._queue.clear()
+
+    @property
+    def pending(self) -> int:
+        return len(self._queue)
+
+    def push(self, message: Message) -> None:
+        """Queue a message without waiting for the consumer."""
+        if len(self._queue) >= self.max_queue:
+            self._queue.popleft()
+            self.dropped += 1
+            self.overflowed = True
+        self._queue.append(message)
+        self._ready.set()
+
+    async def _drain(self) -> None:
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            while self._queue:
+                batch = []
+                while self._queue and len(batch) < self.batch_size:
+                    batch.append(self._queue.popleft())
+                try:
+                    await self.callback(batch)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.warning(f"Subscriber on {self.channel} failed: {str(e)}")
+                self.delivered += len(batch)
+
+class PubSub(ABC):
+    """
+    Routes messages published on a channel to every subscriber of it.
+
+    Backends also provide leases, so exactly one worker at a time can own a
+    resource such as a collaboration room.
+    """
+
+    def __init__(self):
+        self.worker_id = uuid.uuid4().hex
+        self._subscriptions: Dict[str, Set[Subscription]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        # Metrics
+        self.published = 0
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+
+    async def stop(self) -> None:
+        for subscriptions in self._subscriptions.values():
+            for subscription in subscriptions:
+                subscription.close()
+        self._subscriptions.clear()
+
+    async def subscribe(self, channel: str, callback: BatchCallback) -> Subscription:
+        """Subscribe to a channel; messages are delivered to the callback in batches."""
+        subscription = Subscription(callback, channel=channel).start()
+        self._subscriptions.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    async def unsubscribe(self, subscription: Subscription) -> None:
+        subscription.close()
+        subscriptions = self._subscriptions.get(subscription.channel)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[subscription.channel]
+
+    def _deliver(self, channel: str, message: Message) -> None:
+        for subscription in self._subscriptions.get(channel, ()):
+            subscription.push(message)
+
+    @abstractmethod
+    async def publish(self, channel: str, message: Message) -> None:
+        """Deliver a message to the channel's subscribers on every worker."""
+
+    @abstractmethod
+    async def acquire(self, key: str, ttl: float) -> bool:
+        """Take or renew a lease for this worker; False if another worker holds it."""
+
+    @abstractmethod
+    async def release(self, key: str) -> None:
+        """Give up a lease held by this worker."""
+
+    def publish_threadsafe(self, channel: str, message: Message) -> None:
+        """Publish from a worker thread, e.g. a sync request handler."""
+        if self._loop is None or self._loop.is_closed():
+            return
+        asyncio.run_coroutine_threadsafe(self.publish(channel, message), self._loop)
+
+    def get_stats(self) -> Dict[str, Any]:
+        subscriptions = [s for subs in self._subscriptions.values() for s in subs]
+        return {
+            "backend": type(self).__name__,
+            "channels": len(self._subscriptions),
+            "subscriptions": len(subscriptions),
+            "published": self.published,
+            "delivered": sum(s.delivered for s in subscriptions),
+            "dropped": sum(s.dropped for s in subscriptions),
+            "pending": sum(s.pending for s in subscriptions)
+        }
+
+class InProcessPubSub(PubSub):
+    """Pub/sub within a single worker process."""
+
+    def __init__(self):
+        super().__init__()
+        # Format: {key: (worker_id, expires_at)}
+        self._leases: Dict[str, Tuple[str, float]] = {}
+
+    async def publish(self, channel: str, message: Message) -> None:
+        self.published += 1
+        self._deliver(channel, message)
+
+    async def acquire(self, key: str, ttl: float) -> bool:
+        now = time.monotonic()
+        holder = self._leases.get(key)
+        if holder is not None and holder[0] != self.worker_id and holder[1] > now:
+            return False
+        self._leases[key] = (self.worker_id, now + ttl)
+        return True
+
+    async def release(self, key: str) -> None:
+        holder = self._leases.get(key)
+        if holder is not None and holder[0] == self.worker_id:
+            del self._leases[key]
+
+# Take the lease if it is free or already ours, renewing its expiry
+ACQUIRE_SCRIPT = """
+local holder = redis.call('GET', KEYS[1])
+if holder and holder ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+return 1
+"""
+
+# Delete the lease only if it is still ours
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+class RedisPubSub(PubSub):
+    """
+    Pub/sub across worker processes through a Redis server.
+
+    Messages are delivered to local subscribers immediately and forwarded to
+    Redis in pipelined batches; messages echoed back from Redis by this worker
+    are ignored. Leases are Redis keys holding the owner's worker id.
+    """
+
+    def __init__(self, url: str, prefix: str):
+        import redis.asyncio as redis
+
+        super().__init__()
+        self._redis = redis.from_url(url)
+        self._prefix = prefix
+        self._pubsub = None
+        self._tasks: List[asyncio.Task] = []
+        self._outbox = Subscription(self._forward, channel="redis")
+
+    async def start(self) -> None:
+        await super().start()
+        self._pubsub = self._redis.pubsub()
+        await self._pubsub.psubscribe(f"{self._prefix}*")
+        self._outbox.start()
+        self._tasks.append(asyncio.create_task(self._listen()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        self._outbox.close()
+        if self._pubsub is not None:
+            await self._pubsub.close()
+        await self._redis.close()
+        await super().stop()
+
+    async def publish(self, channel: str, message: Message) -> None:
+        self.published += 1
+        self._deliver(channel, message)
+        self._outbox.push({"channel": channel, "message": message})
+
+    async def acquire(self, key: str, ttl: float) -> bool:
+        acquired = await self._redis.eval(
+            ACQUIRE_SCRIPT, 1, f"{self._prefix}lease:{key}", self.worker_id, int(ttl * 1000)
+        )
+        return bool(acquired)
+
+    async def release(self, key: str) -> None:
+        await self._redis.eval(RELEASE_SCRIPT, 1, f"{self._prefix}lease:{key}", self.worker_id)
+
+    async def _forward(self, batch: List[Message]) -> None:
+        pipeline = self._redis.pipeline(transaction=False)
+        for item in batch:
+            pipeline.publish(
+                f"{self._prefix}{item['channel']}",
+                json.dumps({"origin": self.worker_id, "message": item["message"]}, default=str)
+            )
+        await pipeline.execute()
+
+    async def _listen(self) -> None:
+        async for item in self._pubsub.listen():
+            if item.get("type") != "pmessage":
+                continue
+            try:
+                payload = json.loads(item["data"])
+                if payload.get("origin") == self.worker_id:
+                    continue
+                channel = item["channel"]
+                if isinstance(channel, bytes):
+                    channel = channel.decode("utf-8")
+                self._deliver(channel[len(self._prefix):], payload["message"])
+            except Exception as e:
+                logger.warning(f"Ignoring malformed pub/sub message: {str(e)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = super().get_stats()
+        stats["outbox_pending"] = self._outbox.pending
+        stats["outbox_dropped"] = self._outbox.dropped
+        return stats
+
+def create_pubsub() -> PubSub:
+    """Create the pub/sub backend configured in settings."""
+    if settings.PUBSUB_BACKEND == "redis":
+        try:
+            return RedisPubSub(settings.PUBSUB_REDIS_URL, settings.PUBSUB_CHANNEL_PREFIX)
+        except ImportError:
+            logger.warning("redis is not installed, falling back to in-process pub/sub")
+    return InProcessPubSub()
+
+# Global pub/sub instance
+pubsub = create_pubsub()
@@ -0,0 +1,101 @@
+from typing import Any, Deque, Dict, List
+from collections import deque
+import logging
+import threading
+
+from app.core.config import settings
+from app.core.query_stats import current_query_stats, statement_shape
+
+logger = logging.getLogger(__name__)
+
+class _Fingerprint:
+    __slots__ = ("count", "total", "max", "recent", "routes")
+
+    def __init__(self, sample_size: int):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent: Deque[float] = deque(maxlen=sample_size)
+        self.routes: Dict[str, int] = {}
+
+class QueryProfiler:
+    """
+    Aggregates query timings by statement fingerprint.
+
+    A fingerprint is the statement with its literals stripped. The p95 is
+    computed over the most recent ``SAMPLE_SIZE`` executions. Statements
+    slower than the configured threshold are logged with the route that
+    issued them. Timings come from the query_stats listener, see
+    ``query_stats.add_query_observer``.
+    """
+
+    def __init__(self):
+        # Format: {fingerprint: _Fingerprint}
+        self._fingerprints: Dict[str, _Fingerprint] = {}
+        self._lock = threading.Lock()
+
+        # Profiler settings
+        self.SAMPLE_SIZE = 1000
+        self.MAX_FINGERPRINTS = 2000
+
+        # Metrics
+        self.slow_queries = 0
+        self.untracked = 0
+
+    def observe(self, statement: str, duration: float) -> None:
+        fingerprint = statement_shape(statement)
+        stats = current_query_stats()
+        route = (stats.route if stats is not None else None) or "<background>"
+
+        with self._lock:
+            entry = self._fingerprints.get(fingerprint)
+            if entry is None:
+                if len(self._fingerprints) >= self.MAX_FINGERPRINTS:
+                    self.untracked += 1
+                    return
+                entry = self._fingerprints[fingerprint] = _Fingerprint(self.SAMPLE_SIZE)
+            entry.count += 1
+            entry.total += duration
+            entry.max = max(entry.max, duration)
+            entry.recent.append(duration)
+            entry.routes[route] = entry.routes.get(route, 0) + 1
+
+        if duration * 1000 >= settings.SLOW_QUERY_MS:
+            self.slow_queries += 1
+            logger.warning(f"Slow query ({duration * 1000:.1f} ms) in {route}: {fingerprint}")
+
+    def top(self, limit: int = 20, order_by: str = "total") -> List[Dict[str, Any]]:
+        """Fingerprints with the highest total, p95, max or count, highest first."""
+        with self._lock:
+            rows = []
+            for fingerprint, entry in self._fingerprints.items():
+                recent = sorted(entry.recent)
+                rows.append({
+                    "fingerprint": fingerprint,
+                    "count": entry.count,
+                    "total_ms": entry.total * 1000,
+                    "mean_ms": entry.total * 1000 / entry.count,
+                    "p95_ms": recent[int(0.95 * (len(recent) - 1))] * 1000,
+                    "max_ms": entry.max * 1000,
+                    "routes": dict(sorted(entry.routes.items(), key=lambda r: -r[1])[:5])
+                })
+        key = "count" if order_by == "count" else f"{order_by}_ms"
+        rows.sort(key=lambda row: row[key], reverse=True)
+        return rows[:limit]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._fingerprints.clear()
+            self.slow_queries = 0
+            self.untracked = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "fingerprints": len(self._fingerprints),
+            "slow_queries": self.slow_queries,
+            "untracked": self.untracked,
+            "slow_query_ms": settings.SLOW_QUERY_MS
+        }
+
+# Global query profiler instance
+query_profiler = QueryProfiler()
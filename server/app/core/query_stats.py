@@ -0,0 +1,188 @@
+from typing import Any, Callable, Dict, List, Optional
+from collections import Counter
+from contextvars import ContextVar
+import logging
+import re
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Literals and expanded IN lists, replaced to get a statement's shape
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\((?:\s*(?:\?|%\(\w+\)s|:\w+|__\[POSTCOMPILE_\w+\])\s*,?)+\)")
+_WHITESPACE = re.compile(r"\s+")
+
+def statement_shape(statement: str) -> str:
+    """Normalise a SQL statement so calls differing only in parameters compare equal."""
+    shape = _STRING_LITERAL.sub("?", statement)
+    shape = _NUMBER_LITERAL.sub("?", shape)
+    shape = _PLACEHOLDER_LIST.sub("(?)", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+def route_name(scope: Dict[str, Any]) -> str:
+    """Method and route template of a request, e.g. ``GET /documents/{document_id}``."""
+    # Unmatched paths are grouped so that they cannot grow the metrics
+    route = getattr(scope.get("route"), "path", "<unmatched>")
+    return f"{scope['method']} {route}"
+
+class RequestQueryStats:
+    """Queries issued while handling one request."""
+
+    def __init__(self, scope: Optional[Dict[str, Any]] = None):
+        self.scope = scope
+        self.count = 0
+        self.duration = 0.0  # seconds
+        self.shapes: Counter = Counter()
+
+    def record(self, statement: str, duration: float) -> None:
+        self.count += 1
+        self.duration += duration
+        self.shapes[statement_shape(statement)] += 1
+
+    @property
+    def route(self) -> Optional[str]:
+        return route_name(self.scope) if self.scope is not None else None
+
+    def repeated(self, threshold: int) -> Dict[str, int]:
+        """Statement shapes issued at least ``threshold`` times (likely N+1)."""
+        return {shape: n for shape, n in self.shapes.items() if n >= threshold}
+
+_current: ContextVar[Optional[RequestQueryStats]] = ContextVar("query_stats", default=None)
+
+def current_query_stats() -> Optional[RequestQueryStats]:
+    return _current.get()
+
+# Callbacks given the statement and duration of every completed query
+_observers: List[Callable[[str, float], None]] = []
+
+def add_query_observer(observer: Callable[[str, float], None]) -> None:
+    """Pass the timing of every query to ``observer``, e.g. the query profiler."""
+    _observers.append(observer)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info["query_start"].pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.record(statement, duration)
+    for observer in _observers:
+        observer(statement, duration)
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute
+    conn = exception_context.connection
+    starts = conn.info.get("query_start") if conn is not None else None
+    if starts:
+        starts.pop()
+
+def install(engine: Engine) -> None:
+    """Time the queries an engine executes and count them against the current request."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+class QueryMetrics:
+    """Per-route query counts aggregated over all requests."""
+
+    def __init__(self):
+        # Format: {route: {"requests": n, "queries": n, "db_time": s, "max_queries": n, "n_plus_one": n}}
+        self._routes: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, route: str, stats: RequestQueryStats, n_plus_one: int) -> None:
+        with self._lock:
+            metrics = self._routes.setdefault(route, {
+                "requests": 0,
+                "queries": 0,
+                "db_time": 0.0,
+                "max_queries": 0,
+                "n_plus_one": 0
+            })
+            metrics["requests"] += 1
+            metrics["queries"] += stats.count
+            metrics["db_time"] += stats.duration
+            metrics["max_queries"] = max(metrics["max_queries"], stats.count)
+            metrics["n_plus_one"] += n_plus_one
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                route: {
+                    **metrics,
+                    "avg_queries": metrics["queries"] / metrics["requests"],
+                    "avg_db_time_ms": metrics["db_time"] * 1000 / metrics["requests"]
+                }
+                for route, metrics in self._routes.items()
+            }
+
+class QueryStatsMiddleware:
+    """
+    ASGI middleware counting the SQL queries and DB time of each request.
+
+    Statement shapes repeated ``QUERY_N_PLUS_ONE_THRESHOLD`` times or more in
+    one request are logged as likely N+1 queries. In debug mode the counts
+    are also returned as ``X-Query-*`` response headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestQueryStats(scope)
+        token = _current.set(stats)
+        threshold = settings.QUERY_N_PLUS_ONE_THRESHOLD
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start" and settings.DEBUG:
+                headers = list(message.get("headers", []))
+                headers += [
+                    (b"x-query-count", str(stats.count).encode()),
+                    (b"x-query-time-ms", f"{stats.duration * 1000:.1f}".encode()),
+                    (b"x-query-repeated", str(len(stats.repeated(threshold))).encode())
+                ]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _current.reset(token)
+            route_path = route_name(scope)
+            repeated = stats.repeated(threshold)
+            for shape, count in repeated.items():
+                logger.warning(f"Possible N+1 in {route_path}: {count}x {shape}")
+            query_metrics.observe(route_path, stats, len(repeated))
+
+# Global per-route query metrics
+query_metrics = QueryMetrics()
+
+def _collect_metrics():
+    routes = query_metrics.get_stats()
+    yield "db_requests_total", "counter", "Requests observed by the query counter", [
+        ({"route": route}, m["requests"]) for route, m in routes.items()
+    ]
+    yield "db_queries_total", "counter", "SQL queries executed", [
+        ({"route": route}, m["queries"]) for route, m in routes.items()
+    ]
+    yield "db_query_seconds_total", "counter", "Time spent in SQL queries", [
+        ({"route": route}, m["db_time"]) for route, m in routes.items()
+    ]
+    yield "db_n_plus_one_total", "counter", "Statement shapes repeated past the N+1 threshold", [
+        ({"route": route}, m["n_plus_one"]) for route, m in routes.items()
+    ]
+
+metrics.register_collector(_collect_metrics)
@@ -2,6 +2,7 @@ from typing import Optional, Dict, Tuple
 import time
 from fastapi import HTTPException, Request
 from app.core.config import settings
+from app.core.metrics import rate_limit_rejections
 
 class RateLimiter:
     def __init__(self):
@@ -33,6 +34,7 @@ class RateLimiter:
             "/api/v1/ai/suggest-transitions": 2,
             "/api/v1/ai/check-arguments": 3,
             "/api/v1/ai/suggest-evidence": 2,
+            "/api/v1/ai/analyze-document": 8,
         }
 
     def _cleanup_old_requests(self, user_id: int, endpoint: str) -> None:
@@ -62,9 +64,11 @@ class RateLimiter:
 
     async def check_rate_limit(self, request: Request, user: Optional[Dict] = None) -> None:
         """Check if the request is within rate limits."""
-        endpoint = request.url.path
         user_id = user.id if user else 0  # Use 0 for unauthenticated users
-        
+        self.consume(user_id, request.url.path)
+
+    def consume(self, user_id: int, endpoint: str) -> None:
+        """Charge one request to an endpoint's budget, raising 429 if it would exceed it."""
         # Initialize user's request history if needed
         if user_id not in self._requests:
             self._requests[user_id] = {}
@@ -80,6 +84,7 @@ class RateLimiter:
 
         # Check if adding this request would exceed the limit
         if tokens_used + token_cost > self.MAX_TOKENS_PER_HOUR:
+            rate_limit_rejections.labels(endpoint).inc()
             raise HTTPException(
                 status_code=429,
                 detail="Rate limit exceeded. Please try again later."
@@ -89,6 +94,14 @@ class RateLimiter:
         current_time = time.time()
         self._requests[user_id][endpoint].append((current_time, token_cost))
 
+    def try_consume(self, user_id: int, endpoint: str, cost: int, limit: Optional[int] = None) -> bool:
+        """Record usage by background work if it fits in the window; never raises."""
+        self._cleanup_old_requests(user_id, endpoint)
+        if self._get_tokens_used(user_id, endpoint) + cost > (limit or self.MAX_TOKENS_PER_HOUR):
+            return False
+        self._requests.setdefault(user_id, {}).setdefault(endpoint, []).append((time.time(), cost))
+        return True
+
     def get_rate_limit_info(self, request: Request, user: Optional[Dict] = None) -> Dict:
         """Get rate limit information for the user."""
         endpoint = request.url.path
@@ -1,5 +1,6 @@
 from datetime import datetime, timedelta
 from typing import Optional, Union
+import secrets
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
@@ -49,3 +50,8 @@ def verify_token(token: str) -> Optional[int]:
         return int(user_id)
     except (JWTError, ValueError):
         return None
+
+def verify_admin_token(token: Optional[str]) -> bool:
+    """Check a token against the configured admin token, if there is one."""
+    admin_token = settings.ADMIN_TOKEN
+    return bool(admin_token and token) and secrets.compare_digest(token, admin_token)
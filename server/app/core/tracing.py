@@ -0,0 +1,352 @@
+from typing import Any, Deque, Dict, Iterator, List, Optional
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+from app.core.query_stats import route_name
+
+logger = logging.getLogger(__name__)
+
+# OTLP span kinds
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+
+# OTLP status codes
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+class Span:
+    """A timed operation within a trace."""
+
+    __slots__ = (
+        "trace_id", "span_id", "parent_id", "name", "kind",
+        "start_ns", "end_ns", "attributes", "status", "status_message"
+    )
+
+    def __init__(
+        self,
+        name: str,
+        parent: Optional["Span"] = None,
+        kind: int = SPAN_KIND_INTERNAL,
+        attributes: Optional[Dict[str, Any]] = None,
+        trace_id: Optional[str] = None,
+        parent_id: Optional[str] = None
+    ):
+        self.trace_id = parent.trace_id if parent else trace_id or os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.status = 0
+        self.status_message = ""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_error(self, error: BaseException) -> None:
+        self.status = STATUS_ERROR
+        self.status_message = f"{type(error).__name__}: {error}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": (self.end_ns - self.start_ns) / 1e6 if self.end_ns else None,
+            "attributes": self.attributes,
+            "status": self.status,
+            "status_message": self.status_message
+        }
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+class JsonFileExporter:
+    """Appends finished spans to a file, one JSON object per line."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def export(self, spans: List[Span]) -> None:
+        with open(self.path, "a") as f:
+            for span in spans:
+                f.write(json.dumps(span.to_dict(), default=str) + "\n")
+
+class OtlpHttpExporter:
+    """Sends finished spans to an OTLP/HTTP collector as JSON."""
+
+    def __init__(self, endpoint: str, service_name: str):
+        self.endpoint = endpoint
+        self.service_name = service_name
+
+    def export(self, spans: List[Span]) -> None:
+        import requests
+
+        payload = {
+            "resourceSpans": [{
+                "resource": {"attributes": [
+                    {"key": "service.name", "value": {"stringValue": self.service_name}}
+                ]},
+                "scopeSpans": [{
+                    "scope": {"name": "academic_writer"},
+                    "spans": [
+                        {
+                            "traceId": span.trace_id,
+                            "spanId": span.span_id,
+                            "parentSpanId": span.parent_id or "",
+                            "name": span.name,
+                            "kind": span.kind,
+                            "startTimeUnixNano": str(span.start_ns),
+                            "endTimeUnixNano": str(span.end_ns),
+                            "attributes": [
+                                {"key": key, "value": _otlp_value(value)}
+                                for key, value in span.attributes.items()
+                            ],
+                            "status": {"code": span.status, "message": span.status_message}
+                        }
+                        for span in spans
+                    ]
+                }]
+            }]
+        }
+        requests.post(self.endpoint, json=payload, timeout=5).raise_for_status()
+
+class Tracer:
+    """
+    Creates spans and exports them in batches from a background thread.
+
+    The active span is kept in a context variable, so spans opened in sync
+    handlers running on the threadpool still nest under the request span.
+    When tracing is disabled, ``span`` does nothing.
+    """
+
+    def __init__(self):
+        self._current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+        self._finished: Deque[Span] = deque()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.exporter = None
+        self.enabled = False
+
+        # Export settings
+        self.MAX_QUEUE = 10000
+        self.BATCH_SIZE = 512
+        self.EXPORT_INTERVAL = 5.0  # seconds
+
+        # Metrics
+        self.exported = 0
+        self.dropped = 0
+
+    def configure(self) -> None:
+        """Set up the exporter configured in settings."""
+        self.enabled = settings.TRACING_ENABLED
+        if not self.enabled:
+            return
+        if settings.TRACING_EXPORTER == "otlp":
+            self.exporter = OtlpHttpExporter(settings.TRACING_OTLP_ENDPOINT, settings.PROJECT_NAME)
+        else:
+            self.exporter = JsonFileExporter(settings.TRACING_FILE_PATH)
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def shutdown(self) -> None:
+        if self._thread is None:
+            return
+        self.enabled = False
+        self._wakeup.set()
+        self._thread.join(timeout=self.EXPORT_INTERVAL)
+        self._thread = None
+
+    def current_span(self) -> Optional[Span]:
+        return self._current.get()
+
+    def start_span(
+        self,
+        name: str,
+        kind: int = SPAN_KIND_INTERNAL,
+        attributes: Optional[Dict[str, Any]] = None,
+        trace_id: Optional[str] = None,
+        parent_id: Optional[str] = None
+    ) -> Optional[Span]:
+        """Start a child of the active span without activating it."""
+        if not self.enabled:
+            return None
+        return Span(name, self._current.get(), kind, attributes, trace_id, parent_id)
+
+    def end_span(self, span: Optional[Span]) -> None:
+        if span is None:
+            return
+        span.end_ns = time.time_ns()
+        if span.status == 0:
+            span.status = STATUS_OK
+        if len(self._finished) >= self.MAX_QUEUE:
+            self.dropped += 1
+            return
+        self._finished.append(span)
+        if len(self._finished) >= self.BATCH_SIZE:
+            self._wakeup.set()
+
+    @contextmanager
+    def span(
+        self,
+        name: str,
+        kind: int = SPAN_KIND_INTERNAL,
+        attributes: Optional[Dict[str, Any]] = None,
+        trace_id: Optional[str] = None,
+        parent_id: Optional[str] = None
+    ) -> Iterator[Optional[Span]]:
+        """Run a block inside a new active span."""
+        span = self.start_span(name, kind, attributes, trace_id, parent_id)
+        if span is None:
+            yield None
+            return
+        token = self._current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_error(e)
+            raise
+        finally:
+            self._current.reset(token)
+            self.end_span(span)
+
+    def _run(self) -> None:
+        while self.enabled or self._finished:
+            self._wakeup.wait(self.EXPORT_INTERVAL)
+            self._wakeup.clear()
+            while self._finished:
+                batch = []
+                while self._finished and len(batch) < self.BATCH_SIZE:
+                    batch.append(self._finished.popleft())
+                try:
+                    self.exporter.export(batch)
+                    self.exported += len(batch)
+                except Exception as e:
+                    self.dropped += len(batch)
+                    logger.warning(f"Failed to export {len(batch)} spans: {str(e)}")
+                    break
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "pending": len(self._finished),
+            "exported": self.exported,
+            "dropped": self.dropped
+        }
+
+# Global tracer instance
+tracer = Tracer()
+
+def traced(name: Optional[str] = None):
+    """Run a sync or async function inside a span named after it."""
+    def decorator(func):
+        span_name = name or func.__name__
+
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with tracer.span(span_name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+def _parse_traceparent(header: Optional[str]) -> Dict[str, Optional[str]]:
+    """Trace and parent span ids from a W3C ``traceparent`` header."""
+    parts = (header or "").split("-")
+    if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16:
+        return {"trace_id": parts[1], "parent_id": parts[2]}
+    return {"trace_id": None, "parent_id": None}
+
+class TracingMiddleware:
+    """ASGI middleware opening a server span for each HTTP request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers", []))
+        traceparent = headers.get(b"traceparent", b"").decode("latin-1")
+        status = {}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        with tracer.span(
+            f"{scope['method']} {scope['path']}",
+            SPAN_KIND_SERVER,
+            {"http.method": scope["method"], "http.target": scope["path"]},
+            **_parse_traceparent(traceparent)
+        ) as span:
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                span.name = route_name(scope)
+                span.set_attribute("http.route", span.name.split(" ", 1)[1])
+                if "code" in status:
+                    span.set_attribute("http.status_code", status["code"])
+                    if status["code"] >= 500:
+                        span.status = STATUS_ERROR
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Only statements issued within a traced operation get a span
+    span = tracer.current_span() and tracer.start_span("db.query", SPAN_KIND_CLIENT, {
+        "db.system": conn.engine.dialect.name,
+        "db.statement": statement[:1000]
+    })
+    conn.info.setdefault("trace_spans", []).append(span)
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    tracer.end_span(conn.info["trace_spans"].pop())
+
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    spans = conn.info.get("trace_spans") if conn is not None else None
+    if spans:
+        span = spans.pop()
+        if span is not None:
+            span.record_error(exception_context.original_exception)
+            tracer.end_span(span)
+
+def install(engine: Engine) -> None:
+    """Open a client span for every statement the engine executes."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
@@ -2,10 +2,16 @@ from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
+from app.core import query_stats
+from app.core.query_profiler import query_profiler
+from app.core import tracing
 
 # Convert PostgresDsn to string for SQLAlchemy
 SQLALCHEMY_DATABASE_URL = str(settings.DATABASE_URL)
 engine = create_engine(SQLALCHEMY_DATABASE_URL)
+query_stats.install(engine)
+query_stats.add_query_observer(query_profiler.observe)
+tracing.install(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -23,5 +29,6 @@ def init_db():
     from app.models.base import Base
     from app.models.user import User
     from app.models.usage_stats import UsageStats
+    from app.models.job import AnalysisJob
     
     Base.metadata.create_all(bind=engine)
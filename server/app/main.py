@@ -1,4 +1,5 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 import os
@@ -7,7 +8,17 @@ import os
 load_dotenv(os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env'))
 
 from app.core.config import settings
+from app.core.deps import require_admin
 from app.api.api_v1.api import api_router
+from app.core.load_shedding import LoadSheddingMiddleware, loop_monitor
+from app.core.metrics import metrics
+from app.core.profiler import ProfilingMiddleware
+from app.core.pubsub import pubsub
+from app.core.query_stats import QueryStatsMiddleware
+from app.core.tracing import TracingMiddleware, tracer
+from app.services.job_queue import job_queue
+from app.services.pre_analysis import pre_analyzer
+from app.services.usage_recorder import usage_recorder
 from app.db.init_db import init_db
 
 app = FastAPI(
@@ -18,7 +29,20 @@ app = FastAPI(
 # Initialize database
 init_db()
 
-# Configure CORS
+# Count SQL queries per request
+app.add_middleware(QueryStatsMiddleware)
+
+# Reject low-priority requests while overloaded
+app.add_middleware(LoadSheddingMiddleware)
+
+# Profile requests on demand
+app.add_middleware(ProfilingMiddleware)
+
+# Trace requests; its span encloses the other middleware
+app.add_middleware(TracingMiddleware)
+
+# Configure CORS; added last so preflights and every response, including
+# shed requests, get CORS headers
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.BACKEND_CORS_ORIGINS,
@@ -29,3 +53,31 @@ app.add_middleware(
 
 # Include API router
 app.include_router(api_router, prefix=settings.API_V1_STR)
+
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(require_admin)])
+async def get_metrics() -> PlainTextResponse:
+    """
+    Metrics in the Prometheus text exposition format.
+
+    Requires the admin token, as the admin endpoints do; scrapers send it
+    in the X-Admin-Token header.
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.on_event("startup")
+async def startup() -> None:
+    tracer.configure()
+    await loop_monitor.start()
+    await pubsub.start()
+    await usage_recorder.start()
+    await job_queue.start()
+    await pre_analyzer.start()
+
+@app.on_event("shutdown")
+async def shutdown() -> None:
+    await pre_analyzer.stop()
+    await job_queue.stop()
+    await usage_recorder.stop()
+    await pubsub.stop()
+    await loop_monitor.stop()
+    tracer.shutdown()
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Enum
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Enum, Index, UniqueConstraint
+from sqlalchemy.orm import backref, relationship
 from sqlalchemy.sql import func
 import enum
 
@@ -13,6 +13,11 @@ class CollaborationRole(str, enum.Enum):
 
 class DocumentCollaboration(Base):
     __tablename__ = "document_collaborations"
+    __table_args__ = (
+        # Also serves as the (document_id, user_id) lookup index
+        UniqueConstraint("document_id", "user_id", name="uq_document_collaborations_document_user"),
+        Index("ix_document_collaborations_user_document", "user_id", "document_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     document_id = Column(Integer, ForeignKey("documents.id", ondelete="CASCADE"))
@@ -27,19 +32,27 @@ class DocumentCollaboration(Base):
 
 class Comment(Base):
     __tablename__ = "comments"
+    __table_args__ = (
+        # Top-level threads of a document are the rows with parent_id NULL
+        Index("ix_comments_document_parent", "document_id", "parent_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     document_id = Column(Integer, ForeignKey("documents.id", ondelete="CASCADE"))
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
     content = Column(String)
     resolved = Column(String, default=False)
-    parent_id = Column(Integer, ForeignKey("comments.id", ondelete="CASCADE"), nullable=True)
+    parent_id = Column(Integer, ForeignKey("comments.id", ondelete="CASCADE"), nullable=True, index=True)
+    # Commented text range, as character offsets into anchor_version of the document
+    anchor_start = Column(Integer, nullable=True)
+    anchor_end = Column(Integer, nullable=True)
+    anchor_version = Column(Integer, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     # Relationships
     document = relationship("Document", back_populates="comments")
     user = relationship("User", back_populates="comments")
-    replies = relationship("Comment", 
-                         backref=relationship("Comment", remote_side=[id]),
+    replies = relationship("Comment",
+                         backref=backref("parent", remote_side=[id]),
                          cascade="all, delete-orphan")
@@ -13,7 +13,9 @@ class Document(Base):
     document_type = Column(String, index=True)  # e.g., "paper", "thesis", "notes"
     document_metadata = Column(JSON, default={})
     current_version = Column(Integer, default=1)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    # Bumped by every update of the row, including title and metadata changes
+    update_count = Column(Integer, nullable=False, default=0, server_default="0")
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
@@ -34,7 +36,7 @@ class Reference(Base):
     year = Column(Integer)
     source = Column(String)  # e.g., "journal", "conference", "book"
     reference_metadata = Column(JSON, default={})
-    document_id = Column(Integer, ForeignKey("documents.id"))
+    document_id = Column(Integer, ForeignKey("documents.id"), index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -8,7 +8,7 @@ class EssayPlan(Base):
     __tablename__ = "essay_plans"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     title = Column(String, index=True)
     essay_type = Column(String)  # argumentative, analytical, expository, etc.
     topic = Column(String)
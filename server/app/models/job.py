@@ -0,0 +1,41 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, JSON, Index, Enum
+import enum
+
+from app.models.base import Base
+
+class JobStatus(str, enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+class AnalysisJob(Base):
+    """Long-running AI analysis, executed by the background job queue."""
+    __tablename__ = "analysis_jobs"
+    __table_args__ = (
+        # Workers claim the oldest available job
+        Index("ix_analysis_jobs_status_available", "status", "available_at"),
+        # Deduplication of identical submissions
+        Index("ix_analysis_jobs_user_hash", "user_id", "input_hash"),
+    )
+
+    id = Column(String(32), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    kind = Column(String, nullable=False)
+    params = Column(JSON, default={})
+    input_hash = Column(String(64), nullable=False)
+    subscription_tier = Column(String, nullable=True)
+    status = Column(Enum(JobStatus), default=JobStatus.QUEUED, nullable=False)
+    progress = Column(Float, default=0.0)
+    result = Column(JSON, nullable=True)
+    error = Column(String, nullable=True)
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    available_at = Column(DateTime, default=datetime.utcnow)
+    # Lease of the worker running the job; expired leases are picked up again
+    locked_until = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    expires_at = Column(DateTime, nullable=True)
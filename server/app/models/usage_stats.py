@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, DateTime, ForeignKey, JSON
+from sqlalchemy import Boolean, Column, Integer, String, DateTime, ForeignKey, JSON, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 
 from app.models.base import Base
@@ -15,3 +15,48 @@ class UsageStats(Base):
     
     # Relationships
     user = relationship("User", back_populates="usage_stats")
+
+class UsageEvent(Base):
+    """Append-only log of AI requests."""
+    __tablename__ = "usage_events"
+    __table_args__ = (
+        Index("ix_usage_events_user_timestamp", "user_id", "timestamp"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    feature = Column(String, nullable=False)
+    tokens_used = Column(Integer, default=0)
+    success = Column(Boolean, default=True)
+    error_message = Column(String, nullable=True)
+    timestamp = Column(DateTime, default=datetime.utcnow)
+
+class UsageRollupHourly(Base):
+    """Usage per user and feature, aggregated by hour."""
+    __tablename__ = "usage_rollups_hourly"
+    __table_args__ = (
+        UniqueConstraint("user_id", "bucket_start", "feature", name="uq_usage_rollups_hourly_bucket"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    feature = Column(String, nullable=False)
+    bucket_start = Column(DateTime, nullable=False)
+    request_count = Column(Integer, default=0)
+    error_count = Column(Integer, default=0)
+    tokens_used = Column(Integer, default=0)
+
+class UsageRollupDaily(Base):
+    """Usage per user and feature, aggregated by day."""
+    __tablename__ = "usage_rollups_daily"
+    __table_args__ = (
+        UniqueConstraint("user_id", "bucket_start", "feature", name="uq_usage_rollups_daily_bucket"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    feature = Column(String, nullable=False)
+    bucket_start = Column(DateTime, nullable=False)
+    request_count = Column(Integer, default=0)
+    error_count = Column(Integer, default=0)
+    tokens_used = Column(Integer, default=0)
@@ -29,6 +29,15 @@ class User(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    # Relationships
+    documents = relationship("Document", back_populates="user")
+    references = relationship("Reference", back_populates="user")
+    document_versions = relationship("DocumentVersion", back_populates="user")
+    collaborations = relationship("DocumentCollaboration", back_populates="user")
+    comments = relationship("Comment", back_populates="user")
+    essay_plans = relationship("EssayPlan", back_populates="user")
+    usage_stats = relationship("UsageStats", back_populates="user")
+
     @validates('password')
     def _validate_password(self, key, password):
         """Hash password before storing."""
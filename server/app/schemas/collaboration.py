@@ -22,9 +22,24 @@ class Collaboration(CollaborationBase):
     class Config:
         from_attributes = True
 
+class SharedDocument(BaseModel):
+    document_id: int
+    title: str
+    document_type: Optional[str] = None
+    role: CollaborationRole
+    owner_id: int
+    owner_name: Optional[str] = None
+    last_activity: Optional[datetime] = None
+
+class SharedDocumentPage(BaseModel):
+    items: List[SharedDocument]
+    next_cursor: Optional[int] = None
+
 class CommentBase(BaseModel):
     content: str
     parent_id: Optional[int] = None
+    anchor_start: Optional[int] = None
+    anchor_end: Optional[int] = None
 
 class CommentCreate(CommentBase):
     pass
@@ -38,6 +53,7 @@ class Comment(CommentBase):
     document_id: int
     user_id: int
     resolved: bool
+    anchor_version: Optional[int] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
     replies: List['Comment'] = []
@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Literal
 
 class DocumentBase(BaseModel):
     """Base document schema with shared attributes."""
@@ -21,6 +21,19 @@ class DocumentUpdate(BaseModel):
     document_metadata: Optional[Dict[str, Any]] = None
     current_version: Optional[int] = None
 
+class TextOperation(BaseModel):
+    """A single edit at a character offset of the document content."""
+    type: Literal["insert", "delete"]
+    offset: int
+    text: Optional[str] = None  # Inserted text, for inserts
+    length: Optional[int] = None  # Number of characters removed, for deletes
+
+class DocumentPatch(BaseModel):
+    """Schema for partially updating document content."""
+    base_version: int
+    operations: List[TextOperation]
+    commit_message: Optional[str] = None
+
 class Document(DocumentBase):
     """Schema for document responses."""
     id: int
@@ -32,6 +45,15 @@ class Document(DocumentBase):
     class Config:
         from_attributes = True
 
+class DocumentPatchResult(BaseModel):
+    """Schema for patch responses: the new version, without the content."""
+    id: int
+    current_version: int
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
 class ReferenceBase(BaseModel):
     """Base reference schema with shared attributes."""
     citation_key: str
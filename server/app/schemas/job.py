@@ -0,0 +1,23 @@
+from datetime import datetime
+from typing import Any, Dict, Optional
+from pydantic import BaseModel
+from app.models.job import JobStatus
+
+class JobCreate(BaseModel):
+    kind: str
+    params: Dict[str, Any] = {}
+
+class Job(BaseModel):
+    id: str
+    kind: str
+    status: JobStatus
+    progress: float = 0.0
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    attempts: int = 0
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    expires_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,170 @@
+from typing import Any, Dict, List, Optional, Tuple
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+import asyncio
+import heapq
+import itertools
+import time
+
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.models.user import SubscriptionTier
+
+queue_wait = metrics.histogram(
+    "ai_scheduler_wait_seconds", "Time AI calls waited for a scheduler slot", ["tier"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+queue_dropped = metrics.counter(
+    "ai_scheduler_dropped_total", "Queued AI calls dropped before being scheduled", ["tier", "reason"]
+)
+
+# Tier and deadline of the request being served, set by check_rate_limit
+current_tier: ContextVar[SubscriptionTier] = ContextVar("ai_tier", default=SubscriptionTier.FREE)
+request_deadline: ContextVar[Optional[float]] = ContextVar("ai_deadline", default=None)
+
+def _busy() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="AI service is busy, please try again later",
+        headers={"Retry-After": "5"}
+    )
+
+class _Waiter:
+    __slots__ = ("tier", "deadline", "future", "enqueued_at")
+
+    def __init__(self, tier: SubscriptionTier, deadline: float, future: asyncio.Future):
+        self.tier = tier
+        self.deadline = deadline
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+class AIScheduler:
+    """
+    Weighted fair queuing of outbound AI calls by subscription tier.
+
+    At most ``max_in_flight`` calls run at once. When all slots are busy,
+    calls queue per tier and are admitted in order of their virtual finish
+    time (self-clocked fair queuing): each tier gets a share of the slots
+    proportional to its weight, and an idle tier does not bank credit.
+    Queued calls whose deadline passes are dropped instead of being sent.
+    """
+
+    def __init__(self):
+        self._in_flight = 0
+        # Format: [(finish_tag, sequence, _Waiter)]
+        self._queue: List[Tuple[float, int, _Waiter]] = []
+        self._sequence = itertools.count()
+        self._virtual_time = 0.0
+        # Format: {tier: last finish tag}
+        self._last_finish: Dict[SubscriptionTier, float] = {}
+        self._queued: Dict[SubscriptionTier, int] = {tier: 0 for tier in SubscriptionTier}
+
+        # Metrics
+        self.admitted = 0
+        self.dropped = 0
+
+    @property
+    def max_in_flight(self) -> int:
+        return settings.AI_SCHEDULER_MAX_IN_FLIGHT
+
+    def _enqueue(self, waiter: _Waiter) -> None:
+        weight = settings.AI_SCHEDULER_WEIGHTS.get(waiter.tier.value, 1)
+        start = max(self._virtual_time, self._last_finish.get(waiter.tier, 0.0))
+        finish = start + 1.0 / weight
+        self._last_finish[waiter.tier] = finish
+        heapq.heappush(self._queue, (finish, next(self._sequence), waiter))
+        self._queued[waiter.tier] += 1
+
+    def _dispatch(self) -> None:
+        """Hand free slots to the queued calls with the lowest finish tags."""
+        now = time.monotonic()
+        while self._queue and self._in_flight < self.max_in_flight:
+            finish, _, waiter = heapq.heappop(self._queue)
+            if waiter.future.done():
+                continue  # abandoned while queued
+            self._queued[waiter.tier] -= 1
+            if waiter.deadline <= now:
+                self.dropped += 1
+                queue_dropped.labels(waiter.tier.value, "deadline").inc()
+                waiter.future.set_exception(_busy())
+                continue
+            self._virtual_time = finish
+            self._in_flight += 1
+            waiter.future.set_result(None)
+
+    def _abandon(self, waiter: _Waiter) -> bool:
+        """Take a waiter out of the queue; False if it was already admitted."""
+        if waiter.future.done():
+            return False
+        waiter.future.cancel()
+        self._queued[waiter.tier] -= 1
+        return True
+
+    async def acquire(self, tier: SubscriptionTier, deadline: Optional[float] = None) -> None:
+        """Wait for a slot; raises 503 if none frees up before the deadline."""
+        now = time.monotonic()
+        if deadline is None:
+            deadline = now + settings.AI_SCHEDULER_QUEUE_TIMEOUT
+
+        if self._in_flight < self.max_in_flight and not self._queue:
+            self._in_flight += 1
+            self.admitted += 1
+            queue_wait.labels(tier.value).observe(0.0)
+            return
+
+        waiter = _Waiter(tier, deadline, asyncio.get_running_loop().create_future())
+        self._enqueue(waiter)
+        self._dispatch()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), max(0.0, deadline - now))
+        except asyncio.TimeoutError:
+            if self._abandon(waiter):
+                self.dropped += 1
+                queue_dropped.labels(tier.value, "timeout").inc()
+                raise _busy()
+            # Settled just as the wait ended
+            waiter.future.result()
+        except asyncio.CancelledError:
+            # The client went away; give up the place in the queue or the slot
+            if not self._abandon(waiter) and waiter.future.exception() is None:
+                self.release()
+            queue_dropped.labels(tier.value, "cancelled").inc()
+            raise
+        self.admitted += 1
+        queue_wait.labels(tier.value).observe(time.monotonic() - waiter.enqueued_at)
+
+    def release(self) -> None:
+        self._in_flight -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, tier: Optional[SubscriptionTier] = None, deadline: Optional[float] = None):
+        """Hold a slot for one AI call, using the request's tier and deadline by default."""
+        await self.acquire(tier or current_tier.get(), deadline or request_deadline.get())
+        try:
+            yield
+        finally:
+            self.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self._in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queued": {tier.value: n for tier, n in self._queued.items()},
+            "admitted": self.admitted,
+            "dropped": self.dropped
+        }
+
+# Global AI scheduler instance
+ai_scheduler = AIScheduler()
+
+def _collect_metrics():
+    stats = ai_scheduler.get_stats()
+    yield "ai_scheduler_in_flight", "gauge", "AI calls holding a scheduler slot", [({}, stats["in_flight"])]
+    yield "ai_scheduler_queue_depth", "gauge", "AI calls waiting for a scheduler slot", [
+        ({"tier": tier}, n) for tier, n in stats["queued"].items()
+    ]
+
+metrics.register_collector(_collect_metrics)
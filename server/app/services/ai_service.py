@@ -1,12 +1,26 @@
 from typing import List, Dict, Any, Optional
+from contextvars import ContextVar
+from functools import wraps
 from pydantic import BaseModel
 from openai import OpenAI, AsyncOpenAI, OpenAIError
 import re
 import asyncio
 import json
+import time
 from fastapi import HTTPException
 
 from app.core.config import settings
+from app.core.tracing import SPAN_KIND_CLIENT, STATUS_ERROR, tracer
+from app.services.ai_scheduler import ai_scheduler
+from app.core.metrics import (
+    ai_duration,
+    ai_errors,
+    ai_requests,
+    openai_completion_tokens,
+    openai_latency,
+    openai_prompt_tokens,
+    openai_retries,
+)
 
 # Configure OpenAI
 try:
@@ -32,18 +46,73 @@ class GrammarCheck(AIResponse):
     text: str
     corrections: List[Dict[str, Any]]
     improved_text: str
+    # Word-level edits turning text into improved_text, offsets in text
+    operations: List[Dict[str, Any]] = []
 
 class CitationSuggestion(AIResponse):
     context: str
     suggestions: List[Dict[str, Any]]
 
+# AI feature being served, used to label OpenAI call metrics
+current_feature: ContextVar[str] = ContextVar("ai_feature", default="other")
+
+def failed_result(result: Any) -> bool:
+    """Whether a feature result reports an error it caught itself."""
+    if isinstance(result, AIResponse):
+        return not result.success
+    if isinstance(result, dict):
+        return "error" in result or result.get("success") is False
+    return False
+
+def record_fallback(error: Exception) -> None:
+    """Count an error a feature caught itself to return a fallback value."""
+    ai_errors.labels(current_feature.get()).inc()
+    span = tracer.current_span()
+    if span is not None:
+        span.record_error(error)
+
+def track_feature(func):
+    """Record request, error and duration metrics and a span for an AI feature."""
+    feature = func.__name__
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        token = current_feature.set(feature)
+        ai_requests.labels(feature).inc()
+        started = time.perf_counter()
+        try:
+            with tracer.span(f"ai.{feature}", attributes={"ai.feature": feature}) as span:
+                result = await func(*args, **kwargs)
+                if failed_result(result) and span is not None:
+                    span.status = STATUS_ERROR
+        except Exception:
+            ai_errors.labels(feature).inc()
+            raise
+        finally:
+            ai_duration.labels(feature).observe(time.perf_counter() - started)
+            current_feature.reset(token)
+        if failed_result(result):
+            ai_errors.labels(feature).inc()
+        return result
+
+    return wrapper
+
 async def call_openai_with_retry(
     messages: List[Dict[str, str]], 
     max_retries: int = 3,
     json_response: bool = False
 ) -> Dict[str, Any]:
     """Make OpenAI API call with retry logic"""
+    feature = current_feature.get()
     for attempt in range(max_retries):
+        if attempt:
+            openai_retries.labels(feature).inc()
+        started = time.perf_counter()
+        span = tracer.start_span("openai.chat.completions", SPAN_KIND_CLIENT, {
+            "ai.feature": feature,
+            "openai.model": settings.OPENAI_MODEL,
+            "openai.attempt": attempt + 1
+        })
         try:
             params = {
                 "model": settings.OPENAI_MODEL,
@@ -55,21 +124,47 @@ async def call_openai_with_retry(
             if json_response:
                 params["response_format"] = {"type": "json_object"}
             
-            response = await client.chat.completions.create(**params)
+            # Queue for a slot per attempt, so backoff does not hold one
+            async with ai_scheduler.slot():
+                started = time.perf_counter()
+                response = await client.chat.completions.create(**params)
+            openai_latency.labels(feature, "success").observe(time.perf_counter() - started)
+            usage = getattr(response, "usage", None)
+            if usage is not None:
+                openai_prompt_tokens.labels(feature).observe(usage.prompt_tokens or 0)
+                openai_completion_tokens.labels(feature).observe(usage.completion_tokens or 0)
+                if span is not None:
+                    span.set_attribute("openai.prompt_tokens", usage.prompt_tokens or 0)
+                    span.set_attribute("openai.completion_tokens", usage.completion_tokens or 0)
+            tracer.end_span(span)
             return response
         except OpenAIError as e:
+            openai_latency.labels(feature, "error").observe(time.perf_counter() - started)
+            if span is not None:
+                span.record_error(e)
+            tracer.end_span(span)
             if attempt == max_retries - 1:
                 raise HTTPException(
                     status_code=503,
                     detail=f"AI service unavailable: {str(e)}"
                 )
             await asyncio.sleep(2 ** attempt)  # Exponential backoff
+        except HTTPException as e:
+            # No scheduler slot freed up in time
+            if span is not None:
+                span.record_error(e)
+            tracer.end_span(span)
+            raise
         except Exception as e:
+            if span is not None:
+                span.record_error(e)
+            tracer.end_span(span)
             raise HTTPException(
                 status_code=500,
                 detail=f"Internal server error: {str(e)}"
             )
 
+@track_feature
 async def get_writing_suggestions(
     text: str,
     context: Optional[str] = None,
@@ -120,6 +215,7 @@ async def get_writing_suggestions(
             confidence=0.0
         )
 
+@track_feature
 async def check_grammar_and_style(text: str) -> GrammarCheck:
     """Check grammar, style, and academic tone."""
     try:
@@ -131,7 +227,7 @@ async def check_grammar_and_style(text: str) -> GrammarCheck:
         Format your response as:
         {{
             "corrections": [
-                {{"type": "grammar/style/tone", "location": "...", "issue": "...", "suggestion": "..."}}
+                {{"type": "grammar/style/tone", "location": "exact quote of the affected text", "issue": "...", "suggestion": "..."}}
             ],
             "improved_text": "complete corrected text"
         }}"""
@@ -162,6 +258,7 @@ async def check_grammar_and_style(text: str) -> GrammarCheck:
             improved_text=text
         )
 
+@track_feature
 async def suggest_citations(context: str) -> CitationSuggestion:
     """Suggest relevant academic citations based on the context."""
     try:
@@ -208,6 +305,7 @@ async def suggest_citations(context: str) -> CitationSuggestion:
             suggestions=[]
         )
 
+@track_feature
 async def enhance_academic_tone(text: str) -> str:
     """Enhance the academic tone of the text while preserving meaning."""
     try:
@@ -232,8 +330,10 @@ async def enhance_academic_tone(text: str) -> str:
         return result["enhanced_text"]
 
     except Exception as e:
+        record_fallback(e)
         return text
 
+@track_feature
 async def generate_research_questions(topic: str, context: str) -> List[str]:
     """Generate research questions based on topic and context."""
     try:
@@ -259,8 +359,10 @@ async def generate_research_questions(topic: str, context: str) -> List[str]:
         return [q["question"] for q in result["questions"]]
 
     except Exception as e:
+        record_fallback(e)
         return []
 
+@track_feature
 async def create_outline(
     topic: str,
     research_type: str = "qualitative",
@@ -302,6 +404,7 @@ async def create_outline(
             "error": str(e)
         }
 
+@track_feature
 async def analyze_literature(text: str) -> Dict[str, Any]:
     """Analyze literature review or research text."""
     try:
@@ -338,6 +441,7 @@ async def analyze_literature(text: str) -> Dict[str, Any]:
             "error": str(e)
         }
 
+@track_feature
 async def suggest_methodology(
     research_question: str,
     research_type: str = "mixed"
@@ -378,39 +482,42 @@ async def suggest_methodology(
             "error": str(e)
         }
 
+@track_feature
 async def generate_abstract(
     title: str,
     content: Dict[str, str],
     max_words: int = 250
 ) -> str:
-    """Generate an academic abstract based on paper content."""
-    try:
-        prompt = f"""Generate an academic abstract for this paper.
-        
-        Title: {title}
-        Content:
-        {json.dumps(content, indent=2)}
-        Max Words: {max_words}
-        
-        Format your response as JSON:
-        {{
-            "abstract": "generated abstract text",
-            "word_count": number,
-            "keywords": ["keyword1", "keyword2"]
-        }}"""
-
-        response = await call_openai_with_retry([
-            {"role": "system", "content": "You are an expert academic editor."},
-            {"role": "user", "content": prompt}
-        ])
-
-        content = response.choices[0].message.content
-        result = json.loads(content)
-        return result["abstract"]
-
-    except Exception as e:
-        return f"Error generating abstract: {str(e)}"
+    """
+    Generate an academic abstract based on paper content.
 
+    Unlike most features this raises on failure, as there is no fallback
+    abstract to return.
+    """
+    prompt = f"""Generate an academic abstract for this paper.
+    
+    Title: {title}
+    Content:
+    {json.dumps(content, indent=2)}
+    Max Words: {max_words}
+    
+    Format your response as JSON:
+    {{
+        "abstract": "generated abstract text",
+        "word_count": number,
+        "keywords": ["keyword1", "keyword2"]
+    }}"""
+
+    response = await call_openai_with_retry([
+        {"role": "system", "content": "You are an expert academic editor."},
+        {"role": "user", "content": prompt}
+    ])
+
+    content = response.choices[0].message.content
+    result = json.loads(content)
+    return result["abstract"]
+
+@track_feature
 async def suggest_keywords(
     title: str,
     abstract: str,
@@ -447,8 +554,10 @@ async def suggest_keywords(
         return [k["term"] for k in sorted(result["keywords"], key=lambda x: x["relevance"], reverse=True)]
 
     except Exception as e:
+        record_fallback(e)
         return []
 
+@track_feature
 async def format_citation(
     citation_text: str,
     style: str = "apa"
@@ -475,8 +584,10 @@ async def format_citation(
         return result["formatted_citation"]
 
     except Exception as e:
+        record_fallback(e)
         return citation_text
 
+@track_feature
 async def check_style_guide(
     text: str,
     style_guide: str = "apa"
@@ -492,7 +603,7 @@ async def check_style_guide(
             "issues": [
                 {{
                     "type": "formatting/citation/structure",
-                    "location": "description of location",
+                    "location": "exact quote of the affected text",
                     "issue": "description of issue",
                     "correction": "suggested correction"
                 }}
@@ -520,6 +631,7 @@ async def check_style_guide(
             "error": str(e)
         }
 
+@track_feature
 async def analyze_citations(text: str) -> List[Dict[str, Any]]:
     """Analyze citations in academic text."""
     try:
@@ -552,8 +664,10 @@ async def analyze_citations(text: str) -> List[Dict[str, Any]]:
         return result["citations"]
 
     except Exception as e:
+        record_fallback(e)
         return []
 
+@track_feature
 async def suggest_transitions(paragraphs: List[str]) -> List[Dict[str, Any]]:
     """Suggest transitions between paragraphs."""
     try:
@@ -590,8 +704,10 @@ async def suggest_transitions(paragraphs: List[str]) -> List[Dict[str, Any]]:
         return suggestions
 
     except Exception as e:
+        record_fallback(e)
         return []
 
+@track_feature
 async def check_argument_structure(text: str) -> Dict[str, Any]:
     """Analyze and provide feedback on argument structure."""
     try:
@@ -632,6 +748,7 @@ async def check_argument_structure(text: str) -> Dict[str, Any]:
             "error": str(e)
         }
 
+@track_feature
 async def suggest_evidence(claim: str, field: str) -> List[Dict[str, str]]:
     """Suggest types of evidence to support an academic claim."""
     try:
@@ -668,8 +785,10 @@ async def suggest_evidence(claim: str, field: str) -> List[Dict[str, str]]:
         return result["evidence_types"]
 
     except Exception as e:
+        record_fallback(e)
         return []
 
+@track_feature
 async def extract_citations(text: str) -> List[Dict[str, str]]:
     """Extract and parse citations from text."""
     try:
@@ -708,8 +827,10 @@ async def extract_citations(text: str) -> List[Dict[str, str]]:
         return result["citations"]
 
     except Exception as e:
+        record_fallback(e)
         return []
 
+@track_feature
 async def generate_outline(
     topic: str,
     essay_type: str,
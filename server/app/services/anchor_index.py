@@ -0,0 +1,331 @@
+from typing import Any, Dict, List, Optional, Set, Tuple
+from collections import OrderedDict
+import random
+import threading
+
+from sqlalchemy.orm import Session
+
+from app.models.collaboration import Comment
+from app.models.document import Document
+from app.models.version import DocumentVersion
+
+class _Node:
+    """Treap node holding one anchor position, with lazy shift tags."""
+
+    __slots__ = ("key", "comment_id", "priority", "left", "right", "add", "assign")
+
+    def __init__(self, key: int, comment_id: int):
+        self.key = key
+        self.comment_id = comment_id
+        self.priority = random.random()
+        self.left: Optional["_Node"] = None
+        self.right: Optional["_Node"] = None
+        self.add = 0
+        self.assign: Optional[int] = None
+
+def _apply_add(node: Optional[_Node], delta: int) -> None:
+    if node is None:
+        return
+    node.key += delta
+    if node.assign is not None:
+        node.assign += delta
+    else:
+        node.add += delta
+
+def _apply_assign(node: Optional[_Node], value: int) -> None:
+    if node is None:
+        return
+    node.key = value
+    node.assign = value
+    node.add = 0
+
+def _push(node: _Node) -> None:
+    if node.assign is not None:
+        _apply_assign(node.left, node.assign)
+        _apply_assign(node.right, node.assign)
+        node.assign = None
+    if node.add:
+        _apply_add(node.left, node.add)
+        _apply_add(node.right, node.add)
+        node.add = 0
+
+def _split(node: Optional[_Node], position: int, inclusive: bool) -> Tuple[Optional[_Node], Optional[_Node]]:
+    """Split into keys before ``position`` (``<=`` if inclusive) and the rest."""
+    if node is None:
+        return None, None
+    _push(node)
+    if node.key < position or (inclusive and node.key == position):
+        node.right, right = _split(node.right, position, inclusive)
+        return node, right
+    left, node.left = _split(node.left, position, inclusive)
+    return left, node
+
+def _merge(left: Optional[_Node], right: Optional[_Node]) -> Optional[_Node]:
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        _push(left)
+        left.right = _merge(left.right, right)
+        return left
+    _push(right)
+    right.left = _merge(left, right.left)
+    return right
+
+def _walk(node: Optional[_Node], out: List[Tuple[int, int]]) -> None:
+    stack = []
+    while stack or node is not None:
+        while node is not None:
+            _push(node)
+            stack.append(node)
+            node = node.left
+        node = stack.pop()
+        out.append((node.comment_id, node.key))
+        node = node.right
+
+class _PositionTree:
+    """
+    Sorted anchor positions supporting range shifts in O(log n).
+
+    ``sticky_end`` controls what happens to a position exactly at an insert:
+    start anchors move with text inserted at them, end anchors stay put.
+    """
+
+    def __init__(self, sticky_end: bool):
+        self.root: Optional[_Node] = None
+        self.sticky_end = sticky_end
+
+    def add(self, position: int, comment_id: int) -> None:
+        left, right = _split(self.root, position, inclusive=True)
+        self.root = _merge(_merge(left, _Node(position, comment_id)), right)
+
+    def insert_text(self, offset: int, length: int) -> None:
+        left, right = _split(self.root, offset, inclusive=self.sticky_end)
+        _apply_add(right, length)
+        self.root = _merge(left, right)
+
+    def delete_text(self, offset: int, length: int) -> None:
+        left, rest = _split(self.root, offset, inclusive=False)
+        middle, right = _split(rest, offset + length, inclusive=False)
+        _apply_assign(middle, offset)
+        _apply_add(right, -length)
+        self.root = _merge(_merge(left, middle), right)
+
+    def positions(self) -> List[Tuple[int, int]]:
+        out: List[Tuple[int, int]] = []
+        _walk(self.root, out)
+        return out
+
+class AnchorIndex:
+    """
+    Comment anchors of one open document.
+
+    Start and end offsets live in two treaps with lazy shift tags, so an edit
+    moves every anchor after it in O(log n) instead of rescanning comments.
+    """
+
+    def __init__(self, document_id: int, version: int):
+        self.document_id = document_id
+        self.version = version
+        self.dirty = False
+        self._starts = _PositionTree(sticky_end=False)
+        self._ends = _PositionTree(sticky_end=True)
+        self._comment_ids: Set[int] = set()
+        self._removed: Set[int] = set()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._comment_ids)
+
+    def add(self, comment_id: int, start: int, end: int) -> None:
+        with self._lock:
+            self._starts.add(start, comment_id)
+            self._ends.add(end, comment_id)
+            self._comment_ids.add(comment_id)
+            self._removed.discard(comment_id)
+
+    def remove(self, comment_id: int) -> None:
+        with self._lock:
+            if comment_id in self._comment_ids:
+                self._comment_ids.discard(comment_id)
+                self._removed.add(comment_id)
+                if len(self._removed) > max(64, len(self._comment_ids)):
+                    self._rebuild()
+
+    def _rebuild(self) -> None:
+        anchors = self._anchors()
+        self._starts = _PositionTree(sticky_end=False)
+        self._ends = _PositionTree(sticky_end=True)
+        self._removed.clear()
+        for comment_id, (start, end) in anchors.items():
+            self._starts.add(start, comment_id)
+            self._ends.add(end, comment_id)
+
+    def apply_operations(self, operations: List[Dict[str, Any]]) -> None:
+        """Shift anchors for operations applied to the document content."""
+        with self._lock:
+            for operation in operations:
+                if operation["type"] == "insert":
+                    length = len(operation["text"])
+                    self._starts.insert_text(operation["offset"], length)
+                    self._ends.insert_text(operation["offset"], length)
+                else:
+                    self._starts.delete_text(operation["offset"], operation["length"])
+                    self._ends.delete_text(operation["offset"], operation["length"])
+                self.dirty = True
+
+    def _anchors(self) -> Dict[int, Tuple[int, int]]:
+        starts = dict(self._starts.positions())
+        return {
+            comment_id: (starts[comment_id], end)
+            for comment_id, end in self._ends.positions()
+            if comment_id not in self._removed
+        }
+
+    def anchors(self) -> Dict[int, Tuple[int, int]]:
+        """Current (start, end) of every anchored comment."""
+        with self._lock:
+            return self._anchors()
+
+class AnchorIndexRegistry:
+    def __init__(self):
+        # Open indexes, least recently used first
+        # Format: {document_id: AnchorIndex}
+        self._indexes: "OrderedDict[int, AnchorIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Maximum number of documents kept in memory
+        self.MAX_OPEN = 100
+
+    def get(self, document_id: int) -> Optional[AnchorIndex]:
+        with self._lock:
+            index = self._indexes.get(document_id)
+            if index is not None:
+                self._indexes.move_to_end(document_id)
+            return index
+
+    def open(self, db: Session, document_id: int) -> AnchorIndex:
+        """
+        Get a document's index, loading it from the database if needed.
+
+        Anchors saved against an older version are brought forward by
+        replaying the operation deltas recorded on the versions since then.
+        """
+        index = self.get(document_id)
+        if index is not None:
+            return index
+
+        current_version = db.query(Document.current_version).filter(
+            Document.id == document_id
+        ).scalar() or 1
+        comments = db.query(
+            Comment.id,
+            Comment.anchor_start,
+            Comment.anchor_end,
+            Comment.anchor_version
+        ).filter(
+            Comment.document_id == document_id,
+            Comment.anchor_start.isnot(None)
+        ).order_by(Comment.anchor_version).all()
+
+        index = AnchorIndex(document_id, current_version)
+        oldest = min((c.anchor_version or current_version for c in comments), default=current_version)
+        deltas = {}
+        if oldest < current_version:
+            deltas = {
+                v.version_number: (v.version_metadata or {}).get("delta")
+                for v in db.query(
+                    DocumentVersion.version_number,
+                    DocumentVersion.version_metadata
+                ).filter(
+                    DocumentVersion.document_id == document_id,
+                    DocumentVersion.version_number >= oldest,
+                    DocumentVersion.version_number < current_version
+                )
+            }
+
+        pending = list(comments)
+        for version in range(oldest, current_version + 1):
+            while pending and (pending[0].anchor_version or current_version) <= version:
+                comment = pending.pop(0)
+                index.add(comment.id, comment.anchor_start, comment.anchor_end)
+            delta = deltas.get(version)
+            if version < current_version and delta:
+                index.apply_operations(delta)
+
+        with self._lock:
+            self._indexes[document_id] = index
+            while len(self._indexes) > self.MAX_OPEN:
+                self._indexes.popitem(last=False)
+        return index
+
+    def close(self, document_id: int) -> None:
+        with self._lock:
+            self._indexes.pop(document_id, None)
+
+    def apply_operations(self, document_id: int, operations: List[Dict[str, Any]]) -> None:
+        """Shift anchors of a document if its index is open."""
+        index = self.get(document_id)
+        if index is not None:
+            index.apply_operations(operations)
+
+    def apply_version(
+        self,
+        db: Session,
+        document_id: int,
+        base_version: int,
+        operations: List[Dict[str, Any]]
+    ) -> None:
+        """
+        Shift anchors of an open index for a save of ``base_version``.
+
+        An index at another version missed a save, e.g. one made on another
+        worker, so the operations do not apply to it; it is reloaded from the
+        version deltas instead, which must include this save's.
+        """
+        index = self.get(document_id)
+        if index is None:
+            return
+        if index.version == base_version:
+            index.apply_operations(operations)
+            return
+        self.close(document_id)
+        self.open(db, document_id)
+
+    def flush(
+        self,
+        db: Session,
+        document_id: int,
+        version: int,
+        anchors: Optional[Dict[int, Tuple[int, int]]] = None
+    ) -> None:
+        """
+        Write remapped anchors of a dirty index back to the comments.
+
+        ``anchors`` may be a snapshot taken together with the content that was
+        saved as ``version``; by default the index's current anchors are used.
+        The caller commits.
+        """
+        index = self.get(document_id)
+        if index is None or not index.dirty:
+            return
+        snapshot_is_current = anchors is None
+        if anchors is None:
+            anchors = index.anchors()
+        db.bulk_update_mappings(Comment, [
+            {
+                "id": comment_id,
+                "anchor_start": start,
+                "anchor_end": end,
+                "anchor_version": version
+            }
+            for comment_id, (start, end) in anchors.items()
+        ])
+        index.version = version
+        # A snapshot may predate the latest edits, so only a full flush is clean
+        if snapshot_is_current:
+            index.dirty = False
+
+# Global anchor index registry
+anchor_indexes = AnchorIndexRegistry()
@@ -0,0 +1,631 @@
+from typing import Any, Dict, List, Optional, Tuple
+from contextlib import asynccontextmanager
+import asyncio
+import logging
+import uuid
+
+from fastapi import WebSocket
+
+from app.core.pubsub import Subscription, pubsub
+from app.database import SessionLocal
+from app.models.collaboration import CollaborationRole
+from app.models.document import Document
+from app.models.user import User
+from app.models.version import DocumentVersion
+from app.services.anchor_index import anchor_indexes
+from app.services.text_operations import (
+    WORD_PATTERN,
+    TextOperationError,
+    apply_operations,
+    diff_operations,
+    transform_operations,
+    validate_operation,
+)
+
+logger = logging.getLogger(__name__)
+
+# Roles allowed to send edits
+EDIT_ROLES = {CollaborationRole.OWNER, CollaborationRole.EDITOR}
+
+class DocumentConflict(Exception):
+    """The document was saved outside its room since the room last persisted."""
+
+    def __init__(self, ancestor: Optional[str], content: str, version: int):
+        super().__init__(f"Document moved to version {version}")
+        # Content the room was based on, if its version is still stored
+        self.ancestor = ancestor
+        self.content = content
+        self.version = version
+
+class RoomConnection:
+    """
+    A collaborator connected to a room.
+
+    Messages go through a bounded outbox drained by its own task, so a slow
+    client cannot stall the room. If the outbox overflows, the client is sent
+    a fresh snapshot instead of the operations it missed.
+    """
+
+    def __init__(
+        self,
+        room: "CollaborationRoom",
+        websocket: WebSocket,
+        user_id: int,
+        role: CollaborationRole
+    ):
+        self.room = room
+        self.websocket = websocket
+        self.user_id = user_id
+        self.role = role
+        # Identifies the connection in operations forwarded to the owner worker
+        self.ref = uuid.uuid4().hex
+        self.outbox = Subscription(self._deliver, channel=room.channel).start()
+
+    def send(self, message: Dict[str, Any]) -> None:
+        self.outbox.push(message)
+
+    def close(self) -> None:
+        self.outbox.close()
+
+    async def _deliver(self, batch: List[Dict[str, Any]]) -> None:
+        if self.outbox.overflowed:
+            self.outbox.overflowed = False
+            snapshot = self.room.snapshot()
+            await self.websocket.send_json(snapshot)
+            batch = [
+                m for m in batch
+                if m.get("revision", snapshot["revision"] + 1) > snapshot["revision"]
+            ]
+        for message in batch:
+            await self.websocket.send_json(message)
+
+class CollaborationRoom:
+    """
+    In-memory editing session for one document.
+
+    Edits are operational transforms: every client operation names the room
+    revision it was based on, and is transformed against the operations
+    applied since then before being applied and broadcast. The content is
+    written back to the document as one compacted version per persist.
+
+    When several workers have a room open for the same document, the one
+    holding the room's pub/sub lease is its owner: it alone sequences and
+    transforms operations and persists the content. Followers forward their
+    clients' operations to the owner over the document's channel and apply
+    the owner's operations in revision order, resynchronising from a
+    snapshot whenever they miss one.
+    """
+
+    def __init__(self, document_id: int, content: str, document_version: int, is_owner: bool = True):
+        self.document_id = document_id
+        self.content = content
+        self.document_version = document_version
+        self.is_owner = is_owner
+        # A follower waiting for a snapshot from the owner
+        self.syncing = False
+        self.revision = 0
+        self.persisted_revision = 0
+        # Room history no longer describes the persisted content after a rebase
+        self.rebased = False
+        self.last_editor_id: Optional[int] = None
+        self.connections: List[RoomConnection] = []
+
+        # Recently applied operations, for transforming late clients
+        # Format: [(revision, operations)]
+        self.history: List[Tuple[int, List[Dict[str, Any]]]] = []
+        self.MAX_HISTORY = 1000
+
+        self.persist_task: Optional[asyncio.Task] = None
+        self.subscription: Optional[Subscription] = None
+
+    @property
+    def channel(self) -> str:
+        return f"document:{self.document_id}"
+
+    @property
+    def lease(self) -> str:
+        return f"room:{self.document_id}"
+
+    @property
+    def dirty(self) -> bool:
+        return self.revision != self.persisted_revision
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "type": "snapshot",
+            "revision": self.revision,
+            "content": self.content
+        }
+
+    def apply(
+        self,
+        user_id: int,
+        base_revision: int,
+        operations: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """Transform client operations to the current revision and apply them."""
+        if base_revision > self.revision:
+            raise TextOperationError(f"Unknown revision {base_revision}")
+        oldest = self.history[0][0] - 1 if self.history else self.revision
+        if base_revision < oldest:
+            raise TextOperationError(
+                f"Revision {base_revision} is too old, resynchronise"
+            )
+
+        for operation in operations:
+            validate_operation(operation)
+
+        for revision, applied in self.history:
+            if revision > base_revision:
+                operations, _ = transform_operations(operations, applied)
+
+        self.content = apply_operations(self.content, operations)
+        anchor_indexes.apply_operations(self.document_id, operations)
+        self.revision += 1
+        self.last_editor_id = user_id
+        self.history.append((self.revision, operations))
+        if len(self.history) > self.MAX_HISTORY:
+            self.history = self.history[-self.MAX_HISTORY:]
+        return operations
+
+    def broadcast(self, message: Dict[str, Any], exclude: Optional[RoomConnection] = None) -> None:
+        """Queue a message for every connection in the room."""
+        for connection in self.connections:
+            if connection is not exclude:
+                connection.send(message)
+
+    async def publish(self, message: Dict[str, Any], exclude: Optional[RoomConnection] = None) -> None:
+        """Broadcast locally and forward the message to other workers."""
+        self.broadcast(message, exclude)
+        await pubsub.publish(self.channel, {**message, "worker": pubsub.worker_id})
+
+    def _connection(self, ref: Optional[str]) -> Optional[RoomConnection]:
+        for connection in self.connections:
+            if connection.ref == ref:
+                return connection
+        return None
+
+    async def request_sync(self) -> None:
+        """Ask the owner worker for a snapshot, ignoring operations until it arrives."""
+        self.syncing = True
+        await pubsub.publish(self.channel, {"type": "sync_request", "worker": pubsub.worker_id})
+
+    async def publish_sync(self, reset: bool = False) -> None:
+        """Send the owner's content to followers; ``reset`` makes every follower take it."""
+        await pubsub.publish(self.channel, {
+            "type": "sync",
+            "worker": pubsub.worker_id,
+            "revision": self.revision,
+            "content": self.content,
+            "reset": reset
+        })
+
+    async def take_over(self, content: str, document_version: int) -> None:
+        """Become the owner, continuing from the persisted document."""
+        self.is_owner = True
+        self.syncing = False
+        self.content = content
+        self.document_version = document_version
+        self.revision += 1
+        self.persisted_revision = self.revision
+        self.history = []
+        self.broadcast(self.snapshot())
+        await self.publish_sync(reset=True)
+
+    async def _sequence(self, message: Dict[str, Any]) -> None:
+        """Apply operations a follower forwarded from one of its clients."""
+        route = {"origin": message.get("worker"), "ref": message.get("ref")}
+        try:
+            operations = self.apply(
+                message.get("user_id"),
+                int(message["base_revision"]),
+                list(message["operations"])
+            )
+        except (TextOperationError, TypeError, ValueError, KeyError) as e:
+            await pubsub.publish(self.channel, {
+                "type": "reject",
+                "worker": pubsub.worker_id,
+                "detail": str(e),
+                **route
+            })
+            return
+
+        update = {
+            "type": "operations",
+            "revision": self.revision,
+            "user_id": message.get("user_id"),
+            "operations": operations
+        }
+        self.broadcast(update)
+        await pubsub.publish(self.channel, {**update, "worker": pubsub.worker_id, **route})
+
+    async def _follow(self, message: Dict[str, Any]) -> None:
+        """Apply operations sequenced by the owner worker."""
+        revision = message.get("revision")
+        if self.syncing or not isinstance(revision, int) or revision <= self.revision:
+            return
+        if revision != self.revision + 1:
+            await self.request_sync()
+            return
+        try:
+            # Already transformed by the owner, and based on our revision
+            operations = self.apply(message.get("user_id"), self.revision, message["operations"])
+        except (TextOperationError, KeyError) as e:
+            logger.warning(
+                f"Resynchronising document {self.document_id} after a bad update: {str(e)}"
+            )
+            await self.request_sync()
+            return
+
+        sender = None
+        if message.get("origin") == pubsub.worker_id:
+            sender = self._connection(message.get("ref"))
+            if sender is not None:
+                sender.send({"type": "ack", "revision": self.revision})
+        self.broadcast({
+            "type": "operations",
+            "revision": self.revision,
+            "user_id": message.get("user_id"),
+            "operations": operations
+        }, exclude=sender)
+
+    def _sync(self, message: Dict[str, Any]) -> None:
+        revision = message.get("revision")
+        if not isinstance(revision, int) or "content" not in message:
+            return
+        if not (self.syncing or message.get("reset") or revision > self.revision):
+            return
+        self.content = message["content"]
+        self.revision = revision
+        self.history = []
+        self.syncing = False
+        # Anchors cannot be replayed onto the owner's content; fall back to persisted ones
+        anchor_indexes.close(self.document_id)
+        self.broadcast(self.snapshot())
+
+    async def handle_event(self, batch: List[Dict[str, Any]]) -> None:
+        """Handle events published on the document channel."""
+        if self.subscription is not None and self.subscription.overflowed:
+            # Events were dropped: followers refetch the owner's state, and the
+            # owner pushes its state to followers whose operations it may have lost
+            self.subscription.overflowed = False
+            if self.is_owner:
+                await self.publish_sync(reset=True)
+            else:
+                await self.request_sync()
+
+        for message in batch:
+            if message.get("worker") == pubsub.worker_id:
+                continue
+            message_type = message.get("type")
+            if message_type == "submit":
+                if self.is_owner:
+                    await self._sequence(message)
+            elif message_type == "operations":
+                if not self.is_owner:
+                    await self._follow(message)
+            elif message_type == "sync_request":
+                if self.is_owner:
+                    await self.publish_sync()
+            elif message_type == "sync":
+                if not self.is_owner:
+                    self._sync(message)
+            elif message_type == "role":
+                role = message.get("role")
+                self.set_role(message.get("user_id"), CollaborationRole(role) if role else None)
+            elif message_type == "reject":
+                if message.get("origin") == pubsub.worker_id:
+                    connection = self._connection(message.get("ref"))
+                    if connection is not None:
+                        connection.send({"type": "error", "detail": message.get("detail")})
+                        connection.send(self.snapshot())
+            else:
+                self.broadcast({k: v for k, v in message.items() if k != "worker"})
+
+    def set_role(self, user_id: int, role: Optional[CollaborationRole]) -> None:
+        """Apply a collaborator's new role, disconnecting them if access was revoked."""
+        for connection in self.connections:
+            if connection.user_id == user_id:
+                connection.role = role
+                if role is None:
+                    asyncio.create_task(connection.websocket.close(code=4403))
+
+    async def handle_message(self, connection: RoomConnection, message: Dict[str, Any]) -> None:
+        """Handle a message received from a collaborator."""
+        if connection.role is None:
+            await connection.websocket.close(code=4403)
+            return
+
+        message_type = message.get("type")
+        if message_type == "operations":
+            if connection.role not in EDIT_ROLES:
+                connection.send({
+                    "type": "error",
+                    "detail": f"This action requires {CollaborationRole.EDITOR} access"
+                })
+                return
+            if self.syncing:
+                # The client's revision cannot be mapped until the owner's snapshot arrives
+                connection.send({"type": "error", "detail": "Resynchronising, retry after the next snapshot"})
+                return
+            try:
+                base_revision = int(message.get("base_revision", -1))
+                operations = list(message.get("operations", []))
+                if not self.is_owner:
+                    await pubsub.publish(self.channel, {
+                        "type": "submit",
+                        "worker": pubsub.worker_id,
+                        "ref": connection.ref,
+                        "user_id": connection.user_id,
+                        "base_revision": base_revision,
+                        "operations": operations
+                    })
+                    return
+                operations = self.apply(connection.user_id, base_revision, operations)
+            except (TextOperationError, TypeError, ValueError, KeyError) as e:
+                connection.send({"type": "error", "detail": str(e)})
+                connection.send(self.snapshot())
+                return
+
+            connection.send({"type": "ack", "revision": self.revision})
+            await self.publish({
+                "type": "operations",
+                "revision": self.revision,
+                "user_id": connection.user_id,
+                "operations": operations
+            }, exclude=connection)
+        elif message_type == "presence":
+            await self.publish({
+                "type": "presence",
+                "user_id": connection.user_id,
+                "data": message.get("data")
+            }, exclude=connection)
+        else:
+            connection.send({
+                "type": "error",
+                "detail": f"Unknown message type: {message_type}"
+            })
+
+    def operations_since(self, revision: int) -> Optional[List[Dict[str, Any]]]:
+        """Operations applied after a revision, if still in the history."""
+        if self.history and self.history[0][0] > revision + 1:
+            return None
+        operations: List[Dict[str, Any]] = []
+        for applied_revision, applied in self.history:
+            if applied_revision > revision:
+                operations.extend(applied)
+        return operations
+
+    def _conflict(self, db, document: Document) -> DocumentConflict:
+        ancestor = db.query(DocumentVersion.content).filter(
+            DocumentVersion.document_id == self.document_id,
+            DocumentVersion.version_number == self.document_version
+        ).scalar()
+        return DocumentConflict(ancestor, document.content or "", document.current_version)
+
+    def persist(
+        self,
+        content: str,
+        operations: Optional[List[Dict[str, Any]]] = None,
+        anchors: Optional[Dict[int, Tuple[int, int]]] = None
+    ) -> int:
+        """
+        Write the room content back to the document as a new version.
+
+        The write is conditional on the document still being at the version
+        the room is based on. If it was saved through the HTTP API meanwhile,
+        nothing is written and DocumentConflict is raised with that content,
+        to be rebased into the room.
+        """
+        from app.api.documents import save_document_content
+
+        db = SessionLocal()
+        try:
+            document = db.query(Document).filter(
+                Document.id == self.document_id
+            ).first()
+            if not document:
+                return self.document_version
+            if document.content == content:
+                return document.current_version
+            if document.current_version != self.document_version:
+                raise self._conflict(db, document)
+
+            base_version = document.current_version
+            editor = db.query(User).filter(
+                User.id == (self.last_editor_id or document.user_id)
+            ).first()
+            version_metadata = {"commit_message": "Collaborative editing session"}
+            if not save_document_content(
+                document, content, editor, db, version_metadata,
+                operations, update_anchors=False
+            ):
+                # Saved concurrently; the rollback expires the stale row
+                db.rollback()
+                raise self._conflict(db, document)
+            if anchors is not None:
+                anchor_indexes.flush(db, self.document_id, base_version + 1, anchors)
+            db.commit()
+            return base_version + 1
+        finally:
+            db.close()
+
+    async def rebase(self, conflict: DocumentConflict) -> None:
+        """Fold content saved outside the room into the room as one more operation."""
+        if conflict.ancestor is None:
+            logger.warning(
+                f"Version {self.document_version} of document {self.document_id} is gone; "
+                f"keeping the room content over version {conflict.version}"
+            )
+        else:
+            # By word, so edits to the same line on both sides are merged
+            external = diff_operations(conflict.ancestor, conflict.content, WORD_PATTERN)
+            local = diff_operations(conflict.ancestor, self.content, WORD_PATTERN)
+            operations, _ = transform_operations(external, local)
+            if operations:
+                operations = self.apply(None, self.revision, operations)
+                await self.publish({
+                    "type": "operations",
+                    "revision": self.revision,
+                    "user_id": None,
+                    "operations": operations
+                })
+        self.document_version = conflict.version
+        self.rebased = True
+
+    async def flush(self) -> None:
+        """Persist the room content if it changed since the last persist."""
+        if not self.is_owner or not self.dirty:
+            return
+        revision, content = self.revision, self.content
+        operations = None if self.rebased else self.operations_since(self.persisted_revision)
+        index = anchor_indexes.get(self.document_id)
+        anchors = index.anchors() if index is not None else None
+        try:
+            self.document_version = await asyncio.to_thread(
+                self.persist, content, operations, anchors
+            )
+            self.persisted_revision = revision
+            self.rebased = False
+        except DocumentConflict as conflict:
+            await self.rebase(conflict)
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Failed to persist document {self.document_id}: {str(e)}")
+
+class RoomManager:
+    def __init__(self):
+        # Open rooms
+        # Format: {document_id: CollaborationRoom}
+        self._rooms: Dict[int, CollaborationRoom] = {}
+        # Locks serialising the opening and closing of each document's room,
+        # dropped once no task holds or awaits them
+        # Format: {document_id: asyncio.Lock}, {document_id: tasks using the lock}
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._lock_users: Dict[int, int] = {}
+
+        # Seconds between snapshots of a dirty room
+        self.PERSIST_INTERVAL = 10
+        # Seconds a room owner's lease lasts without renewal
+        self.OWNER_LEASE = 30
+
+    @staticmethod
+    def _load_document(document_id: int) -> Tuple[str, int]:
+        db = SessionLocal()
+        try:
+            document = db.query(
+                Document.content,
+                Document.current_version
+            ).filter(Document.id == document_id).first()
+            if not document:
+                raise LookupError(f"Document {document_id} not found")
+            anchor_indexes.open(db, document_id)
+            return document.content or "", document.current_version
+        finally:
+            db.close()
+
+    async def _persist_periodically(self, room: CollaborationRoom) -> None:
+        """Renew or take over the room's ownership, and persist it while owned."""
+        while True:
+            await asyncio.sleep(self.PERSIST_INTERVAL)
+            try:
+                owner = await pubsub.acquire(room.lease, self.OWNER_LEASE)
+                if owner and not room.is_owner:
+                    anchor_indexes.close(room.document_id)
+                    content, version = await asyncio.to_thread(self._load_document, room.document_id)
+                    await room.take_over(content, version)
+                elif not owner and room.is_owner:
+                    logger.warning(f"Lost ownership of the room for document {room.document_id}")
+                    room.is_owner = False
+                    await room.request_sync()
+                elif room.syncing:
+                    await room.request_sync()
+            except Exception as e:
+                logger.error(f"Failed to renew the room for document {room.document_id}: {str(e)}")
+            await room.flush()
+
+    @asynccontextmanager
+    async def _document_lock(self, document_id: int):
+        """Hold the lock of one document's room, without blocking other rooms."""
+        lock = self._locks.setdefault(document_id, asyncio.Lock())
+        self._lock_users[document_id] = self._lock_users.get(document_id, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._lock_users[document_id] -= 1
+            if not self._lock_users[document_id]:
+                del self._lock_users[document_id]
+                del self._locks[document_id]
+
+    def get_room(self, document_id: int) -> Optional[CollaborationRoom]:
+        return self._rooms.get(document_id)
+
+    async def join(
+        self,
+        document_id: int,
+        websocket: WebSocket,
+        user_id: int,
+        role: CollaborationRole
+    ) -> Tuple[CollaborationRoom, RoomConnection]:
+        """Add a connection to a document's room, opening the room if needed."""
+        async with self._document_lock(document_id):
+            room = self._rooms.get(document_id)
+            if room is None:
+                # Load after taking the lease, so an owner's last flush is included
+                owner = await pubsub.acquire(f"room:{document_id}", self.OWNER_LEASE)
+                content, version = await asyncio.to_thread(self._load_document, document_id)
+                room = CollaborationRoom(document_id, content, version, is_owner=owner)
+                room.persist_task = asyncio.create_task(self._persist_periodically(room))
+                room.subscription = await pubsub.subscribe(room.channel, room.handle_event)
+                if not owner:
+                    await room.request_sync()
+                self._rooms[document_id] = room
+
+            connection = RoomConnection(room, websocket, user_id, role)
+            connection.send({**room.snapshot(), "role": role})
+            room.connections.append(connection)
+        return room, connection
+
+    async def leave(self, room: CollaborationRoom, connection: RoomConnection) -> None:
+        """
+        Remove a connection, persisting and closing the room when it empties.
+
+        The last flush happens under the document's lock with the room still
+        registered, so a client rejoining meanwhile waits for it and then
+        loads the saved content instead of opening a second room on the old
+        version. Rooms of other documents are not held up.
+        """
+        async with self._document_lock(room.document_id):
+            connection.close()
+            if connection in room.connections:
+                room.connections.remove(connection)
+            if room.connections:
+                return
+            if room.persist_task:
+                room.persist_task.cancel()
+            try:
+                await room.flush()
+            finally:
+                if room.subscription:
+                    await pubsub.unsubscribe(room.subscription)
+                if room.is_owner:
+                    await pubsub.release(room.lease)
+                self._rooms.pop(room.document_id, None)
+
+    def set_role(self, document_id: int, user_id: int, role: Optional[CollaborationRole]) -> None:
+        """
+        Apply a collaborator role change to connections already in the room.
+
+        The change is published on the document channel, so rooms on every
+        worker apply it; a revoked collaborator is disconnected with 4403.
+        May be called from a worker thread.
+        """
+        pubsub.publish_threadsafe(f"document:{document_id}", {
+            "type": "role",
+            "user_id": user_id,
+            "role": role.value if role is not None else None
+        })
+
+# Global room manager instance
+room_manager = RoomManager()
@@ -0,0 +1,489 @@
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+import asyncio
+import re
+
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.core.tracing import traced
+from app.database import SessionLocal
+from app.models.document import Document
+from app.models.user import User
+from app.services import ai_service
+from app.services.ai_scheduler import request_deadline
+from app.services.paragraph_cache import normalize_paragraph, paragraph_cache, paragraph_hash
+from app.services.text_operations import WORD_PATTERN, diff_operations
+
+# Paragraphs are separated by blank lines
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+
+# Rough size of the instructions wrapped around each chunk, in tokens
+PROMPT_OVERHEAD_TOKENS = 250
+
+class Chunk(NamedTuple):
+    index: int
+    start: int
+    end: int
+    text: str
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count; English text averages about four characters per token."""
+    return len(text) // 4 + 1
+
+def split_paragraphs(text: str) -> List[Tuple[int, int]]:
+    """Offsets (start, end) of the non-blank paragraphs of a text."""
+    spans = []
+    start = 0
+    for match in PARAGRAPH_BREAK.finditer(text):
+        if text[start:match.start()].strip():
+            spans.append((start, match.start()))
+        start = match.end()
+    if text[start:].strip():
+        spans.append((start, len(text.rstrip())))
+    return spans
+
+def chunk_text(text: str, max_tokens: Optional[int] = None) -> List[Chunk]:
+    """
+    Group consecutive paragraphs into chunks of at most ``max_tokens``.
+
+    A paragraph longer than a chunk is split at the last whitespace before
+    the limit. Chunks keep their offsets in the text, so results can be
+    mapped back and the gaps between chunks restored when merging.
+    """
+    max_chars = (max_tokens or settings.DOCUMENT_ANALYSIS_CHUNK_TOKENS) * 4
+    spans: List[Tuple[int, int]] = []
+    for start, end in split_paragraphs(text):
+        while end - start > max_chars:
+            cut = text.rfind(" ", start, start + max_chars)
+            cut = cut if cut > start else start + max_chars
+            spans.append((start, cut))
+            start = cut
+        spans.append((start, end))
+
+    chunks: List[Chunk] = []
+    chunk_start = chunk_end = None
+    for start, end in spans:
+        if chunk_start is not None and end - chunk_start > max_chars:
+            chunks.append(Chunk(len(chunks), chunk_start, chunk_end, text[chunk_start:chunk_end]))
+            chunk_start = None
+        if chunk_start is None:
+            chunk_start = start
+        chunk_end = end
+    if chunk_start is not None:
+        chunks.append(Chunk(len(chunks), chunk_start, chunk_end, text[chunk_start:chunk_end]))
+    return chunks
+
+class _Segment(NamedTuple):
+    start: int
+    end: int
+    result: Dict[str, Any]
+
+def _error(result: Any) -> Optional[str]:
+    if isinstance(result, ai_service.AIResponse):
+        return None if result.success else result.error
+    if isinstance(result, dict):
+        return result.get("error")
+    return None
+
+def _attribute(items: List[Dict[str, Any]], paragraphs: List[str]) -> Optional[List[int]]:
+    """Index of the paragraph quoted by each item's location, or None if one is not found."""
+    if len(paragraphs) == 1:
+        return [0] * len(items)
+    normalized = [normalize_paragraph(p) for p in paragraphs]
+    owners = []
+    for item in items:
+        location = normalize_paragraph(str(item.get("location") or "")).strip("\"'")
+        owner = next((i for i, p in enumerate(normalized) if location and location in p), None)
+        if owner is None:
+            return None
+        owners.append(owner)
+    return owners
+
+def _split_grammar(result: Any, paragraphs: List[str]):
+    entry = {"improved_text": result.improved_text, "corrections": result.corrections}
+    if len(paragraphs) == 1:
+        return entry, [entry]
+    improved = PARAGRAPH_BREAK.split(result.improved_text.strip())
+    owners = _attribute(result.corrections, paragraphs)
+    if len(improved) != len(paragraphs) or owners is None:
+        return entry, None
+    return entry, [
+        {
+            "improved_text": improved[i],
+            "corrections": [c for c, owner in zip(result.corrections, owners) if owner == i]
+        }
+        for i in range(len(paragraphs))
+    ]
+
+def _split_style(result: Any, paragraphs: List[str]):
+    analysis = result.get("analysis") or {}
+    issues = analysis.get("issues", [])
+    entry = {
+        "issues": issues,
+        "general_feedback": analysis.get("general_feedback"),
+        "compliance_score": analysis.get("compliance_score")
+    }
+    if len(paragraphs) == 1:
+        return entry, [entry]
+    owners = _attribute(issues, paragraphs)
+    if owners is None:
+        return entry, None
+    # The feedback covers the whole batch; keep it once, with the first paragraph
+    return entry, [
+        {
+            "issues": [issue for issue, owner in zip(issues, owners) if owner == i],
+            "general_feedback": entry["general_feedback"] if i == 0 else None,
+            "compliance_score": entry["compliance_score"]
+        }
+        for i in range(len(paragraphs))
+    ]
+
+async def _check_paragraphs(
+    text: str,
+    feature: str,
+    variant: str,
+    check: Callable[[str], Awaitable[Any]],
+    split: Callable[[Any, List[str]], Tuple[Dict[str, Any], Optional[List[Dict[str, Any]]]]]
+) -> Tuple[List[_Segment], List[str]]:
+    """
+    Run a check on the paragraphs of a text that are not cached.
+
+    Runs of consecutive uncached paragraphs are sent together, up to the
+    chunk size, and the results are split back into paragraphs for the
+    cache. A batch whose result cannot be split is returned as one segment
+    and not cached. Segments are relative to their start in ``text``.
+    """
+    max_chars = settings.DOCUMENT_ANALYSIS_CHUNK_TOKENS * 4
+    segments: List[_Segment] = []
+    batches: List[List[Tuple[int, int]]] = []
+    previous_cached = True
+    for start, end in split_paragraphs(text):
+        cached = paragraph_cache.get(feature, paragraph_hash(text[start:end]), variant)
+        if cached is not None:
+            segments.append(_Segment(start, end, cached))
+        elif not previous_cached and end - batches[-1][0][0] <= max_chars:
+            batches[-1].append((start, end))
+        else:
+            batches.append([(start, end)])
+        previous_cached = cached is not None
+
+    errors: List[str] = []
+
+    async def run(batch: List[Tuple[int, int]]) -> None:
+        paragraphs = [text[start:end] for start, end in batch]
+        try:
+            result = await check("\n\n".join(paragraphs))
+        except HTTPException as e:
+            errors.append(e.detail)
+            return
+        error = _error(result)
+        if error:
+            errors.append(error)
+            return
+        entry, parts = split(result, paragraphs)
+        if parts is None:
+            segments.append(_Segment(batch[0][0], batch[-1][1], entry))
+            return
+        for (start, end), part in zip(batch, parts):
+            paragraph_cache.set(feature, paragraph_hash(text[start:end]), part, variant)
+            segments.append(_Segment(start, end, part))
+
+    await asyncio.gather(*(run(batch) for batch in batches))
+    segments.sort(key=lambda segment: segment.start)
+    return segments, errors
+
+def uncached_chars(text: str, feature: str, variant: str = "") -> int:
+    """Length of the paragraphs of a text that a check would still send."""
+    return sum(
+        end - start for start, end in split_paragraphs(text)
+        if not paragraph_cache.contains(feature, paragraph_hash(text[start:end]), variant)
+    )
+
+async def check_grammar(text: str) -> ai_service.GrammarCheck:
+    """
+    ``check_grammar_and_style`` reusing cached results for unchanged
+    paragraphs. Each correction carries the offset of its paragraph; the
+    improved text keeps the original wherever a check failed.
+
+    The changes are also returned as word-level operations, last first, so
+    that every offset refers to ``text`` and they apply in order.
+    """
+    segments, errors = await _check_paragraphs(
+        text, "grammar", "", ai_service.check_grammar_and_style, _split_grammar
+    )
+    corrections = []
+    improved = []
+    position = 0
+    for segment in segments:
+        improved += [text[position:segment.start], segment.result["improved_text"]]
+        corrections += [{**c, "offset": segment.start} for c in segment.result["corrections"]]
+        position = segment.end
+    improved.append(text[position:])
+    operations = [
+        {**operation, "offset": operation["offset"] + segment.start}
+        for segment in reversed(segments)
+        for operation in diff_operations(
+            text[segment.start:segment.end], segment.result["improved_text"], WORD_PATTERN
+        )
+    ]
+    return ai_service.GrammarCheck(
+        success=not errors,
+        error="; ".join(errors) or None,
+        text=text,
+        corrections=corrections,
+        improved_text="".join(improved),
+        operations=operations
+    )
+
+async def check_style(text: str, style_guide: str = "apa") -> Dict[str, Any]:
+    """
+    ``check_style_guide`` reusing cached results for unchanged paragraphs.
+    Each issue carries the offset of its paragraph, and the compliance score
+    is averaged over paragraphs weighted by length.
+    """
+    segments, errors = await _check_paragraphs(
+        text,
+        "style",
+        style_guide.lower(),
+        lambda batch: ai_service.check_style_guide(batch, style_guide),
+        _split_style
+    )
+    issues = []
+    feedback: List[str] = []
+    weighted_score = 0.0
+    scored_chars = 0
+    for segment in segments:
+        issues += [{**issue, "offset": segment.start} for issue in segment.result["issues"]]
+        if segment.result["general_feedback"] and segment.result["general_feedback"] not in feedback:
+            feedback.append(segment.result["general_feedback"])
+        if isinstance(segment.result["compliance_score"], (int, float)):
+            weighted_score += segment.result["compliance_score"] * (segment.end - segment.start)
+            scored_chars += segment.end - segment.start
+    report: Dict[str, Any] = {
+        "analysis": {
+            "issues": issues,
+            "general_feedback": " ".join(feedback),
+            "compliance_score": weighted_score / scored_chars if scored_chars else None
+        },
+        "style_guide": style_guide
+    }
+    if errors:
+        report["error"] = "; ".join(errors)
+    return report
+
+async def _grammar(chunk: Chunk, style_guide: str) -> Any:
+    return await check_grammar(chunk.text)
+
+async def _style(chunk: Chunk, style_guide: str) -> Any:
+    return await check_style(chunk.text, style_guide)
+
+async def _citations(chunk: Chunk, style_guide: str) -> Any:
+    return await ai_service.extract_citations(chunk.text)
+
+async def _arguments(chunk: Chunk, style_guide: str) -> Any:
+    return await ai_service.check_argument_structure(chunk.text)
+
+# Analyses available for whole documents, run chunk by chunk
+ANALYSES: Dict[str, Callable[[Chunk, str], Awaitable[Any]]] = {
+    "grammar": _grammar,
+    "style": _style,
+    "citations": _citations,
+    "arguments": _arguments
+}
+
+def _load_content(document_id: int, user_id: int) -> Tuple[str, int]:
+    """Content and version of a document the user owns or collaborates on."""
+    from app.api.collaborations import check_document_access
+
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.id == user_id).first()
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        check_document_access(document_id, user, db)
+        row = db.query(Document.content, Document.current_version).filter(
+            Document.id == document_id
+        ).first()
+        if not row:
+            raise HTTPException(status_code=404, detail="Document not found")
+        return row.content or "", row.current_version
+    finally:
+        db.close()
+
+def _merge(
+    text: str,
+    chunks: List[Chunk],
+    analyses: List[str],
+    style_guide: str,
+    results: Dict[Tuple[str, int], Any],
+    include_text: bool = False
+) -> Dict[str, Any]:
+    """Combine per-chunk results into one report with document offsets."""
+    report: Dict[str, Any] = {}
+
+    if "grammar" in analyses:
+        corrections = []
+        improved = []
+        position = 0
+        for chunk in chunks:
+            result = results.get(("grammar", chunk.index))
+            improved.append(text[position:chunk.start])
+            if result is not None:
+                corrections += [
+                    {**c, "chunk": chunk.index, "offset": chunk.start + c["offset"]}
+                    for c in result.corrections
+                ]
+                improved.append(result.improved_text)
+            else:
+                improved.append(chunk.text)
+            position = chunk.end
+        improved.append(text[position:])
+        report["grammar"] = {
+            "corrections": corrections,
+            "operations": [
+                {**operation, "offset": operation["offset"] + chunk.start}
+                for chunk in reversed(chunks)
+                if ("grammar", chunk.index) in results
+                for operation in results[("grammar", chunk.index)].operations
+            ]
+        }
+        if include_text:
+            report["grammar"]["improved_text"] = "".join(improved)
+
+    if "style" in analyses:
+        issues = []
+        feedback = []
+        weighted_score = 0.0
+        scored_chars = 0
+        for chunk in chunks:
+            result = results.get(("style", chunk.index))
+            if result is None:
+                continue
+            analysis = result["analysis"]
+            issues += [
+                {**i, "chunk": chunk.index, "offset": chunk.start + i["offset"]}
+                for i in analysis["issues"]
+            ]
+            if analysis.get("general_feedback"):
+                feedback.append(analysis["general_feedback"])
+            if isinstance(analysis.get("compliance_score"), (int, float)):
+                weighted_score += analysis["compliance_score"] * len(chunk.text)
+                scored_chars += len(chunk.text)
+        report["style"] = {
+            "style_guide": style_guide,
+            "issues": issues,
+            "general_feedback": feedback,
+            "compliance_score": weighted_score / scored_chars if scored_chars else None
+        }
+
+    if "citations" in analyses:
+        report["citations"] = [
+            {**citation, "chunk": chunk.index, "offset": chunk.start}
+            for chunk in chunks
+            for citation in results.get(("citations", chunk.index)) or []
+        ]
+
+    if "arguments" in analyses:
+        report["arguments"] = [
+            {"chunk": chunk.index, "offset": chunk.start, **results[("arguments", chunk.index)]}
+            for chunk in chunks
+            if ("arguments", chunk.index) in results and "error" not in results[("arguments", chunk.index)]
+        ]
+
+    return report
+
+def _cost(name: str, chunk: Chunk, style_guide: str) -> int:
+    """Estimated prompt tokens of one call, leaving out paragraphs served from the cache."""
+    if name == "grammar":
+        chars = uncached_chars(chunk.text, "grammar")
+    elif name == "style":
+        chars = uncached_chars(chunk.text, "style", style_guide.lower())
+    else:
+        chars = len(chunk.text)
+    return chars // 4 + 1 + PROMPT_OVERHEAD_TOKENS if chars else 0
+
+@traced("document_analysis")
+async def analyze_document(
+    document_id: int,
+    user_id: int,
+    analyses: Optional[List[str]] = None,
+    style_guide: str = "apa",
+    include_text: bool = False
+) -> Dict[str, Any]:
+    """
+    Run several analyses over a stored document.
+
+    The content is loaded and chunked once and the (analysis, chunk) calls
+    run concurrently. Calls are planned chunk by chunk against a shared
+    token budget, so a document too large for the budget gets every
+    analysis for its leading chunks rather than partial coverage of each;
+    the skipped calls are listed in the report. Grammar changes are
+    returned as edit operations, with the improved text only on request.
+
+    Each call waits for a scheduler slot under a deadline of its own, so
+    the last calls of a long analysis are not dropped for the time the
+    earlier ones took.
+    """
+    from app.services.job_queue import report_progress
+
+    analyses = analyses or list(ANALYSES)
+    unknown = [name for name in analyses if name not in ANALYSES]
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown analyses: {', '.join(unknown)}")
+
+    text, version = await asyncio.to_thread(_load_content, document_id, user_id)
+    chunks = chunk_text(text)
+
+    budget = settings.DOCUMENT_ANALYSIS_TOKEN_BUDGET
+    planned: List[Tuple[str, Chunk]] = []
+    skipped: List[Dict[str, Any]] = []
+    for chunk in chunks:
+        for name in analyses:
+            cost = _cost(name, chunk, style_guide)
+            if cost <= budget:
+                budget -= cost
+                planned.append((name, chunk))
+            else:
+                skipped.append({"analysis": name, "chunk": chunk.index})
+
+    semaphore = asyncio.Semaphore(settings.DOCUMENT_ANALYSIS_MAX_CONCURRENCY)
+    results: Dict[Tuple[str, int], Any] = {}
+    errors: List[Dict[str, Any]] = []
+    done = 0
+
+    async def run(name: str, chunk: Chunk) -> None:
+        nonlocal done
+        async with semaphore:
+            # Calls run in tasks of their own, so this does not leak into the request
+            request_deadline.set(None)
+            try:
+                result = await ANALYSES[name](chunk, style_guide)
+            except HTTPException as e:
+                result = None
+                errors.append({"analysis": name, "chunk": chunk.index, "error": e.detail})
+        if result is not None:
+            error = _error(result)
+            if error:
+                errors.append({"analysis": name, "chunk": chunk.index, "error": error})
+            results[(name, chunk.index)] = result
+        done += 1
+        await report_progress(done / len(planned))
+
+    await asyncio.gather(*(run(name, chunk) for name, chunk in planned))
+    if planned and len(errors) == len(planned):
+        raise HTTPException(
+            status_code=502,
+            detail=f"Every analysis failed: {errors[0]['error']}"
+        )
+
+    return {
+        "document_id": document_id,
+        "version": version,
+        "analyses": analyses,
+        "chunks": [{"index": c.index, "start": c.start, "end": c.end} for c in chunks],
+        "token_budget": settings.DOCUMENT_ANALYSIS_TOKEN_BUDGET,
+        "estimated_tokens": settings.DOCUMENT_ANALYSIS_TOKEN_BUDGET - budget,
+        "skipped": skipped,
+        "errors": errors,
+        **_merge(text, chunks, analyses, style_guide, results, include_text)
+    }
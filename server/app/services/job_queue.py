@@ -0,0 +1,511 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+import asyncio
+import hashlib
+import inspect
+import json
+import logging
+import time
+import uuid
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.pubsub import pubsub
+from app.core.rate_limiter import rate_limiter
+from app.database import SessionLocal
+from app.models.document import Document
+from app.models.job import AnalysisJob, JobStatus
+from app.models.user import SubscriptionTier, User
+from app.services import ai_service, document_analysis
+from app.services.ai_scheduler import current_tier
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[..., Awaitable[Any]]
+
+# AI features that may run as background jobs, by job kind. Handlers taking
+# a ``user_id`` argument get the id of the submitting user. A handler fails by
+# raising, or by returning a result ``ai_service.failed_result`` recognises:
+# an AIResponse without success, or a dict with an "error" key.
+JOB_HANDLERS: Dict[str, JobHandler] = {
+    "literature_analysis": ai_service.analyze_literature,
+    "methodology": ai_service.suggest_methodology,
+    "abstract": ai_service.generate_abstract,
+    "argument_structure": ai_service.check_argument_structure,
+    "document_analysis": document_analysis.analyze_document
+}
+
+# Endpoint whose rate limit budget and cost a submitted job is charged to,
+# by job kind
+JOB_RATE_LIMIT_ENDPOINTS: Dict[str, str] = {
+    "literature_analysis": "/api/v1/ai/literature-analysis",
+    "methodology": "/api/v1/ai/methodology",
+    "abstract": "/api/v1/ai/abstract",
+    "argument_structure": "/api/v1/ai/check-arguments",
+    "document_analysis": "/api/v1/ai/analyze-document"
+}
+
+def _document_version(db: Session, params: Dict[str, Any]) -> Optional[int]:
+    return db.query(Document.current_version).filter(
+        Document.id == params.get("document_id")
+    ).scalar()
+
+# Version of the stored input a job reads, by job kind. It is part of the
+# input hash, so a job submitted after the input changed is not deduplicated
+# against a result computed from the old one.
+JOB_INPUT_VERSIONS: Dict[str, Callable[[Session, Dict[str, Any]], Any]] = {
+    "document_analysis": _document_version
+}
+
+FINISHED_STATUSES = (JobStatus.SUCCEEDED, JobStatus.FAILED, JobStatus.CANCELLED)
+
+jobs_finished = metrics.counter(
+    "jobs_finished_total", "Background jobs finished", ["kind", "status"]
+)
+jobs_retried = metrics.counter(
+    "jobs_retried_total", "Background job attempts that failed and were retried", ["kind"]
+)
+job_duration = metrics.histogram(
+    "job_attempt_duration_seconds", "Duration of single background job attempts", ["kind"]
+)
+
+# Job being executed by the current worker task
+current_job: ContextVar[Optional[str]] = ContextVar("current_job", default=None)
+
+def job_channel(job_id: str) -> str:
+    return f"job:{job_id}"
+
+def input_hash(kind: str, params: Dict[str, Any], version: Any = None) -> str:
+    key = {"kind": kind, "params": params}
+    if version is not None:
+        key["version"] = version
+    payload = json.dumps(key, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def _runnable(now: datetime):
+    """Queued jobs that are due, and running jobs whose worker lost its lease."""
+    return or_(
+        and_(AnalysisJob.status == JobStatus.QUEUED, AnalysisJob.available_at <= now),
+        and_(
+            AnalysisJob.status == JobStatus.RUNNING,
+            AnalysisJob.locked_until < now,
+            AnalysisJob.attempts < AnalysisJob.max_attempts
+        )
+    )
+
+def job_event(job: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "type": "job",
+        "id": job["id"],
+        "status": job["status"],
+        "progress": job["progress"],
+        "error": job.get("error")
+    }
+
+def _arguments(handler: JobHandler, user_id: int, params: Dict[str, Any]) -> Dict[str, Any]:
+    if "user_id" in inspect.signature(handler).parameters:
+        return {**params, "user_id": user_id}
+    return params
+
+async def report_progress(progress: float) -> None:
+    """Record the progress (0-1) of the job being executed, if any."""
+    job_id = current_job.get()
+    if job_id is None:
+        return
+    await job_queue.set_progress(job_id, progress)
+
+class JobError(Exception):
+    """A job attempt failed."""
+
+class JobQueue:
+    """
+    Durable queue of long-running AI analyses.
+
+    Jobs are rows of ``analysis_jobs`` in the application database, so they
+    survive restarts and are shared by all server workers. Worker tasks claim
+    a due job with a conditional update and hold a lease on it while the
+    handler runs; a job whose worker dies is picked up again once the lease
+    runs out. Failed attempts are retried with exponential backoff, and
+    finished jobs are kept for ``result_ttl`` seconds so that identical
+    submissions return the stored result.
+
+    The lease is renewed while the handler runs; a renewal that finds the
+    job no longer running, e.g. because it was cancelled through another
+    server worker, stops the handler. Progress and status changes are
+    published on ``job:{id}``.
+    """
+
+    def __init__(self):
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Format: {job_id: handler task}
+        self._running: Dict[str, asyncio.Task] = {}
+        # Running jobs cancelled through the API
+        self._cancelled: Set[str] = set()
+
+        # Queue settings
+        self.PURGE_INTERVAL = 300  # seconds
+        self.CLAIM_CANDIDATES = 5
+
+        # Metrics
+        self.submitted = 0
+        self.deduplicated = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.retried = 0
+        self.purged = 0
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._work(f"{pubsub.worker_id}:{n}"))
+            for n in range(settings.JOBS_WORKERS)
+        ]
+        self._tasks.append(asyncio.create_task(self._purge_expired()))
+
+    async def stop(self) -> None:
+        # Running jobs are handed back to the queue by their worker task
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _notify(self) -> None:
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def submit(
+        self,
+        db: Session,
+        user: User,
+        kind: str,
+        params: Dict[str, Any]
+    ) -> AnalysisJob:
+        """
+        Queue a job, or return an unexpired job with the same input, at the
+        same version for kinds reading stored input.
+
+        A new job is charged to the rate limit of the endpoint running the
+        same analysis, so jobs cost as much as direct requests.
+        """
+        handler = JOB_HANDLERS.get(kind)
+        if handler is None:
+            raise HTTPException(status_code=422, detail=f"Unknown job kind: {kind}")
+        try:
+            if "user_id" in params:
+                raise TypeError("user_id cannot be set")
+            inspect.signature(handler).bind(**_arguments(handler, user.id, params))
+        except TypeError as e:
+            raise HTTPException(status_code=422, detail=f"Invalid parameters for {kind}: {str(e)}")
+
+        now = datetime.utcnow()
+        input_version = JOB_INPUT_VERSIONS.get(kind)
+        digest = input_hash(kind, params, input_version(db, params) if input_version else None)
+        existing = db.query(AnalysisJob).filter(
+            AnalysisJob.user_id == user.id,
+            AnalysisJob.input_hash == digest,
+            AnalysisJob.status.in_([JobStatus.QUEUED, JobStatus.RUNNING, JobStatus.SUCCEEDED]),
+            or_(AnalysisJob.expires_at.is_(None), AnalysisJob.expires_at > now)
+        ).order_by(AnalysisJob.created_at.desc()).first()
+        if existing:
+            self.deduplicated += 1
+            return existing
+
+        rate_limiter.consume(user.id, JOB_RATE_LIMIT_ENDPOINTS[kind])
+        job = AnalysisJob(
+            id=uuid.uuid4().hex,
+            user_id=user.id,
+            kind=kind,
+            params=params,
+            input_hash=digest,
+            subscription_tier=user.subscription_tier.value if user.subscription_tier else None,
+            status=JobStatus.QUEUED,
+            progress=0.0,
+            attempts=0,
+            max_attempts=settings.JOBS_MAX_ATTEMPTS,
+            created_at=now,
+            available_at=now
+        )
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        self.submitted += 1
+        self._notify()
+        return job
+
+    async def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job; False if it already finished."""
+        now = datetime.utcnow()
+        cancelled = await asyncio.to_thread(self._update, job_id, (JobStatus.QUEUED, JobStatus.RUNNING), {
+            AnalysisJob.status: JobStatus.CANCELLED,
+            AnalysisJob.finished_at: now,
+            AnalysisJob.expires_at: now + timedelta(seconds=settings.JOBS_RESULT_TTL),
+            AnalysisJob.locked_until: None
+        })
+        if not cancelled:
+            return False
+        self._stop(job_id)
+        await self._publish(job_id)
+        return True
+
+    def _stop(self, job_id: str) -> None:
+        """Stop a job's handler if it runs in this process."""
+        task = self._running.get(job_id)
+        if task is not None and not task.done():
+            self._cancelled.add(job_id)
+            task.cancel()
+
+    async def set_progress(self, job_id: str, progress: float) -> None:
+        """Record progress and renew the lease of a running job."""
+        renewed = await asyncio.to_thread(self._update, job_id, (JobStatus.RUNNING,), {
+            AnalysisJob.progress: min(max(progress, 0.0), 1.0),
+            AnalysisJob.locked_until: datetime.utcnow() + timedelta(seconds=settings.JOBS_LEASE_SECONDS)
+        })
+        if not renewed:
+            self._stop(job_id)
+            return
+        await self._publish(job_id)
+
+    async def _renew_lease(self, job_id: str) -> None:
+        """Renew a running job's lease until it ends, stopping it if it was cancelled."""
+        while True:
+            await asyncio.sleep(settings.JOBS_LEASE_SECONDS / 3)
+            try:
+                renewed = await asyncio.to_thread(self._update, job_id, (JobStatus.RUNNING,), {
+                    AnalysisJob.locked_until: datetime.utcnow() + timedelta(seconds=settings.JOBS_LEASE_SECONDS)
+                })
+            except Exception as e:
+                logger.warning(f"Error renewing the lease of job {job_id}: {str(e)}")
+                continue
+            if not renewed:
+                self._stop(job_id)
+                return
+
+    @staticmethod
+    def _update(job_id: str, statuses, values: Dict[Any, Any]) -> bool:
+        """Update a job only while it is in one of ``statuses``."""
+        db = SessionLocal()
+        try:
+            updated = db.query(AnalysisJob).filter(
+                AnalysisJob.id == job_id,
+                AnalysisJob.status.in_(statuses)
+            ).update(values, synchronize_session=False)
+            db.commit()
+            return bool(updated)
+        finally:
+            db.close()
+
+    @staticmethod
+    def snapshot(job: AnalysisJob) -> Dict[str, Any]:
+        return {
+            "id": job.id,
+            "user_id": job.user_id,
+            "kind": job.kind,
+            "params": job.params or {},
+            "subscription_tier": job.subscription_tier,
+            "status": job.status.value,
+            "progress": job.progress or 0.0,
+            "error": job.error,
+            "attempts": job.attempts,
+            "max_attempts": job.max_attempts
+        }
+
+    @classmethod
+    def _load(cls, job_id: str) -> Optional[Dict[str, Any]]:
+        db = SessionLocal()
+        try:
+            job = db.query(AnalysisJob).filter(AnalysisJob.id == job_id).first()
+            return cls.snapshot(job) if job else None
+        finally:
+            db.close()
+
+    async def _publish(self, job_id: str) -> None:
+        job = await asyncio.to_thread(self._load, job_id)
+        if job is not None:
+            await pubsub.publish(job_channel(job_id), job_event(job))
+
+    def _claim(self, worker: str) -> Optional[Dict[str, Any]]:
+        """Take the oldest runnable job, or None if there is nothing to do."""
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            candidates = db.query(AnalysisJob.id).filter(_runnable(now)).order_by(
+                AnalysisJob.available_at
+            ).limit(self.CLAIM_CANDIDATES).all()
+            for (job_id,) in candidates:
+                # Another worker may claim the same job; only one update matches
+                claimed = db.query(AnalysisJob).filter(
+                    AnalysisJob.id == job_id,
+                    _runnable(now)
+                ).update({
+                    AnalysisJob.status: JobStatus.RUNNING,
+                    AnalysisJob.attempts: AnalysisJob.attempts + 1,
+                    AnalysisJob.locked_until: now + timedelta(seconds=settings.JOBS_LEASE_SECONDS),
+                    AnalysisJob.error: None
+                }, synchronize_session=False)
+                db.commit()
+                if claimed:
+                    job = db.query(AnalysisJob).filter(AnalysisJob.id == job_id).first()
+                    logger.debug(f"Worker {worker} claimed job {job_id}")
+                    return self.snapshot(job)
+            return None
+        finally:
+            db.close()
+
+    async def _work(self, worker: str) -> None:
+        while True:
+            try:
+                job = await asyncio.to_thread(self._claim, worker)
+            except Exception as e:
+                logger.error(f"Error claiming job: {str(e)}")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), settings.JOBS_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+            await self._execute(job)
+
+    async def _execute(self, job: Dict[str, Any]) -> None:
+        kind = job["kind"]
+        await pubsub.publish(job_channel(job["id"]), job_event(job))
+
+        job_token = current_job.set(job["id"])
+        tier_token = current_tier.set(SubscriptionTier(job["subscription_tier"] or "free"))
+        handler = JOB_HANDLERS[kind]
+        task = asyncio.create_task(handler(**_arguments(handler, job["user_id"], job["params"])))
+        self._running[job["id"]] = task
+        lease = asyncio.create_task(self._renew_lease(job["id"]))
+        started = time.perf_counter()
+        try:
+            result = await task
+            if ai_service.failed_result(result):
+                error = result.error if isinstance(result, ai_service.AIResponse) else result.get("error")
+                raise JobError(error or "Job failed")
+        except asyncio.CancelledError:
+            if job["id"] in self._cancelled:
+                self._cancelled.discard(job["id"])
+                jobs_finished.labels(kind, JobStatus.CANCELLED.value).inc()
+                return
+            # The server is shutting down; hand the job back without counting
+            # the attempt instead of waiting for the lease to run out
+            self._update(job["id"], (JobStatus.RUNNING,), {
+                AnalysisJob.status: JobStatus.QUEUED,
+                AnalysisJob.attempts: AnalysisJob.attempts - 1,
+                AnalysisJob.locked_until: None
+            })
+            raise
+        except Exception as e:
+            job_duration.labels(kind).observe(time.perf_counter() - started)
+            await self._fail(job, e)
+            return
+        finally:
+            lease.cancel()
+            self._running.pop(job["id"], None)
+            current_tier.reset(tier_token)
+            current_job.reset(job_token)
+
+        job_duration.labels(kind).observe(time.perf_counter() - started)
+        now = datetime.utcnow()
+        if await asyncio.to_thread(self._update, job["id"], (JobStatus.RUNNING,), {
+            AnalysisJob.status: JobStatus.SUCCEEDED,
+            AnalysisJob.progress: 1.0,
+            AnalysisJob.result: result,
+            AnalysisJob.finished_at: now,
+            AnalysisJob.expires_at: now + timedelta(seconds=settings.JOBS_RESULT_TTL),
+            AnalysisJob.locked_until: None
+        }):
+            self.succeeded += 1
+            jobs_finished.labels(kind, JobStatus.SUCCEEDED.value).inc()
+        await self._publish(job["id"])
+
+    async def _fail(self, job: Dict[str, Any], error: Exception) -> None:
+        kind = job["kind"]
+        message = error.detail if isinstance(error, HTTPException) else str(error)
+        now = datetime.utcnow()
+        if job["attempts"] < job["max_attempts"]:
+            delay = settings.JOBS_RETRY_BACKOFF * 2 ** (job["attempts"] - 1)
+            values = {
+                AnalysisJob.status: JobStatus.QUEUED,
+                AnalysisJob.available_at: now + timedelta(seconds=delay),
+                AnalysisJob.locked_until: None,
+                AnalysisJob.error: message
+            }
+            self.retried += 1
+            jobs_retried.labels(kind).inc()
+            logger.warning(f"Job {job['id']} ({kind}) failed, retrying in {delay}s: {message}")
+        else:
+            values = {
+                AnalysisJob.status: JobStatus.FAILED,
+                AnalysisJob.finished_at: now,
+                AnalysisJob.expires_at: now + timedelta(seconds=settings.JOBS_RESULT_TTL),
+                AnalysisJob.locked_until: None,
+                AnalysisJob.error: message
+            }
+            self.failed += 1
+            jobs_finished.labels(kind, JobStatus.FAILED.value).inc()
+            logger.error(f"Job {job['id']} ({kind}) failed after {job['attempts']} attempts: {message}")
+        await asyncio.to_thread(self._update, job["id"], (JobStatus.RUNNING,), values)
+        await self._publish(job["id"])
+
+    def _purge(self) -> int:
+        """Delete expired jobs and fail running jobs that exhausted their attempts."""
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            db.query(AnalysisJob).filter(
+                AnalysisJob.status == JobStatus.RUNNING,
+                AnalysisJob.locked_until < now,
+                AnalysisJob.attempts >= AnalysisJob.max_attempts
+            ).update({
+                AnalysisJob.status: JobStatus.FAILED,
+                AnalysisJob.error: "Worker stopped while running the job",
+                AnalysisJob.finished_at: now,
+                AnalysisJob.expires_at: now + timedelta(seconds=settings.JOBS_RESULT_TTL),
+                AnalysisJob.locked_until: None
+            }, synchronize_session=False)
+            purged = db.query(AnalysisJob).filter(
+                AnalysisJob.expires_at < now
+            ).delete(synchronize_session=False)
+            db.commit()
+            return purged
+        finally:
+            db.close()
+
+    async def _purge_expired(self) -> None:
+        while True:
+            try:
+                self.purged += await asyncio.to_thread(self._purge)
+            except Exception as e:
+                logger.error(f"Error purging jobs: {str(e)}")
+            await asyncio.sleep(self.PURGE_INTERVAL)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "workers": settings.JOBS_WORKERS if self._tasks else 0,
+            "running": len(self._running),
+            "submitted": self.submitted,
+            "deduplicated": self.deduplicated,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "retried": self.retried,
+            "purged": self.purged
+        }
+
+# Global job queue instance
+job_queue = JobQueue()
+
+def _collect_metrics():
+    stats = job_queue.get_stats()
+    yield "jobs_running", "gauge", "Background jobs running in this server worker", [({}, stats["running"])]
+
+metrics.register_collector(_collect_metrics)
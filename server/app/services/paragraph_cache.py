@@ -0,0 +1,91 @@
+from typing import Any, Dict, Optional, Tuple
+from collections import OrderedDict
+import hashlib
+import re
+import threading
+import time
+
+from app.core.metrics import metrics
+
+WHITESPACE = re.compile(r"\s+")
+
+def normalize_paragraph(paragraph: str) -> str:
+    """Collapse whitespace runs, so reflowing a paragraph does not change it."""
+    return WHITESPACE.sub(" ", paragraph).strip()
+
+def paragraph_hash(paragraph: str) -> str:
+    return hashlib.sha256(normalize_paragraph(paragraph).encode()).hexdigest()
+
+class ParagraphCache:
+    """
+    AI results for single paragraphs.
+
+    Entries are keyed by feature, paragraph hash and a variant such as the
+    style guide, so a paragraph that did not change between two checks of a
+    document is not sent to OpenAI again wherever it moved in the text.
+    Results are stored relative to the paragraph; callers add its offset.
+    """
+
+    def __init__(self):
+        # Format: {(feature, paragraph_hash, variant): (expires_at, result)}
+        self._entries: "OrderedDict[Tuple[str, str, str], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Cache settings
+        self.TTL = 7 * 24 * 3600  # seconds
+        self.MAX_ENTRIES = 50000
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, feature: str, digest: str, variant: str = "") -> Optional[Dict[str, Any]]:
+        key = (feature, digest, variant)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def contains(self, feature: str, digest: str, variant: str = "") -> bool:
+        """Whether a live entry exists, without counting a lookup."""
+        entry = self._entries.get((feature, digest, variant))
+        return entry is not None and entry[0] >= time.monotonic()
+
+    def set(self, feature: str, digest: str, result: Dict[str, Any], variant: str = "") -> None:
+        key = (feature, digest, variant)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.TTL, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.MAX_ENTRIES:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+# Global paragraph cache instance
+paragraph_cache = ParagraphCache()
+
+def _collect_metrics():
+    stats = paragraph_cache.get_stats()
+    yield "paragraph_cache_entries", "gauge", "Paragraph results cached", [({}, stats["entries"])]
+    yield "paragraph_cache_hits_total", "counter", "Paragraph cache hits", [({}, stats["hits"])]
+    yield "paragraph_cache_misses_total", "counter", "Paragraph cache misses", [({}, stats["misses"])]
+
+metrics.register_collector(_collect_metrics)
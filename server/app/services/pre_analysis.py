@@ -0,0 +1,158 @@
+from typing import Any, Dict, Optional, Tuple
+import asyncio
+import logging
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.rate_limiter import rate_limiter
+from app.database import SessionLocal
+from app.models.document import Document
+from app.models.user import SubscriptionTier, User
+from app.services import document_analysis
+from app.services.ai_scheduler import current_tier
+
+logger = logging.getLogger(__name__)
+
+# Rate limiter key charged for speculative runs, and the endpoints whose cost a run matches
+RATE_LIMIT_KEY = "pre-analysis"
+RATE_LIMIT_ENDPOINTS = ("/api/v1/ai/grammar", "/api/v1/ai/check-style")
+
+pre_analysis_runs = metrics.counter(
+    "pre_analysis_runs_total", "Speculative document analyses by outcome", ["outcome"]
+)
+
+class PreAnalyzer:
+    """
+    Speculative grammar and style checks after a document is saved.
+
+    Saves by users of the configured tiers schedule a check of the new
+    version after ``pre_analysis.debounce`` seconds; a newer save of the same
+    document reschedules it, and cancels a check already running for an
+    older version. Only paragraphs missing from the paragraph cache are
+    sent, so when the user opens the suggestions panel the results are
+    served from the cache.
+
+    Runs are charged to a separate rate limit budget, and their calls are
+    queued at the free tier's scheduler weight so they yield to
+    interactive requests. ``schedule`` may be called from any thread.
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Format: {document_id: debounce timer}
+        self._pending: Dict[int, asyncio.TimerHandle] = {}
+        # Format: {document_id: (version, task)}
+        self._running: Dict[int, Tuple[int, asyncio.Task]] = {}
+
+        # Metrics
+        self.scheduled = 0
+        self.superseded = 0
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+
+    async def stop(self) -> None:
+        for handle in self._pending.values():
+            handle.cancel()
+        self._pending.clear()
+        for _, task in list(self._running.values()):
+            task.cancel()
+        self._loop = None
+
+    @staticmethod
+    def _eligible(user: User) -> bool:
+        if not settings.PRE_ANALYSIS_ENABLED or not user.subscription_tier:
+            return False
+        if not (user.preferences or {}).get("pre_analysis", True):
+            return False
+        return user.subscription_tier.value in settings.PRE_ANALYSIS_TIERS
+
+    def schedule(self, user: User, document_id: int, version: int) -> None:
+        """Pre-analyse a saved version of a document, if the user qualifies."""
+        loop = self._loop
+        if loop is None or loop.is_closed() or not self._eligible(user):
+            return
+        loop.call_soon_threadsafe(self._schedule, user.id, document_id, version)
+
+    def _schedule(self, user_id: int, document_id: int, version: int) -> None:
+        handle = self._pending.pop(document_id, None)
+        if handle is not None:
+            handle.cancel()
+            self.superseded += 1
+            pre_analysis_runs.labels("superseded").inc()
+        running = self._running.get(document_id)
+        if running is not None and running[0] < version:
+            running[1].cancel()
+            self.superseded += 1
+            pre_analysis_runs.labels("superseded").inc()
+        self._pending[document_id] = self._loop.call_later(
+            settings.PRE_ANALYSIS_DEBOUNCE, self._launch, user_id, document_id, version
+        )
+        self.scheduled += 1
+
+    def _launch(self, user_id: int, document_id: int, version: int) -> None:
+        self._pending.pop(document_id, None)
+        task = asyncio.create_task(self._run(user_id, document_id, version))
+        self._running[document_id] = (version, task)
+
+        def forget(finished: asyncio.Task) -> None:
+            if self._running.get(document_id, (None, None))[1] is finished:
+                del self._running[document_id]
+
+        task.add_done_callback(forget)
+
+    @staticmethod
+    def _load(document_id: int, version: int) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Content and metadata of the document, or None if it moved past ``version``."""
+        db = SessionLocal()
+        try:
+            row = db.query(Document.content, Document.document_metadata).filter(
+                Document.id == document_id,
+                Document.current_version == version
+            ).first()
+            return (row.content or "", row.document_metadata or {}) if row else None
+        finally:
+            db.close()
+
+    async def _run(self, user_id: int, document_id: int, version: int) -> None:
+        try:
+            loaded = await asyncio.to_thread(self._load, document_id, version)
+            if loaded is None:
+                pre_analysis_runs.labels("superseded").inc()
+                return
+            content, metadata = loaded
+            style_guide = metadata.get("style_guide", "apa")
+            if not (
+                document_analysis.uncached_chars(content, "grammar")
+                or document_analysis.uncached_chars(content, "style", style_guide.lower())
+            ):
+                pre_analysis_runs.labels("cached").inc()
+                return
+
+            cost = sum(rate_limiter.TOKEN_COSTS.get(e, rate_limiter.DEFAULT_TOKENS) for e in RATE_LIMIT_ENDPOINTS)
+            if not rate_limiter.try_consume(user_id, RATE_LIMIT_KEY, cost, settings.PRE_ANALYSIS_RATE_BUDGET):
+                pre_analysis_runs.labels("over_budget").inc()
+                return
+
+            current_tier.set(SubscriptionTier.FREE)
+            await asyncio.gather(
+                document_analysis.check_grammar(content),
+                document_analysis.check_style(content, style_guide)
+            )
+            pre_analysis_runs.labels("completed").inc()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            pre_analysis_runs.labels("failed").inc()
+            logger.warning(f"Pre-analysis of document {document_id} failed: {str(e)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "running": len(self._running),
+            "scheduled": self.scheduled,
+            "superseded": self.superseded
+        }
+
+# Global pre-analyzer instance
+pre_analyzer = PreAnalyzer()
@@ -1,11 +1,14 @@
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
 
 from app.models.user import User, SubscriptionTier
+from app.models.usage_stats import UsageRollupDaily, UsageRollupHourly
 from app.core.subscription import SubscriptionConfig
 from app.schemas.subscription import SubscriptionCreate, SubscriptionUpdate
+from app.services.usage_recorder import usage_recorder
 
 class SubscriptionService:
     @staticmethod
@@ -59,31 +62,61 @@ class SubscriptionService:
         start_date: Optional[datetime] = None,
         end_date: Optional[datetime] = None
     ) -> Dict[str, Any]:
-        """Get usage statistics for a user."""
+        """
+        Get usage statistics for a user.
+
+        Reads the pre-aggregated rollups, so the cost depends on the number of
+        days in the period rather than the number of requests. The period is
+        aligned to whole hours.
+        """
         if not start_date:
             start_date = datetime.utcnow() - timedelta(days=30)
         if not end_date:
             end_date = datetime.utcnow()
 
-        # Query usage statistics from the database
-        usage_stats = db.query(UsageStats).filter(
-            UsageStats.user_id == user.id,
-            UsageStats.timestamp.between(start_date, end_date)
-        ).all()
+        # Whole days come from the daily rollups, the partial days at either
+        # end of the window from the hourly ones
+        hour_start = start_date.replace(minute=0, second=0, microsecond=0)
+        first_day = hour_start.replace(hour=0)
+        if first_day < hour_start:
+            first_day += timedelta(days=1)
+        last_day = end_date.replace(hour=0, minute=0, second=0, microsecond=0)
+
+        if first_day < last_day:
+            ranges = [
+                (UsageRollupHourly, hour_start, first_day),
+                (UsageRollupDaily, first_day, last_day),
+                (UsageRollupHourly, last_day, end_date)
+            ]
+        else:
+            ranges = [(UsageRollupHourly, hour_start, end_date)]
 
-        # Aggregate statistics
-        total_tokens = sum(stat.tokens_used for stat in usage_stats)
-        total_requests = len(usage_stats)
+        total_tokens = 0
+        total_requests = 0
         feature_usage = {}
-        
-        for stat in usage_stats:
-            if stat.feature not in feature_usage:
-                feature_usage[stat.feature] = {
+        for model, range_start, range_end in ranges:
+            if range_start >= range_end:
+                continue
+            rows = db.query(
+                model.feature,
+                func.sum(model.request_count),
+                func.sum(model.tokens_used)
+            ).filter(
+                model.user_id == user.id,
+                model.bucket_start >= range_start,
+                model.bucket_start < range_end
+            ).group_by(model.feature).all()
+
+            for feature, requests, tokens in rows:
+                requests, tokens = requests or 0, tokens or 0
+                usage = feature_usage.setdefault(feature, {
                     "total_requests": 0,
                     "total_tokens": 0
-                }
-            feature_usage[stat.feature]["total_requests"] += 1
-            feature_usage[stat.feature]["total_tokens"] += stat.tokens_used
+                })
+                usage["total_requests"] += requests
+                usage["total_tokens"] += tokens
+                total_requests += requests
+                total_tokens += tokens
 
         return {
             "period": {
@@ -109,21 +142,20 @@ class SubscriptionService:
         success: bool = True,
         error_message: Optional[str] = None
     ) -> None:
-        """Record usage statistics for a request."""
-        try:
-            usage_stat = UsageStats(
-                user_id=user.id,
-                feature=feature,
-                tokens_used=tokens_used,
-                success=success,
-                error_message=error_message,
-                timestamp=datetime.utcnow()
-            )
-            db.add(usage_stat)
-            db.commit()
-        except Exception as e:
-            db.rollback()
-            print(f"Error recording usage stats: {str(e)}")
+        """
+        Record usage statistics for a request.
+
+        The event is buffered and written in bulk in the background, so this
+        adds no database round trip to the request.
+        """
+        usage_recorder.record({
+            "user_id": user.id,
+            "feature": feature,
+            "tokens_used": tokens_used,
+            "success": success,
+            "error_message": error_message,
+            "timestamp": datetime.utcnow()
+        })
 
     @staticmethod
     async def get_available_upgrades(user: User) -> Dict[str, Any]:
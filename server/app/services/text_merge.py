@@ -0,0 +1,81 @@
+from typing import List, Tuple
+from difflib import SequenceMatcher
+
+class MergeConflictError(ValueError):
+    """Raised when both sides changed the same region of the base text."""
+
+    def __init__(self, conflicts: int):
+        super().__init__(f"{conflicts} conflicting change(s) could not be merged")
+        self.conflicts = conflicts
+
+def _sync_regions(
+    base: List[str],
+    ours: List[str],
+    theirs: List[str]
+) -> List[Tuple[int, int, int, int, int, int]]:
+    """
+    Find regions of the base that are unchanged on both sides.
+
+    Each region is (base_start, base_end, ours_start, ours_end, theirs_start,
+    theirs_end), ending with an empty sentinel region at the end of all texts.
+    """
+    ours_matches = SequenceMatcher(None, base, ours, autojunk=False).get_matching_blocks()
+    theirs_matches = SequenceMatcher(None, base, theirs, autojunk=False).get_matching_blocks()
+
+    regions = []
+    i = j = 0
+    while i < len(ours_matches) and j < len(theirs_matches):
+        ours_base, ours_start, ours_len = ours_matches[i]
+        theirs_base, theirs_start, theirs_len = theirs_matches[j]
+
+        start = max(ours_base, theirs_base)
+        end = min(ours_base + ours_len, theirs_base + theirs_len)
+        if start < end:
+            ours_sub = ours_start + (start - ours_base)
+            theirs_sub = theirs_start + (start - theirs_base)
+            regions.append((
+                start, end,
+                ours_sub, ours_sub + (end - start),
+                theirs_sub, theirs_sub + (end - start)
+            ))
+
+        if ours_base + ours_len < theirs_base + theirs_len:
+            i += 1
+        else:
+            j += 1
+
+    regions.append((len(base), len(base), len(ours), len(ours), len(theirs), len(theirs)))
+    return regions
+
+def merge_texts(base: str, ours: str, theirs: str) -> str:
+    """
+    Three-way merge two edits of a common ancestor, line by line.
+
+    Raises MergeConflictError if both sides changed the same lines differently.
+    """
+    base_lines = base.splitlines(keepends=True)
+    ours_lines = ours.splitlines(keepends=True)
+    theirs_lines = theirs.splitlines(keepends=True)
+
+    merged: List[str] = []
+    conflicts = 0
+    base_pos = ours_pos = theirs_pos = 0
+    for (base_start, base_end, ours_start, ours_end,
+         theirs_start, theirs_end) in _sync_regions(base_lines, ours_lines, theirs_lines):
+        base_chunk = base_lines[base_pos:base_start]
+        ours_chunk = ours_lines[ours_pos:ours_start]
+        theirs_chunk = theirs_lines[theirs_pos:theirs_start]
+
+        if ours_chunk == base_chunk:
+            merged.extend(theirs_chunk)
+        elif theirs_chunk == base_chunk or ours_chunk == theirs_chunk:
+            merged.extend(ours_chunk)
+        else:
+            conflicts += 1
+
+        merged.extend(base_lines[base_start:base_end])
+        base_pos, ours_pos, theirs_pos = base_end, ours_end, theirs_end
+
+    if conflicts:
+        raise MergeConflictError(conflicts)
+    return "".join(merged)
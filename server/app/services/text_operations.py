@@ -0,0 +1,171 @@
+from typing import List, Dict, Any, Tuple
+from difflib import SequenceMatcher
+import re
+
+# Diff units: whole lines, including their line break
+LINE_PATTERN = re.compile(r"[^\n]*\n|[^\n]+")
+
+# Diff units for prose edits: words, whitespace runs and single punctuation marks
+WORD_PATTERN = re.compile(r"\w+|\s+|[^\w\s]")
+
+class TextOperationError(ValueError):
+    """Raised when a text operation cannot be applied to the content."""
+
+def validate_operation(operation: Dict[str, Any]) -> None:
+    """Check that an operation is well formed."""
+    op_type = operation.get("type")
+    offset = operation.get("offset")
+    if not isinstance(offset, int) or offset < 0:
+        raise TextOperationError(f"Invalid offset: {offset}")
+    if op_type == "insert":
+        if not isinstance(operation.get("text"), str):
+            raise TextOperationError("Insert operations require text")
+    elif op_type == "delete":
+        length = operation.get("length")
+        if not isinstance(length, int) or length < 0:
+            raise TextOperationError(f"Invalid delete length: {length}")
+    else:
+        raise TextOperationError(f"Unknown operation type: {op_type}")
+
+def apply_operation(content: str, operation: Dict[str, Any]) -> str:
+    """Apply a single insert/delete operation to the content."""
+    validate_operation(operation)
+    offset = operation["offset"]
+    if offset > len(content):
+        raise TextOperationError(
+            f"Offset {offset} is beyond the end of the document ({len(content)})"
+        )
+
+    if operation["type"] == "insert":
+        return content[:offset] + operation["text"] + content[offset:]
+
+    end = offset + operation["length"]
+    if end > len(content):
+        raise TextOperationError(
+            f"Delete range {offset}-{end} is beyond the end of the document ({len(content)})"
+        )
+    return content[:offset] + content[end:]
+
+def apply_operations(content: str, operations: List[Dict[str, Any]]) -> str:
+    """
+    Apply operations in order.
+
+    Each operation's offset refers to the text produced by the operations
+    before it.
+    """
+    for operation in operations:
+        content = apply_operation(content, operation)
+    return content
+
+def _insert(offset: int, text: str) -> List[Dict[str, Any]]:
+    return [{"type": "insert", "offset": offset, "text": text}] if text else []
+
+def _delete(offset: int, length: int) -> List[Dict[str, Any]]:
+    return [{"type": "delete", "offset": offset, "length": length}] if length > 0 else []
+
+def transform_operation(
+    operation: Dict[str, Any],
+    applied: Dict[str, Any],
+    wins_ties: bool = False
+) -> List[Dict[str, Any]]:
+    """
+    Transform an operation so it applies after a concurrent ``applied`` one.
+
+    Both operations must be based on the same text. ``wins_ties`` decides which
+    insert goes first when both insert at the same offset. The result is a list
+    because a delete may be split in two, or vanish entirely.
+    """
+    offset = operation["offset"]
+    applied_offset = applied["offset"]
+
+    if applied["type"] == "insert":
+        inserted = len(applied["text"])
+        if operation["type"] == "insert":
+            if offset > applied_offset or (offset == applied_offset and not wins_ties):
+                offset += inserted
+            return _insert(offset, operation["text"])
+
+        end = offset + operation["length"]
+        if applied_offset <= offset:
+            return _delete(offset + inserted, operation["length"])
+        if applied_offset < end:
+            # Keep the inserted text, delete around it (later range first)
+            return (
+                _delete(applied_offset + inserted, end - applied_offset)
+                + _delete(offset, applied_offset - offset)
+            )
+        return _delete(offset, operation["length"])
+
+    applied_end = applied_offset + applied["length"]
+    if operation["type"] == "insert":
+        if offset > applied_end:
+            offset -= applied["length"]
+        elif offset > applied_offset:
+            offset = applied_offset
+        return _insert(offset, operation["text"])
+
+    end = offset + operation["length"]
+    overlap = max(0, min(end, applied_end) - max(offset, applied_offset))
+    if offset >= applied_end:
+        offset -= applied["length"]
+    elif offset > applied_offset:
+        offset = applied_offset
+    return _delete(offset, operation["length"] - overlap)
+
+def transform_operations(
+    operations: List[Dict[str, Any]],
+    applied: List[Dict[str, Any]],
+    wins_ties: bool = False
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Transform two concurrent operation lists against each other.
+
+    Returns ``(operations', applied')`` such that applying ``applied`` then
+    ``operations'`` yields the same text as ``operations`` then ``applied'``.
+    """
+    if not operations or not applied:
+        return operations, applied
+
+    if len(operations) == 1 and len(applied) == 1:
+        return (
+            transform_operation(operations[0], applied[0], wins_ties),
+            transform_operation(applied[0], operations[0], not wins_ties)
+        )
+
+    if len(operations) > 1:
+        head, applied = transform_operations(operations[:1], applied, wins_ties)
+        tail, applied = transform_operations(operations[1:], applied, wins_ties)
+        return head + tail, applied
+
+    operations, head = transform_operations(operations, applied[:1], wins_ties)
+    operations, tail = transform_operations(operations, applied[1:], wins_ties)
+    return operations, head + tail
+
+def diff_operations(
+    old: str,
+    new: str,
+    pattern: re.Pattern = LINE_PATTERN
+) -> List[Dict[str, Any]]:
+    """
+    Compute operations turning ``old`` into ``new``.
+
+    The texts are compared in units matched by ``pattern`` (lines by default).
+    Operations are emitted from the end of the text backwards, so each offset
+    is also valid in the original text.
+    """
+    old_tokens = pattern.findall(old)
+    new_tokens = pattern.findall(new)
+
+    offsets = [0]
+    for token in old_tokens:
+        offsets.append(offsets[-1] + len(token))
+
+    operations: List[Dict[str, Any]] = []
+    matcher = SequenceMatcher(None, old_tokens, new_tokens, autojunk=False)
+    for tag, i1, i2, j1, j2 in reversed(matcher.get_opcodes()):
+        if tag == "equal":
+            continue
+        start = offsets[i1]
+        operations += _delete(start, offsets[i2] - start)
+        operations += _insert(start, "".join(new_tokens[j1:j2]))
+    return operations
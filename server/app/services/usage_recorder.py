@@ -0,0 +1,167 @@
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from collections import deque
+from datetime import datetime
+import asyncio
+import logging
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models.usage_stats import UsageEvent, UsageRollupDaily, UsageRollupHourly
+
+logger = logging.getLogger(__name__)
+
+class UsageRecorder:
+    """
+    Write-behind buffer for usage events.
+
+    Recording only appends to an in-memory queue; a background task writes
+    the queue with bulk inserts when it reaches ``BATCH_SIZE`` events or every
+    ``FLUSH_INTERVAL`` seconds, and once more on shutdown. The queue is
+    bounded: when it is full new events are dropped and counted.
+
+    Each batch is appended to the event log and folded into the hourly and
+    daily rollups in the same transaction.
+    """
+
+    def __init__(self):
+        self._buffer: Deque[Dict[str, Any]] = deque()
+        self._ready: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # Buffer settings
+        self.MAX_BUFFER = 10000
+        self.BATCH_SIZE = 500
+        self.FLUSH_INTERVAL = 5.0  # seconds
+
+        # Metrics
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.flushes = 0
+        self.early_flushes = 0
+
+    def record(self, event: Dict[str, Any]) -> None:
+        """Queue a usage event without touching the database."""
+        if len(self._buffer) >= self.MAX_BUFFER:
+            self.dropped += 1
+            return
+        self._buffer.append(event)
+        self.recorded += 1
+        if len(self._buffer) >= self.BATCH_SIZE and self._ready is not None:
+            if not self._ready.is_set():
+                self.early_flushes += 1
+            self._ready.set()
+
+    async def start(self) -> None:
+        self._ready = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._ready.wait(), self.FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._ready.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Write all buffered events in bulk."""
+        while self._buffer:
+            batch = []
+            while self._buffer and len(batch) < self.BATCH_SIZE:
+                batch.append(self._buffer.popleft())
+            try:
+                await asyncio.to_thread(self._write, batch)
+                self.written += len(batch)
+            except Exception as e:
+                self.failed += len(batch)
+                logger.error(f"Error recording usage stats: {str(e)}")
+            self.flushes += 1
+
+    @staticmethod
+    def _rollup_counts(
+        batch: List[Dict[str, Any]],
+        bucket: str
+    ) -> Dict[Tuple[int, str, datetime], List[int]]:
+        """Aggregate events into (user, feature, bucket) -> [requests, errors, tokens]."""
+        counts: Dict[Tuple[int, str, datetime], List[int]] = {}
+        for event in batch:
+            timestamp = event["timestamp"].replace(minute=0, second=0, microsecond=0)
+            if bucket == "day":
+                timestamp = timestamp.replace(hour=0)
+            key = (event["user_id"], event["feature"], timestamp)
+            totals = counts.setdefault(key, [0, 0, 0])
+            totals[0] += 1
+            totals[1] += 0 if event.get("success", True) else 1
+            totals[2] += event.get("tokens_used") or 0
+        return counts
+
+    @staticmethod
+    def _apply_rollups(db: Session, model: Any, counts: Dict[Tuple[int, str, datetime], List[int]]) -> None:
+        for (user_id, feature, bucket_start), (requests, errors, tokens) in counts.items():
+            updated = db.query(model).filter(
+                model.user_id == user_id,
+                model.bucket_start == bucket_start,
+                model.feature == feature
+            ).update({
+                model.request_count: model.request_count + requests,
+                model.error_count: model.error_count + errors,
+                model.tokens_used: model.tokens_used + tokens
+            }, synchronize_session=False)
+            if not updated:
+                db.add(model(
+                    user_id=user_id,
+                    feature=feature,
+                    bucket_start=bucket_start,
+                    request_count=requests,
+                    error_count=errors,
+                    tokens_used=tokens
+                ))
+
+    @classmethod
+    def _write(cls, batch: List[Dict[str, Any]]) -> None:
+        hourly = cls._rollup_counts(batch, "hour")
+        daily = cls._rollup_counts(batch, "day")
+
+        # A concurrent worker may create the same rollup row first; retry once
+        for attempt in range(2):
+            db = SessionLocal()
+            try:
+                db.bulk_insert_mappings(UsageEvent, batch)
+                cls._apply_rollups(db, UsageRollupHourly, hourly)
+                cls._apply_rollups(db, UsageRollupDaily, daily)
+                db.commit()
+                return
+            except IntegrityError:
+                db.rollback()
+                if attempt:
+                    raise
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                db.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "buffered": len(self._buffer),
+            "recorded": self.recorded,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "flushes": self.flushes,
+            "early_flushes": self.early_flushes
+        }
+
+# Global usage recorder instance
+usage_recorder = UsageRecorder()
@@ -0,0 +1,93 @@
+"""
+Comment anchor regression check for documents saved while a room is open.
+
+Builds the schema in an in-memory SQLite database, opens a collaboration
+room on a commented document and edits it, saves the document through the
+HTTP API meanwhile, then lets the room persist. The room rebases onto the
+HTTP save, and the persisted comment must still cover the words it was
+anchored on, shifted once for each of the two edits.
+
+    python test_comment_anchors.py
+"""
+import asyncio
+import sys
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.api.documents import save_document_content
+from app.database import Base
+from app.models.collaboration import Comment
+from app.models.document import Document
+from app.models.user import User
+# Imported so that every table and relationship is declared
+from app.models.essay_plan import EssayPlan  # noqa: F401
+from app.models.job import AnalysisJob  # noqa: F401
+from app.models.usage_stats import UsageStats  # noqa: F401
+from app.models.version import DocumentVersion  # noqa: F401
+from app.services import collaboration_room
+from app.services.anchor_index import anchor_indexes
+from app.services.collaboration_room import CollaborationRoom, room_manager
+
+def test_http_save_while_room_is_open():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    # The room persists through sessions of its own
+    collaboration_room.SessionLocal = Session
+
+    db = Session()
+    author = User(email="author@example.com", full_name="Author")
+    db.add(author)
+    db.flush()
+    doc = Document(title="Draft", content="alpha beta gamma", current_version=1, user_id=author.id)
+    db.add(doc)
+    db.flush()
+    comment = Comment(
+        document_id=doc.id,
+        user_id=author.id,
+        content="Check this word",
+        anchor_start=11,
+        anchor_end=16,
+        anchor_version=1
+    )
+    db.add(comment)
+    db.commit()
+    document_id, comment_id = doc.id, comment.id
+
+    anchor_indexes.open(db, document_id)
+    room = CollaborationRoom(document_id, doc.content, doc.current_version)
+    room_manager._rooms[document_id] = room
+    try:
+        room.apply(author.id, 0, [{"type": "insert", "offset": 0, "text": "Intro. "}])
+        assert save_document_content(
+            doc, "alpha beta delta gamma", author, db, {"commit_message": "Edit"}
+        )
+        db.commit()
+        asyncio.run(room.flush())
+    finally:
+        room_manager._rooms.pop(document_id, None)
+        anchor_indexes.close(document_id)
+
+    db.expire_all()
+    content = db.query(Document.content).filter(Document.id == document_id).scalar()
+    comment = db.query(Comment).filter(Comment.id == comment_id).first()
+    db.close()
+    engine.dispose()
+
+    assert content == "Intro. alpha beta delta gamma", content
+    anchored = content[comment.anchor_start:comment.anchor_end]
+    assert anchored == "gamma", (comment.anchor_start, comment.anchor_end, anchored)
+
+if __name__ == "__main__":
+    try:
+        test_http_save_while_room_is_open()
+        print("✅ Comment anchors survive an HTTP save into an open room")
+    except AssertionError as e:
+        print(f"❌ Comment anchors moved: {e.args[0] if e.args else e}")
+        sys.exit(1)
@@ -0,0 +1,71 @@
+"""
+Regression check for restoring a document version.
+
+Builds the schema in an in-memory SQLite database, saves a document twice
+and restores its first version through the restore endpoint's handler. The
+restore must bring back that content as a new version, keeping the content
+it replaced, with the operation delta the anchor index and merges rely on.
+
+    python test_document_restore.py
+"""
+import sys
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.api.documents import restore_document_version, save_document_content
+from app.database import Base
+from app.models.document import Document
+from app.models.user import User
+from app.models.version import DocumentVersion
+from app.services.text_operations import apply_operations
+# Imported so that every table and relationship is declared
+from app.models.collaboration import Comment  # noqa: F401
+from app.models.essay_plan import EssayPlan  # noqa: F401
+from app.models.job import AnalysisJob  # noqa: F401
+from app.models.usage_stats import UsageStats  # noqa: F401
+
+def test_restore_document_version():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+
+    author = User(email="author@example.com", full_name="Author")
+    db.add(author)
+    db.flush()
+    document = Document(title="Draft", content="first draft", current_version=1, user_id=author.id)
+    db.add(document)
+    db.commit()
+    for content in ("second draft", "third draft"):
+        assert save_document_content(document, content, author, db, {"commit_message": "Edit"})
+        db.commit()
+        db.refresh(document)
+    update_count = document.update_count
+
+    restored = restore_document_version(document.id, 1, current_user=author, db=db)
+
+    assert restored.content == "first draft", restored.content
+    assert restored.current_version == 4, restored.current_version
+    assert restored.update_count == update_count + 1, restored.update_count
+    replaced = db.query(DocumentVersion).filter(
+        DocumentVersion.document_id == document.id,
+        DocumentVersion.version_number == 3
+    ).one()
+    assert replaced.content == "third draft", replaced.content
+    delta = replaced.version_metadata["delta"]
+    assert apply_operations(replaced.content, delta) == "first draft", delta
+    db.close()
+    engine.dispose()
+
+if __name__ == "__main__":
+    try:
+        test_restore_document_version()
+        print("✅ Restoring a version saves it as a new version")
+    except AssertionError as e:
+        print(f"❌ Restore failed: {e.args[0] if e.args else e}")
+        sys.exit(1)
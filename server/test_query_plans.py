@@ -0,0 +1,206 @@
+"""
+Query-plan regression check for the hot foreign-key lookups.
+
+Runs EXPLAIN for each query against a SQLite database built by running the
+Alembic migrations, and against PostgreSQL when QUERY_PLAN_DATABASE_URL
+points at a migrated database. Fails unless every query searches the table
+through the index it is expected to use, so an index missing from the
+migrations is caught even though the models declare it.
+
+The early migrations named after the documents, versions, collaboration
+and comments tables are empty, as ``init_db`` created those tables; they
+are created at that point in the chain, as they were then.
+
+    python test_query_plans.py
+"""
+import os
+import sys
+import tempfile
+
+from alembic.operations import Operations
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import (
+    JSON,
+    Column,
+    DateTime,
+    ForeignKey,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    Text,
+    create_engine,
+    event,
+    text,
+)
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic")
+# Last of the empty migrations standing in for tables made by init_db
+BASELINE_REVISION = "f4e2159a6d0e"
+
+# Format: (name, SQL, indexes the query may use)
+HOT_QUERIES = [
+    ("documents by owner",
+     "SELECT id FROM documents WHERE user_id = 1",
+     ("ix_documents_user_id",)),
+    ("references of a document",
+     'SELECT id FROM "references" WHERE document_id = 1',
+     ("ix_references_document_id",)),
+    ("version of a document",
+     "SELECT id FROM document_versions WHERE document_id = 1 AND version_number = 2",
+     ("ix_document_versions_document_version",)),
+    ("version history",
+     "SELECT id FROM document_versions WHERE document_id = 1 ORDER BY version_number DESC",
+     ("ix_document_versions_document_version",)),
+    ("collaborator role",
+     "SELECT role FROM document_collaborations WHERE document_id = 1 AND user_id = 1",
+     # SQLite names the index backing the unique constraint itself
+     ("uq_document_collaborations_document_user",
+      "sqlite_autoindex_document_collaborations_1",
+      "ix_document_collaborations_user_document")),
+    ("shared with a user",
+     "SELECT document_id FROM document_collaborations WHERE user_id = 1 ORDER BY document_id",
+     ("ix_document_collaborations_user_document",)),
+    ("comments of a document",
+     "SELECT id FROM comments WHERE document_id = 1",
+     ("ix_comments_document_parent",)),
+    ("comment threads",
+     "SELECT id FROM comments WHERE document_id = 1 AND parent_id IS NULL",
+     ("ix_comments_document_parent",)),
+    ("comment replies",
+     "SELECT id FROM comments WHERE parent_id = 1",
+     ("ix_comments_parent_id",)),
+    ("essay plans by owner",
+     "SELECT id FROM essay_plans WHERE user_id = 1",
+     ("ix_essay_plans_user_id",)),
+]
+
+# Tables no migration creates, without the indexes added since
+BASELINE = MetaData()
+# Created by the first migration; declared only for the foreign keys
+USERS = Table("users", BASELINE, Column("id", Integer, primary_key=True))
+Table("documents", BASELINE,
+      Column("id", Integer, primary_key=True, index=True),
+      Column("title", String, index=True),
+      Column("content", Text),
+      Column("document_type", String, index=True),
+      Column("document_metadata", JSON),
+      Column("current_version", Integer),
+      Column("user_id", Integer, ForeignKey("users.id")),
+      Column("created_at", DateTime(timezone=True)),
+      Column("updated_at", DateTime(timezone=True)))
+Table("references", BASELINE,
+      Column("id", Integer, primary_key=True, index=True),
+      Column("citation_key", String, index=True),
+      Column("title", String),
+      Column("authors", JSON),
+      Column("year", Integer),
+      Column("source", String),
+      Column("reference_metadata", JSON),
+      Column("document_id", Integer, ForeignKey("documents.id")),
+      Column("user_id", Integer, ForeignKey("users.id")),
+      Column("created_at", DateTime(timezone=True)),
+      Column("updated_at", DateTime(timezone=True)))
+Table("document_versions", BASELINE,
+      Column("id", Integer, primary_key=True, index=True),
+      Column("version_number", Integer),
+      Column("title", String),
+      Column("content", Text),
+      Column("version_metadata", JSON),
+      Column("document_id", Integer, ForeignKey("documents.id")),
+      Column("user_id", Integer, ForeignKey("users.id")),
+      Column("created_at", DateTime(timezone=True)))
+Table("document_collaborations", BASELINE,
+      Column("id", Integer, primary_key=True, index=True),
+      Column("document_id", Integer, ForeignKey("documents.id", ondelete="CASCADE")),
+      Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE")),
+      Column("role", String),
+      Column("created_at", DateTime(timezone=True)),
+      Column("updated_at", DateTime(timezone=True)))
+Table("comments", BASELINE,
+      Column("id", Integer, primary_key=True, index=True),
+      Column("document_id", Integer, ForeignKey("documents.id", ondelete="CASCADE")),
+      Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE")),
+      Column("content", String),
+      Column("resolved", String),
+      Column("parent_id", Integer, ForeignKey("comments.id", ondelete="CASCADE"), nullable=True),
+      Column("created_at", DateTime(timezone=True)),
+      Column("updated_at", DateTime(timezone=True)))
+
+# The migrations target PostgreSQL; translate the two constructs SQLite lacks
+@compiles(JSONB, "sqlite")
+def _compile_jsonb_for_sqlite(type_, compiler, **kw):
+    return "JSON"
+
+def _translate_defaults(conn, cursor, statement, parameters, context, executemany):
+    return statement.replace("DEFAULT now()", "DEFAULT CURRENT_TIMESTAMP"), parameters
+
+def migrate(conn):
+    """Apply every migration in order, without going through alembic/env.py."""
+    script = ScriptDirectory(MIGRATIONS)
+    baseline = [table for table in BASELINE.sorted_tables if table is not USERS]
+    with Operations.context(MigrationContext.configure(conn)):
+        for revision in reversed(list(script.walk_revisions("base", "heads"))):
+            revision.module.upgrade()
+            if revision.revision == BASELINE_REVISION:
+                BASELINE.create_all(bind=conn, tables=baseline)
+
+def sqlite_plan_failures():
+    failures = []
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'plans.db')}")
+        event.listen(engine, "before_cursor_execute", _translate_defaults, retval=True)
+        with engine.begin() as conn:
+            migrate(conn)
+        with engine.connect() as conn:
+            for name, sql, indexes in HOT_QUERIES:
+                plan = [row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+                # Every table access must be a "SEARCH <table> USING [COVERING]
+                # INDEX <name> (...)"; a SCAN reads the whole table or index
+                searches = [step for step in plan if step.startswith(("SEARCH", "SCAN"))]
+                if not searches or not all(
+                    step.startswith("SEARCH") and any(f"INDEX {index} " in step for index in indexes)
+                    for step in searches
+                ):
+                    failures.append((name, plan))
+        engine.dispose()
+    return failures
+
+def postgres_plan_failures(database_url):
+    engine = create_engine(database_url)
+    failures = []
+    with engine.connect() as conn:
+        # Tables in a test database are tiny, so make the planner prefer
+        # indexes whenever one applies
+        conn.execute(text("SET enable_seqscan = off"))
+        for name, sql, indexes in HOT_QUERIES:
+            plan = [row[0] for row in conn.execute(text(f"EXPLAIN {sql}"))]
+            uses_index = any(
+                f"{scan} {index} " in step or step.endswith(f"{scan} {index}")
+                for step in plan
+                for scan in ("Index Scan using", "Index Only Scan using", "Bitmap Index Scan on")
+                for index in indexes
+            )
+            if not uses_index or any("Seq Scan" in step for step in plan):
+                failures.append((name, plan))
+    return failures
+
+def test_hot_queries_use_indexes():
+    failures = sqlite_plan_failures()
+    database_url = os.getenv("QUERY_PLAN_DATABASE_URL")
+    if database_url:
+        failures += postgres_plan_failures(database_url)
+    assert not failures, failures
+
+if __name__ == "__main__":
+    try:
+        test_hot_queries_use_indexes()
+        print("✅ All hot queries use their index")
+    except AssertionError as e:
+        print("❌ Queries not using their index:")
+        for name, plan in e.args[0]:
+            print(f"  {name}: {' / '.join(plan)}")
+        sys.exit(1)